@@ -15,9 +15,10 @@ class FFError(Exception):
 params = {
     'inline': 'always',
     'nogil': True,
+    'cache': True,
 }
 
-@njit
+@njit(cache=True)
 def raise_error():
     raise FFError('ff_read: not enough data')
     return b''
@@ -39,7 +40,6 @@ def make_read_one(data_type):
     dt = np.dtype(data_type)
     ele_size = dt.itemsize
 
-    @njit(**params)
     def f(buffer, n_buffer, pos):
         new_pos = pos + ele_size
         if new_pos > n_buffer:
@@ -47,14 +47,16 @@ def make_read_one(data_type):
         v = np.frombuffer(buffer[pos:new_pos], dtype=dt)
         return v[0], new_pos
 
-    return f
+    # cached kernels are looked up by qualified name, so every closure needs its own
+    f.__name__ = 'ff_read_{}'.format(dt.name)
+    f.__qualname__ = 'make_read_one.<locals>.' + f.__name__
+    return njit(**params)(f)
 
 
 def make_read_many(data_type):
     dt = np.dtype(data_type)
     ele_size = dt.itemsize
 
-    @njit(**params)
     def f(buffer, n_buffer, pos, count):
         new_pos = pos + ele_size * count
         if new_pos > n_buffer:
@@ -62,7 +64,9 @@ def make_read_many(data_type):
         v = np.frombuffer(buffer[pos:new_pos], dtype=dt)
         return list(v), new_pos
 
-    return f
+    f.__name__ = 'ff_read_{}s'.format(dt.name)
+    f.__qualname__ = 'make_read_many.<locals>.' + f.__name__
+    return njit(**params)(f)
 
 
 ff_read_u8 = make_read_one(np.uint8)
@@ -88,6 +92,14 @@ ff_read_f32s = make_read_many(np.float32)
 ff_read_f64s = make_read_many(np.float64)
 
 
+def ff_read_array(buffer, n_buffer, pos, dtype, count):
+    # zero-copy view over the buffer; writable only if the buffer is
+    new_pos = pos + dtype.itemsize * count
+    if new_pos > n_buffer:
+        raise FFError('ff_read: not enough data')
+    return np.frombuffer(buffer, dtype=dtype, count=count, offset=pos), new_pos
+
+
 @njit(**params)
 def ff_read_strz(buffer, n_buffer, pos):
     pos0 = pos
@@ -15,9 +15,10 @@ class FFError(Exception):
 params = {
     'inline': 'always',
     'nogil': True,
+    'cache': True,
 }
 
-@njit
+@njit(cache=True)
 def raise_error():
     raise FFError('ff_read: not enough data')
 
@@ -38,7 +39,6 @@ def make_read_one(data_type):
     dt = np.dtype(data_type)
     ele_size = dt.itemsize
 
-    @njit(**params)
     def f(bufn, pos):
         new_pos = pos + ele_size
         if new_pos > bufn[1]:
@@ -46,14 +46,16 @@ def make_read_one(data_type):
         v = np.frombuffer(bufn[0][pos:new_pos], dtype=dt)
         return v[0], new_pos
 
-    return f
+    # cached kernels are looked up by qualified name, so every closure needs its own
+    f.__name__ = 'ff_read_{}'.format(dt.name)
+    f.__qualname__ = 'make_read_one.<locals>.' + f.__name__
+    return njit(**params)(f)
 
 
 def make_read_many(data_type):
     dt = np.dtype(data_type)
     ele_size = dt.itemsize
 
-    @njit(**params)
     def f(bufn, pos, count):
         new_pos = pos + ele_size * count
         if new_pos > bufn[1]:
@@ -61,7 +63,9 @@ def make_read_many(data_type):
         v = np.frombuffer(bufn[0][pos:new_pos], dtype=dt)
         return list(v), new_pos
 
-    return f
+    f.__name__ = 'ff_read_{}s'.format(dt.name)
+    f.__qualname__ = 'make_read_many.<locals>.' + f.__name__
+    return njit(**params)(f)
 
 
 ff_read_u8 = make_read_one(np.uint8)
@@ -5,10 +5,13 @@
 
 import io
 import os
+import re
 import enum
 import struct
+from collections.abc import Mapping, Sequence
 from typing import List, Dict
 from io import BytesIO
+import numpy as np
 from deca.errors import *
 from deca.file import ArchiveFile
 from deca.fast_file import *
@@ -21,6 +24,9 @@ from deca.hashes import hash32_func
 # TODO first pass find string hashes?
 # TODO ./files/effects/vehicles/wheels/rear_snow.effc good for basic types
 
+# bump whenever a parser change alters the structure of a deserialized Adf
+ADF_PARSER_VERSION = 5
+
 adf_hash_fields = {
     'EquipmentHash', 'Name', 'RegionHash',
     'Character', 'SkinTone', 'Stereotype',
@@ -78,6 +84,10 @@ class StringHash:
         self.value = f.read_strz()
         self.value_hash = f.read_u64()
 
+    def serialize(self, f, nt_index):
+        f.write(self.value + b'\00')
+        f.write_u64(self.value_hash)
+
 
 class MemberDef:
     def __init__(self):
@@ -101,6 +111,14 @@ class MemberDef:
         self.default_type = f.read_u32()
         self.default_value = f.read_u64()
 
+    def serialize(self, f, nt_index):
+        f.write_u64(nt_index(self.name))
+        f.write_u32(self.type_hash)
+        f.write_u32(self.size)
+        f.write_u32((self.bit_offset << 24) | self.offset)
+        f.write_u32(self.default_type)
+        f.write_u64(self.default_value)
+
 
 class EnumDef:
     def __init__(self):
@@ -113,6 +131,10 @@ class EnumDef:
 
         # print(self.name, self.value)
 
+    def serialize(self, f, nt_index):
+        f.write_u64(nt_index(self.name))
+        f.write_u32(self.value)
+
 
 class MetaType(enum.IntEnum):
     Primative = 0
@@ -139,6 +161,13 @@ class TypeDef:
         self.element_type_hash = None
         self.element_length = None
         self.members = None
+        self.member_map = None
+
+    def get_member_map(self):
+        # name -> MemberDef, last member wins like the dicts built by read_instance
+        if self.member_map is None:
+            self.member_map = {m.name_utf8: m for m in self.members}
+        return self.member_map
 
     def deserialize(self, f, nt):
         self.META_position = f.tell()
@@ -188,6 +217,22 @@ class TypeDef:
         else:
             raise Exception('Unknown Typedef Type {}'.format(self.metatype))
 
+    def serialize(self, f, nt_index):
+        f.write_u32(self.metatype)
+        f.write_u32(self.size)
+        f.write_u32(self.alignment)
+        f.write_u32(self.type_hash)
+        f.write_u64(nt_index(self.name))
+        f.write_u32(self.flags)
+        f.write_u32(self.element_type_hash)
+        f.write_u32(self.element_length)
+
+        # only structures and enumerations have members, the other metatypes store a count of 0
+        members = self.members if self.metatype in {1, 8} else []
+        f.write_u32(len(members))
+        for m in members:
+            m.serialize(f, nt_index)
+
 
 class InstanceEntry:
     def __init__(self):
@@ -213,6 +258,13 @@ class InstanceEntry:
         # print('{:08x}'.format(self.name_hash), '{:08x}'.format(self.type_hash), self.offset, self.size, self.name)
         # print('FP End', f.tell())
 
+    def serialize(self, f, nt_index, offset, size):
+        f.write_u32(self.name_hash)
+        f.write_u32(self.type_hash)
+        f.write_u32(offset)
+        f.write_u32(size)
+        f.write_u64(nt_index(self.name))
+
     # def read(self, type_systems, f):
     #     if self.type_hash not in type_systems:
     #         raise EDecaMissingAdfType(self.type_hash)
@@ -260,6 +312,19 @@ prim_types = {
     typedef_f64,
 }
 
+# element types of arrays that Adf.deserialize(numpy_arrays=True) decodes as numpy views
+# (u8/s8 arrays are already returned as raw bytes)
+prim_array_dtypes = {
+    typedef_s16: np.dtype('<i2'),
+    typedef_u16: np.dtype('<u2'),
+    typedef_s32: np.dtype('<i4'),
+    typedef_u32: np.dtype('<u4'),
+    typedef_s64: np.dtype('<i8'),
+    typedef_u64: np.dtype('<u8'),
+    typedef_f32: np.dtype('<f4'),
+    typedef_f64: np.dtype('<f8'),
+}
+
 prim_type_names = {
     0x580D0A62: 'sint08',
     0x0ca2821d: 'uint08',
@@ -387,6 +452,86 @@ class AdfValue:
 
         return s
 
+    def element_offset(self, index):
+        # offset of an element of a primitive array decoded as a numpy view
+        return self.data_offset + index * self.value.itemsize
+
+
+class AdfLazyStruct(Mapping):
+    """
+    Structure value of an Adf deserialized with lazy=True.
+
+    Members are decoded from the instance buffer the first time they are looked up, and then
+    kept. Behaves like the read only dict that read_instance builds for structures.
+    """
+    __slots__ = ('ctx', 'pos', 'type_def', 'values')
+
+    def __init__(self, ctx, pos, type_def):
+        self.ctx = ctx  # (buffer, n_buffer, map_typedef, map_string_hash, abs_offset, found_strings, numpy_arrays)
+        self.pos = pos
+        self.type_def = type_def
+        self.values = {}
+
+    def __getitem__(self, name):
+        v = self.values.get(name)
+        if v is None:
+            m = self.type_def.get_member_map()[name]
+            buffer, n_buffer, map_typedef, map_string_hash, abs_offset, found_strings, numpy_arrays = self.ctx
+            v, _ = read_instance(
+                buffer, n_buffer, self.pos + m.offset, m.type_hash, map_typedef, map_string_hash, abs_offset,
+                bit_offset=m.bit_offset, found_strings=found_strings, numpy_arrays=numpy_arrays, lazy=True)
+            self.values[name] = v
+        return v
+
+    def __contains__(self, name):
+        return name in self.type_def.get_member_map()
+
+    def __iter__(self):
+        return iter(self.type_def.get_member_map())
+
+    def __len__(self):
+        return len(self.type_def.get_member_map())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AdfLazyArray(Sequence):
+    """
+    Array of structures of an Adf deserialized with lazy=True. Elements are decoded on first access.
+    """
+    __slots__ = ('ctx', 'pos', 'type_id', 'stride', 'length', 'values')
+
+    def __init__(self, ctx, pos, type_id, stride, length):
+        self.ctx = ctx
+        self.pos = pos
+        self.type_id = type_id
+        self.stride = stride
+        self.length = length
+        self.values = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('AdfLazyArray index out of range')
+        v = self.values.get(index)
+        if v is None:
+            buffer, n_buffer, map_typedef, map_string_hash, abs_offset, found_strings, numpy_arrays = self.ctx
+            v, _ = read_instance(
+                buffer, n_buffer, self.pos + index * self.stride, self.type_id, map_typedef, map_string_hash, abs_offset,
+                found_strings=found_strings, numpy_arrays=numpy_arrays, lazy=True)
+            self.values[index] = v
+        return v
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return repr(list(self))
+
 
 # def hash_lookup(vfs: VfsDatabase, hash_code, default=None, prefix=''):
 #     if isinstance(hash_code, int):
@@ -520,12 +665,12 @@ def adf_format(v, type_map, indent=0):
 def adf_value_extract(v):
     if isinstance(v, AdfValue):
         return adf_value_extract(v.value)
-    elif isinstance(v, dict):
+    elif isinstance(v, (dict, AdfLazyStruct)):
         n = {}
         for k, iv in v.items():
             n[k] = adf_value_extract(iv)
         return n
-    elif isinstance(v, list):
+    elif isinstance(v, (list, AdfLazyArray)):
         return [adf_value_extract(iv) for iv in v]
     else:
         return v
@@ -533,7 +678,7 @@ def adf_value_extract(v):
 
 def read_instance(
         buffer, n_buffer, buffer_pos, type_id, map_typedef, map_string_hash, abs_offset,
-        bit_offset=None, found_strings=None):
+        bit_offset=None, found_strings=None, numpy_arrays=False, lazy=False):
     dpos = buffer_pos
     if type_id == typedef_s8:
         v, buffer_pos = ff_read_s8(buffer, n_buffer, buffer_pos)
@@ -595,7 +740,7 @@ def read_instance(
             try:
                 v, buffer_pos = read_instance(
                     buffer, n_buffer, buffer_pos, v0[2], map_typedef, map_string_hash, abs_offset,
-                    found_strings=found_strings)
+                    found_strings=found_strings, numpy_arrays=numpy_arrays, lazy=lazy)
             except EDecaMissingAdfType as e:
                 v = f"!!!MISSING TYPE:  0x{e.type_id:08x} in 0x{v0[2]:08x}[{v0[1]}]"
             buffer_pos = opos
@@ -717,6 +862,10 @@ def read_instance(
 
         if type_def.metatype == 0:  # Primative
             raise EDecaMissingAdfType(type_id)
+        elif type_def.metatype == 1 and lazy:  # Structure, members decoded on access
+            ctx = (buffer, n_buffer, map_typedef, map_string_hash, abs_offset, found_strings, numpy_arrays)
+            v = AdfValue(AdfLazyStruct(ctx, buffer_pos, type_def), type_id, buffer_pos + abs_offset)
+            buffer_pos = buffer_pos + type_def.size
         elif type_def.metatype == 1:  # Structure
             v = {}
             p0 = buffer_pos
@@ -725,7 +874,7 @@ def read_instance(
                 nm = m.name_utf8
                 vt, buffer_pos = read_instance(
                     buffer, n_buffer, buffer_pos, m.type_hash, map_typedef, map_string_hash, abs_offset,
-                    bit_offset=m.bit_offset, found_strings=found_strings)
+                    bit_offset=m.bit_offset, found_strings=found_strings, numpy_arrays=numpy_arrays)
                 v[nm] = vt
                 # print(nm, vt)
             p1 = buffer_pos
@@ -758,7 +907,16 @@ def read_instance(
                 length = type_def.element_length
                 align = None
 
-            if type_def.element_type_hash == typedef_u8:
+            if numpy_arrays and type_def.element_type_hash in prim_array_dtypes:
+                v, buffer_pos = ff_read_array(
+                    buffer, n_buffer, buffer_pos, prim_array_dtypes[type_def.element_type_hash], length)
+            elif lazy and getattr(map_typedef.get(type_def.element_type_hash), 'metatype', None) == 1:
+                # elements of an array of structures are laid out back to back
+                stride = map_typedef[type_def.element_type_hash].size
+                ctx = (buffer, n_buffer, map_typedef, map_string_hash, abs_offset, found_strings, numpy_arrays)
+                v = AdfLazyArray(ctx, buffer_pos, type_def.element_type_hash, stride, length)
+                buffer_pos = buffer_pos + stride * length
+            elif type_def.element_type_hash == typedef_u8:
                 # v, buffer_pos = ff_read_u8s(buffer, n_buffer, buffer_pos, length)
                 v, buffer_pos = ff_read(buffer, n_buffer, buffer_pos, length)
             elif type_def.element_type_hash == typedef_s8:
@@ -791,7 +949,7 @@ def read_instance(
                     v[i], buffer_pos = read_instance(
                         buffer, n_buffer, buffer_pos,
                         type_def.element_type_hash, map_typedef, map_string_hash, abs_offset,
-                        found_strings=found_strings)
+                        found_strings=found_strings, numpy_arrays=numpy_arrays, lazy=lazy)
 
                     p1 = buffer_pos
                     # print(p0, p1, p1-p0)
@@ -862,6 +1020,338 @@ def read_instance(
     return v, buffer_pos
 
 
+
+def adf_type_size(type_id, map_typedef):
+    # bytes an instance of the type takes up inline, i.e. the stride of an array of it
+    if type_id in prim_array_dtypes:
+        return prim_array_dtypes[type_id].itemsize
+    if type_id in {typedef_s8, typedef_u8}:
+        return 1
+    if type_id == 0x8955583e:  # string: offset, length
+        return 8
+    if type_id == 0xdefe88ed:  # deferred: offset, unknown, type, unknown
+        return 16
+    if type_id not in map_typedef:
+        raise EDecaMissingAdfType(type_id)
+    return map_typedef[type_id].size
+
+
+def adf_type_alignment(type_id, map_typedef):
+    if type_id in prim_array_dtypes:
+        return prim_array_dtypes[type_id].itemsize
+    if type_id in {typedef_s8, typedef_u8}:
+        return 1
+    if type_id in {0x8955583e, 0xdefe88ed}:
+        return 8
+    if type_id not in map_typedef:
+        raise EDecaMissingAdfType(type_id)
+    return map_typedef[type_id].alignment
+
+
+adf_prim_formats = {typedef_s8: '<b', typedef_u8: '<B'}
+adf_prim_formats.update({k: '<' + v.char for k, v in prim_array_dtypes.items()})
+adf_bitfield_formats = {1: '<B', 2: '<H', 4: '<I', 8: '<Q'}
+
+
+def adf_padding(pos, alignment, source=None, source_end=None, source_start=None):
+    # padding in front of a block written at pos. A block that was at source_start in the source file, after
+    # something that ended at source_end, gets the bytes that were in between as long as the block stays
+    # aligned (or is written at its original offset), so unchanged files keep their layout
+    if source is not None and source_start is not None and source_end <= source_start <= len(source):
+        gap = source[source_end:source_start]
+        if pos + len(gap) == source_start or (pos + len(gap)) % alignment == 0:
+            return gap
+    return bytes(-pos % alignment)
+
+
+class AdfInstanceWriter:
+    """
+    Lays out the data of one instance from a value tree, the inverse of read_instance.
+
+    The root structure comes first, followed by the out of line data it refers to. Each block
+    (array elements, string, deferred value) is aligned to at least 8 bytes and is followed by the blocks
+    its own elements refer to, depth first in member order, which is how the game files are
+    laid out. The second u32 of every non-null offset is the distance to the next offset in the
+    instance (0 for the last one), the relocation chain that ADF v4 readers follow.
+
+    With the source data of the instance, each block keeps the padding it had in front of it in the
+    source, so an unchanged instance is written byte for byte and the blocks in front of a changed
+    one keep their offsets.
+    """
+
+    def __init__(self, map_typedef, source=None):
+        self.map_typedef = map_typedef
+        self.source = source
+        self.source_end = 0  # end of the last block of the source that was written
+        self.buffer = bytearray()
+        self.offset_positions = []
+
+    def write(self, type_id, value):
+        self.buffer = bytearray(adf_type_size(type_id, self.map_typedef))
+        self.source_end = len(self.buffer)
+        self.offset_positions = []
+        pending = []
+        self.write_value(0, type_id, value, pending, source_pos=0)
+        self.write_blocks(pending)
+
+        positions = sorted(self.offset_positions)
+        for pos, next_pos in zip(positions, positions[1:]):
+            struct.pack_into('<I', self.buffer, pos + 4, next_pos - pos)
+        if self.source is not None and not any(self.source[self.source_end:]):
+            # padding at the end of the instance
+            self.buffer += self.source[self.source_end:]
+        return self.buffer
+
+    def source_u32(self, source_pos):
+        if self.source is None or source_pos is None or source_pos + 4 > len(self.source):
+            return None
+        return struct.unpack_from('<I', self.source, source_pos)[0]
+
+    def write_value(self, pos, type_id, v, pending, bit_offset=None, source_pos=None):
+        # write the inline part of a value at pos, out of line data is added to pending
+        # source_pos: position of the same value in the source data, None for values that are not in the source
+        if isinstance(v, AdfValue):
+            v = v.value
+
+        if type_id in adf_prim_formats:
+            struct.pack_into(adf_prim_formats[type_id], self.buffer, pos, v)
+        elif type_id == 0x8955583e:  # string
+            pending.append((pos, type_id, v, source_pos))
+        elif type_id == 0xdefe88ed:  # deferred value
+            if v is not None:
+                if not isinstance(v, AdfValue):
+                    raise EDecaBuildError('Cannot serialize deferred value {}'.format(v))
+                struct.pack_into('<I', self.buffer, pos + 8, v.type_id)
+                if self.source_u32(None if source_pos is None else source_pos + 8) != v.type_id:
+                    source_pos = None
+                pending.append((pos, type_id, v, source_pos))
+        elif type_id == 0x178842fe:  # gdc/global.gdcc
+            raise EDecaBuildError('Cannot serialize GameDataCollection instances')
+        else:
+            if type_id not in self.map_typedef:
+                raise EDecaMissingAdfType(type_id)
+            type_def = self.map_typedef[type_id]
+
+            if type_def.metatype == 1:  # Structure
+                for m in type_def.members:
+                    member_source_pos = None if source_pos is None else source_pos + m.offset
+                    self.write_value(pos + m.offset, m.type_hash, v[m.name_utf8], pending, bit_offset=m.bit_offset, source_pos=member_source_pos)
+            elif type_def.metatype == 2:  # Pointer
+                struct.pack_into('<Q', self.buffer, pos, v[0])
+            elif type_def.metatype == 3:  # Array
+                if len(v) > 0:
+                    struct.pack_into('<I', self.buffer, pos + 8, len(v))
+                    pending.append((pos, type_id, v, source_pos))
+            elif type_def.metatype == 4:  # Inline Array
+                self.write_elements(pos, type_def.element_type_hash, v, pending, source_pos, len(v))
+            elif type_def.metatype == 7:  # BitField, members share the same word
+                fmt = adf_bitfield_formats[type_def.size]
+                bits = struct.unpack_from(fmt, self.buffer, pos)[0]
+                struct.pack_into(fmt, self.buffer, pos, bits | ((v & 1) << (bit_offset or 0)))
+            elif type_def.metatype == 8:  # Enumeration
+                struct.pack_into('<I', self.buffer, pos, v)
+            elif type_def.metatype == 9:  # String Hash
+                if type_def.size == 4:
+                    struct.pack_into('<I', self.buffer, pos, v)
+                elif type_def.size == 6:
+                    struct.pack_into('<HHH', self.buffer, pos, (v >> 32) & 0xffff, (v >> 16) & 0xffff, v & 0xffff)
+                elif type_def.size == 8:
+                    struct.pack_into('<Q', self.buffer, pos, v)
+                else:
+                    self.buffer[pos:pos + type_def.size] = v
+            else:
+                raise EDecaBuildError('Cannot serialize metatype {}'.format(type_def.metatype))
+
+    def write_elements(self, pos, element_type_id, values, pending, source_pos=None, source_count=0):
+        if element_type_id in prim_array_dtypes:
+            data = np.asarray(values, dtype=prim_array_dtypes[element_type_id]).tobytes()
+            self.buffer[pos:pos + len(data)] = data
+        elif element_type_id in {typedef_s8, typedef_u8}:
+            data = bytes(values) if isinstance(values, (bytes, bytearray)) else np.asarray(values).astype(adf_prim_formats[element_type_id]).tobytes()
+            self.buffer[pos:pos + len(data)] = data
+        else:
+            stride = adf_type_size(element_type_id, self.map_typedef)
+            for i, v in enumerate(values):
+                element_source_pos = source_pos + i * stride if source_pos is not None and i < source_count else None
+                self.write_value(pos + i * stride, element_type_id, v, pending, source_pos=element_source_pos)
+
+    def source_block(self, type_id, source_pos):
+        # (offset, size) of the block an offset at source_pos refers to in the source, None if there is none
+        source_offset = self.source_u32(source_pos)
+        if not source_offset or source_offset < self.source_end or source_offset >= len(self.source):
+            return None
+        if type_id == 0x8955583e:
+            end = self.source.find(b'\00', source_offset)
+            return None if end < 0 else (source_offset, end + 1 - source_offset)
+        if type_id == 0xdefe88ed:
+            type_size = adf_type_size(self.source_u32(source_pos + 8), self.map_typedef)
+            return source_offset, type_size
+        element_type_id = self.map_typedef[type_id].element_type_hash
+        return source_offset, adf_type_size(element_type_id, self.map_typedef) * self.source_u32(source_pos + 8)
+
+    def write_blocks(self, pending):
+        for pos, type_id, v, source_pos in pending:
+            if type_id == 0x8955583e:
+                alignment = 8
+            elif type_id == 0xdefe88ed:
+                alignment = max(8, adf_type_alignment(v.type_id, self.map_typedef))
+            else:
+                alignment = max(8, adf_type_alignment(self.map_typedef[type_id].element_type_hash, self.map_typedef))
+            source_block = None if source_pos is None else self.source_block(type_id, source_pos)
+            if source_block is None:
+                self.buffer.extend(adf_padding(len(self.buffer), alignment))
+                block_source_pos = None
+            else:
+                block_source_pos, block_source_size = source_block
+                self.buffer.extend(adf_padding(len(self.buffer), alignment, self.source, self.source_end, block_source_pos))
+                self.source_end = block_source_pos + block_source_size
+            block_pos = len(self.buffer)
+            struct.pack_into('<I', self.buffer, pos, block_pos)
+            self.offset_positions.append(pos)
+
+            children = []
+            if type_id == 0x8955583e:
+                self.buffer.extend(v)
+                self.buffer.append(0)
+            elif type_id == 0xdefe88ed:
+                self.buffer.extend(bytes(adf_type_size(v.type_id, self.map_typedef)))
+                self.write_value(block_pos, v.type_id, v, children, source_pos=block_source_pos)
+            else:
+                element_type_id = self.map_typedef[type_id].element_type_hash
+                self.buffer.extend(bytes(adf_type_size(element_type_id, self.map_typedef) * len(v)))
+                source_count = 0 if block_source_pos is None else self.source_u32(source_pos + 8)
+                self.write_elements(block_pos, element_type_id, v, children, block_source_pos, source_count)
+            self.write_blocks(children)
+
+
+class AdfSelector:
+    """
+    Path into an Adf instance that is resolved against the typedefs and the raw instance data.
+
+    Paths are member names separated by '.', with [N] to index an array and [*] to visit every
+    element, e.g. 'bullet_weapon[0].tuning.bullet_base_tuning.gravity_strength' or
+    'ZeroingSettings[*].BulletOverrides[*].Angle'. The member offsets and array strides for a
+    path are worked out once per instance type hash and reused for every file using that type.
+    """
+    token_pattern = re.compile(r'(?:^|\.)([^.\[\]]+)|\[(\d+|\*)\]')
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = []
+        pos = 0
+        while pos < len(path):
+            match = self.token_pattern.match(path, pos)
+            if match is None or match.end() == pos:
+                raise ValueError('Invalid Adf path {!r} at {}'.format(path, pos))
+            name, index = match.groups()
+            if name is not None:
+                self.steps.append(name)
+            else:
+                self.steps.append(None if index == '*' else int(index))
+            pos = match.end()
+        self.steps = tuple(self.steps)
+        self.plans = {}
+
+    def __repr__(self):
+        return 'AdfSelector({!r})'.format(self.path)
+
+    def compile(self, type_id, map_typedef, start=0):
+        # returns (ops, type_id of the selected values), cached per (type_id, start)
+        key = (type_id, start)
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+
+        ops = []
+        for i in range(start, len(self.steps)):
+            step = self.steps[i]
+            if type_id == 0xdefe88ed:
+                # the type of a deferred value is stored with the data, the rest is planned when it is read
+                ops.append(('deferred', i))
+                break
+            if type_id not in map_typedef:
+                raise EDecaMissingAdfType(type_id)
+            type_def = map_typedef[type_id]
+            if isinstance(step, str):
+                if type_def.metatype != MetaType.Structure:
+                    raise KeyError('{}: {} is not a structure'.format(self.path, adf_type_id_to_str(type_id, map_typedef)))
+                m = type_def.get_member_map()[step]
+                ops.append(('member', m.offset, m.bit_offset))
+                type_id = m.type_hash
+            else:
+                if type_def.metatype not in {MetaType.Array, MetaType.InlineArray}:
+                    raise KeyError('{}: {} is not an array'.format(self.path, adf_type_id_to_str(type_id, map_typedef)))
+                stride = adf_type_size(type_def.element_type_hash, map_typedef)
+                if type_def.metatype == MetaType.Array:
+                    ops.append(('array', stride, step))
+                else:
+                    ops.append(('inline_array', stride, step, type_def.element_length))
+                type_id = type_def.element_type_hash
+
+        plan = (tuple(ops), type_id)
+        self.plans[key] = plan
+        return plan
+
+    def select(self, buffer, type_id, map_typedef, map_string_hash=None, abs_offset=0):
+        """Returns (value, data_offset) for every match in an instance buffer; offsets include abs_offset"""
+        if map_string_hash is None:
+            map_string_hash = {}
+        n_buffer = len(buffer)
+        results = []
+        self._select(buffer, n_buffer, [(0, None)], type_id, 0, map_typedef, map_string_hash, abs_offset, results)
+        return results
+
+    def _select(self, buffer, n_buffer, positions, type_id, start, map_typedef, map_string_hash, abs_offset, results):
+        ops, leaf_type_id = self.compile(type_id, map_typedef, start)
+        for op in ops:
+            kind = op[0]
+            if kind == 'member':
+                positions = [(pos + op[1], op[2]) for pos, _ in positions]
+            elif kind == 'deferred':
+                for pos, _ in positions:
+                    offset, _, deferred_type_id, _ = struct.unpack_from('<4I', buffer, pos)
+                    if offset != 0 and deferred_type_id != 0:
+                        self._select(buffer, n_buffer, [(offset, None)], deferred_type_id, op[1],
+                                     map_typedef, map_string_hash, abs_offset, results)
+                return
+            else:
+                stride, index = op[1], op[2]
+                element_positions = []
+                for pos, _ in positions:
+                    if kind == 'array':
+                        offset, _, length = struct.unpack_from('<3I', buffer, pos)
+                    else:
+                        offset, length = pos, op[3]
+                    if index is None:
+                        element_positions.extend((offset + i * stride, None) for i in range(length))
+                    elif index < length:
+                        element_positions.append((offset + index * stride, None))
+                    else:
+                        raise IndexError('{}: index {} out of range for array of length {}'.format(self.path, index, length))
+                positions = element_positions
+
+        for pos, bit_offset in positions:
+            v, _ = read_instance(
+                buffer, n_buffer, pos, leaf_type_id, map_typedef, map_string_hash, abs_offset,
+                bit_offset=bit_offset, lazy=True)
+            if isinstance(v, AdfValue):
+                results.append((v.value, v.data_offset))
+            else:
+                results.append((v, pos + abs_offset))
+
+
+adf_selectors = {}
+
+
+def get_adf_selector(path):
+    # selectors are shared so the plans compiled for one file are reused by every other file
+    selector = adf_selectors.get(path)
+    if selector is None:
+        selector = AdfSelector(path)
+        adf_selectors[path] = selector
+    return selector
+
+
 class Adf:
     def __init__(self):
         self.version = None
@@ -894,6 +1384,13 @@ class Adf:
         self.found_strings = set()
         self.table_instance_full_values = []
         self.table_instance_values = []
+        self.source_data = None  # the deserialized file, serialize keeps its layout
+
+    def __getstate__(self):
+        # the source data is the file the Adf was parsed from, the caller has it already
+        state = self.__dict__.copy()
+        state['source_data'] = None
+        return state
 
     def dump_to_string(self):
         sbuf = ''
@@ -951,7 +1448,14 @@ class Adf:
 
         return sbuf
 
-    def deserialize(self, fp, map_typedef=None, process_instances=True):
+    def deserialize(self, fp, map_typedef=None, process_instances=True, numpy_arrays=False, lazy=False, keep_source=True):
+        # numpy_arrays: decode arrays of primitives as read-only numpy views over the instance data
+        # instead of lists. Element offsets are AdfValue.element_offset(index) of the array
+        # lazy: structures and arrays of structures are AdfLazyStruct/AdfLazyArray proxies that decode
+        # members on first access. table_instance_values and found_strings are left empty, use
+        # adf_value_extract(table_instance_full_values[i]) to decode a whole instance
+        # keep_source: keep the file data as source_data so serialize keeps its layout. Not needed by
+        # callers that only read values
         if map_typedef is None:
             map_typedef = {}
 
@@ -1037,7 +1541,11 @@ class Adf:
         self.found_strings = set()
         self.table_instance_values = [None] * len(self.table_instance)
         self.table_instance_full_values = [None] * len(self.table_instance)
+        self.source_data = None
         if process_instances:
+            if keep_source:
+                fp.seek(0)
+                self.source_data = bytes(fp.read(self.total_size))
             for i in range(len(self.table_instance)):
                 ins = self.table_instance[i]
                 fp.seek(ins.offset)
@@ -1047,10 +1555,113 @@ class Adf:
                 v, buffer_pos = read_instance(
                     buffer, n_buffer, buffer_pos,
                     ins.type_hash, self.extended_map_typedef, self.map_stringhash, ins.offset,
-                    found_strings=self.found_strings)
+                    found_strings=None if lazy else self.found_strings, numpy_arrays=numpy_arrays, lazy=lazy)
                 self.table_instance_full_values[i] = v
-                self.table_instance_values[i] = adf_value_extract(v)
+                if not lazy:
+                    self.table_instance_values[i] = adf_value_extract(v)
                 # except EDecaMissingAdfType as ae:
                 #     print('Missing HASHID {:08x}'.format(ae.hashid))
                 # except Exception as exp:
                 #     print(exp)
+
+    def select(self, data, path, instance_index=0):
+        # (value, data_offset) for each match of path in an instance, read straight from the file data
+        # without decoding the rest of the instance. Only the header needs to have been deserialized
+        ins = self.table_instance[instance_index]
+        buffer = data[ins.offset:ins.offset + ins.size]
+        selector = get_adf_selector(path)
+        return selector.select(buffer, ins.type_hash, self.extended_map_typedef, self.map_stringhash, ins.offset)
+
+    def serialize(self, verify=False):
+        # lay out the whole file from table_instance_full_values in one pass: header, comment, instances,
+        # instance table, typedefs, string hashes and name table. Everything keeps the padding it had in the
+        # deserialized file, so an unchanged file is written byte for byte and offsets in front of added data
+        # stay where they were.
+        # verify: parse the result and check that it serializes to the same bytes
+        names = [list(n) for n in self.table_name]
+        name_indexes = {n[1]: i for i, n in enumerate(names)}
+
+        def nt_index(name):
+            if name not in name_indexes:
+                name_indexes[name] = len(names)
+                names.append([len(name), name])
+            return name_indexes[name]
+
+        source = self.source_data
+        buffer = bytearray(0x40)
+        buffer += self.comment + b'\00'
+        source_end = len(buffer)
+
+        instances = []
+        for ins, value in zip(self.table_instance, self.table_instance_full_values):
+            if value is None:
+                raise EDecaBuildError('Instance {} was not deserialized'.format(ins.name))
+            alignment = adf_type_alignment(ins.type_hash, self.extended_map_typedef)
+            instance_source = None
+            if source is not None and source_end <= ins.offset:
+                buffer += adf_padding(len(buffer), alignment, source, source_end, ins.offset)
+                instance_source = source[ins.offset:ins.offset + ins.size]
+                source_end = ins.offset + ins.size
+            else:
+                buffer += adf_padding(len(buffer), alignment)
+            data = AdfInstanceWriter(self.extended_map_typedef, instance_source).write(ins.type_hash, value)
+            instances.append((ins, len(buffer), len(data)))
+            buffer += data
+
+        fp = ArchiveFile(io.BytesIO())
+        fp.write(buffer)
+
+        def write_table(source_start, alignment, write_entries):
+            # the tables after the instances keep the gaps they had in the source as well
+            nonlocal source_end
+            if source is not None and source_start:
+                fp.write(adf_padding(fp.tell(), alignment, source, source_end, source_start))
+            else:
+                fp.write(adf_padding(fp.tell(), alignment))
+            offset = fp.tell()
+            write_entries()
+            if source is not None and source_start:
+                source_end = source_start + fp.tell() - offset
+            return offset
+
+        def write_instances():
+            for ins, offset, size in instances:
+                ins.serialize(fp, nt_index, offset, size)
+
+        def write_typedefs():
+            for td in self.table_typedef:
+                td.serialize(fp, nt_index)
+
+        def write_stringhashes():
+            for sh in self.table_stringhash:
+                sh.serialize(fp, nt_index)
+
+        def write_names():
+            for n in names:
+                fp.write_u8(len(n[1]))
+            for n in names:
+                fp.write(n[1] + b'\00')
+
+        instance_offset = write_table(self.instance_offset, 8, write_instances)
+        typedef_offset = write_table(self.typedef_offset, 1, write_typedefs)
+        stringhash_offset = write_table(self.stringhash_offset, 1, write_stringhashes) if self.table_stringhash else 0
+        # names can only be added while writing the tables above
+        nametable_offset = write_table(self.nametable_offset, 1, write_names)
+
+        total_size = fp.tell()
+        fp.seek(0)
+        fp.write(b' FDA')
+        header = [
+            self.version, len(instances), instance_offset, len(self.table_typedef), typedef_offset,
+            len(self.table_stringhash), stringhash_offset, len(names), nametable_offset, total_size]
+        fp.write_u32(header)
+        fp.write_u32(list(self.unknown))
+        data = fp.f.getvalue()
+
+        if verify:
+            adf = Adf()
+            adf.deserialize(ArchiveFile(io.BytesIO(data)), map_typedef=self.extended_map_typedef)
+            if adf.serialize() != data:
+                raise EDecaBuildError('Serialized ADF does not round trip')
+
+        return data
@@ -3,10 +3,12 @@
 # Copyright (c) 2018–2019 Krzysztof Kamieniecki
 # Licensed under the MIT License. See LICENSE file for details.
 
+from deca.errors import EDecaOutOfData
 from deca.file import ArchiveFile
 from deca.fast_file_2 import *
 from deca.hashes import hash32_func
 import struct
+import numpy as np
 from enum import IntEnum
 from typing import List, Optional
 
@@ -141,6 +143,9 @@ class RtpcNode:
         return '{:08x} pc:{} cc:{} @ {} {:08x}'.format(
             self.name_hash, self.prop_count, self.child_count, self.data_offset, self.data_offset)
 
+    def get_prop(self, name_hash) -> Optional[RtpcProperty]:
+        return self.prop_map.get(name_hash)
+
     def repr_with_name(self):
         name = f'0x{self.name_hash:08x}'
         return 'n:{} pc:{} cc:{} @ {} {:08x}'.format(
@@ -302,4 +307,295 @@ def rtpc_from_binary(f_raw, rtpc: Optional[Rtpc] = None):
     rtpc.root_node = RtpcNode()
     rtpc_node_from_binary(f, rtpc.root_node)
 
-    return rtpc
\ No newline at end of file
+    return rtpc
+
+# Columnar parser
+#
+# The node and property tables of the whole file are read one tree level at a time into parallel
+# numpy arrays. Nodes are numbered breadth first so the children of a node are a contiguous range
+# of node indexes. RtpcNodeView gives the same interface as RtpcNode and only decodes the
+# properties and children of the nodes that are visited.
+
+rtpc_node_dtype = np.dtype([('name_hash', '<u4'), ('data_offset', '<u4'), ('prop_count', '<u2'), ('child_count', '<u2')])
+rtpc_prop_dtype = np.dtype([('name_hash', '<u4'), ('data_raw', '<u4'), ('type', 'u1')])
+
+# types where data_raw is the offset of the value instead of the value
+rtpc_offset_types = np.array([
+    k_type_str, k_type_vec2, k_type_vec3, k_type_vec4, k_type_mat3x3, k_type_mat4x4,
+    k_type_array_u32, k_type_array_f32, k_type_array_u8, k_type_objid, k_type_event,
+], dtype=np.uint8)
+
+
+def rtpc_ranges(starts, counts, stride):
+    # positions of counts[i] records of stride bytes from starts[i], for all i, in order
+    first = np.cumsum(counts) - counts
+    return np.repeat(starts - first * stride, counts) + np.arange(int(counts.sum()), dtype=np.int64) * stride
+
+
+def rtpc_gather(data, positions, dtype):
+    if len(positions) == 0:
+        return np.zeros(0, dtype=dtype)
+    if positions.min() < 0 or positions.max() + dtype.itemsize > len(data):
+        raise EDecaOutOfData()
+    return data[positions[:, None] + np.arange(dtype.itemsize)].view(dtype).reshape(-1)
+
+
+def rtpc_prop_data(buffer, prop_type, data_raw):
+    # same values as rtpc_prop_from_binary, read from the file data at data_raw
+    if prop_type == k_type_u32:
+        return data_raw
+    elif prop_type == k_type_f32:
+        return struct.unpack('f', struct.pack('I', data_raw))[0]
+    elif prop_type == k_type_str:
+        end = buffer.find(b'\00', data_raw)
+        return None if end < 0 else bytes(buffer[data_raw:end])
+    elif prop_type == k_type_vec2:
+        return list(struct.unpack_from('<2f', buffer, data_raw))
+    elif prop_type == k_type_vec3:
+        return list(struct.unpack_from('<3f', buffer, data_raw))
+    elif prop_type == k_type_vec4:
+        return list(struct.unpack_from('<4f', buffer, data_raw))
+    elif prop_type == k_type_mat3x3:
+        return list(struct.unpack_from('<9f', buffer, data_raw))
+    elif prop_type == k_type_mat4x4:
+        return list(struct.unpack_from('<16f', buffer, data_raw))
+    elif prop_type in {k_type_array_u32, k_type_array_f32, k_type_array_u8, k_type_event}:
+        n = struct.unpack_from('<I', buffer, data_raw)[0]
+        fmt = {k_type_array_u32: 'I', k_type_array_f32: 'f', k_type_array_u8: 'B', k_type_event: 'Q'}[prop_type]
+        return list(struct.unpack_from('<{}{}'.format(n, fmt), buffer, data_raw + 4))
+    elif prop_type == k_type_objid:
+        return struct.unpack_from('<Q', buffer, data_raw)[0]
+    return data_raw
+
+
+class RtpcColumns:
+    """
+    Node and property tables of an RTPC file as parallel numpy arrays.
+
+    nodes: node_name_hash, node_data_offset, node_prop_count, node_child_count, node_parent,
+    node_prop_start, node_child_start
+    properties: prop_pos, prop_name_hash, prop_data_raw, prop_type, prop_data_pos, prop_node
+    """
+
+    def __init__(self, buffer):
+        # keep a copy so callers can patch their buffer while values are still being decoded from this one
+        self.buffer = buffer if isinstance(buffer, bytes) else bytes(buffer)
+        data = np.frombuffer(self.buffer, dtype=np.uint8)
+
+        self.magic = self.buffer[0:4]
+        if self.magic != b'RTPC':
+            raise Exception('Bad MAGIC {}'.format(self.magic))
+        self.version = struct.unpack_from('<I', self.buffer, 4)[0]
+
+        max_nodes = len(self.buffer) // rtpc_node_dtype.itemsize
+        node_levels = []
+        parent_levels = []
+        prop_levels = []
+        prop_pos_levels = []
+        level = rtpc_gather(data, np.array([8], dtype=np.int64), rtpc_node_dtype)
+        level_parent = np.array([-1], dtype=np.int64)
+        level_start = 0
+        while len(level) > 0:
+            node_levels.append(level)
+            parent_levels.append(level_parent)
+
+            data_offset = level['data_offset'].astype(np.int64)
+            prop_count = level['prop_count'].astype(np.int64)
+            child_count = level['child_count'].astype(np.int64)
+            prop_pos = rtpc_ranges(data_offset, prop_count, rtpc_prop_dtype.itemsize)
+            prop_pos_levels.append(prop_pos)
+            prop_levels.append(rtpc_gather(data, prop_pos, rtpc_prop_dtype))
+
+            #  children 4-byte aligned
+            child_offset = data_offset + prop_count * rtpc_prop_dtype.itemsize
+            child_offset += (4 - (child_offset % 4)) % 4
+            child_pos = rtpc_ranges(child_offset, child_count, rtpc_node_dtype.itemsize)
+
+            level_parent = np.repeat(np.arange(level_start, level_start + len(level), dtype=np.int64), child_count)
+            level_start += len(level)
+            if level_start + len(child_pos) > max_nodes:
+                raise Exception('RTPC node table does not fit in file')
+            level = rtpc_gather(data, child_pos, rtpc_node_dtype)
+
+        nodes = np.concatenate(node_levels)
+        self.node_name_hash = nodes['name_hash']
+        self.node_data_offset = nodes['data_offset']
+        self.node_prop_count = nodes['prop_count']
+        self.node_child_count = nodes['child_count']
+        self.node_parent = np.concatenate(parent_levels)
+        prop_count = self.node_prop_count.astype(np.int64)
+        child_count = self.node_child_count.astype(np.int64)
+        self.node_prop_start = np.cumsum(prop_count) - prop_count
+        # breadth first numbering puts the children of every node right after those of the previous node
+        self.node_child_start = np.cumsum(child_count) - child_count + 1
+
+        props = np.concatenate(prop_levels)
+        self.prop_pos = np.concatenate(prop_pos_levels)
+        self.prop_name_hash = props['name_hash']
+        self.prop_data_raw = props['data_raw']
+        self.prop_type = props['type']
+        if len(self.prop_type) > 0 and self.prop_type.max() > k_type_unk_16:
+            raise Exception('NOT HANDLED {}'.format(self.prop_type.max()))
+        self.prop_data_pos = np.where(
+            np.isin(self.prop_type, rtpc_offset_types), self.prop_data_raw.astype(np.int64), self.prop_pos + 4)
+        self.prop_node = np.repeat(np.arange(len(nodes), dtype=np.int64), prop_count)
+
+        self.nodes = {}
+
+        # lookup tables, built on first use
+        self.node_hash_order = None
+        self.prop_hash_order = None
+        self.prop_node_keys = None
+        self.prop_strings = {}
+
+    @property
+    def node_count(self):
+        return len(self.node_name_hash)
+
+    @property
+    def prop_count(self):
+        return len(self.prop_name_hash)
+
+    @property
+    def root_node(self):
+        return self.node(0)
+
+    def node(self, index):
+        node = self.nodes.get(index)
+        if node is None:
+            node = RtpcNodeView(self, index)
+            self.nodes[index] = node
+        return node
+
+    def find_node_indexes(self, name_hash):
+        # indexes of all nodes with name_hash, in file order
+        if self.node_hash_order is None:
+            self.node_hash_order = np.argsort(self.node_name_hash, kind='stable')
+        hashes = self.node_name_hash[self.node_hash_order]
+        start, end = np.searchsorted(hashes, name_hash, side='left'), np.searchsorted(hashes, name_hash, side='right')
+        return self.node_hash_order[start:end]
+
+    def find_prop_indexes(self, name_hash, value=None):
+        # indexes of all properties with name_hash, in file order, optionally only those equal to value
+        if self.prop_hash_order is None:
+            self.prop_hash_order = np.argsort(self.prop_name_hash, kind='stable')
+        hashes = self.prop_name_hash[self.prop_hash_order]
+        start, end = np.searchsorted(hashes, name_hash, side='left'), np.searchsorted(hashes, name_hash, side='right')
+        indexes = self.prop_hash_order[start:end]
+        if value is None:
+            return indexes
+        if isinstance(value, (bytes, str)):
+            strings = self.prop_strings.get(name_hash)
+            if strings is None:
+                strings = {}
+                for i in indexes[self.prop_type[indexes] == k_type_str]:
+                    strings.setdefault(rtpc_prop_data(self.buffer, k_type_str, int(self.prop_data_raw[i])), []).append(i)
+                self.prop_strings[name_hash] = strings
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            return np.array(strings.get(value, []), dtype=np.int64)
+        if isinstance(value, float):
+            return indexes[(self.prop_type[indexes] == k_type_f32) & (self.prop_data_raw[indexes].view('<f4') == value)]
+        return indexes[(self.prop_type[indexes] == k_type_u32) & (self.prop_data_raw[indexes] == value)]
+
+    def find_node_prop_index(self, node_index, name_hash):
+        # index of the property name_hash of a node, the last one if there are several like prop_map, or -1
+        if self.prop_node_keys is None:
+            keys = (self.prop_node.astype(np.uint64) << np.uint64(32)) | self.prop_name_hash.astype(np.uint64)
+            order = np.argsort(keys, kind='stable')
+            self.prop_node_keys = (keys[order], order)
+        keys, order = self.prop_node_keys
+        key = (node_index << 32) | name_hash
+        i = np.searchsorted(keys, key, side='right') - 1
+        if i < 0 or keys[i] != key:
+            return -1
+        return int(order[i])
+
+    def find_nodes(self, name_hash) -> List[RtpcNode]:
+        return [self.node(int(i)) for i in self.find_node_indexes(name_hash)]
+
+    def find_props(self, name_hash, value=None) -> List[RtpcProperty]:
+        return [self.prop(int(i)) for i in self.find_prop_indexes(name_hash, value)]
+
+    def find_nodes_with_prop(self, name_hash, value=None) -> List[RtpcNode]:
+        # nodes with a property name_hash (equal to value), e.g. all nodes of a class
+        node_indexes = self.prop_node[self.find_prop_indexes(name_hash, value)]
+        return [self.node(int(i)) for i in np.unique(node_indexes)]
+
+    def prop(self, index):
+        prop = RtpcProperty()
+        prop.pos = int(self.prop_pos[index])
+        prop.name_hash = int(self.prop_name_hash[index])
+        prop.data_raw = int(self.prop_data_raw[index])
+        prop.type = int(self.prop_type[index])
+        prop.data_pos = int(self.prop_data_pos[index])
+        prop.data = rtpc_prop_data(self.buffer, prop.type, prop.data_raw)
+        return prop
+
+
+class RtpcNodeView(RtpcNode):
+    __slots__ = ('columns', 'index', 'props', 'props_by_hash', 'children', 'children_by_hash')
+
+    def __init__(self, columns: RtpcColumns, index: int):
+        self.columns = columns
+        self.index = index
+        self.props = None
+        self.props_by_hash = None
+        self.children = None
+        self.children_by_hash = None
+
+    @property
+    def name_hash(self):
+        return int(self.columns.node_name_hash[self.index])
+
+    @property
+    def data_offset(self):
+        return int(self.columns.node_data_offset[self.index])
+
+    @property
+    def prop_count(self):
+        return int(self.columns.node_prop_count[self.index])
+
+    @property
+    def child_count(self):
+        return int(self.columns.node_child_count[self.index])
+
+    @property
+    def prop_table(self) -> List[RtpcProperty]:
+        if self.props is None:
+            start = int(self.columns.node_prop_start[self.index])
+            self.props = [self.columns.prop(i) for i in range(start, start + self.prop_count)]
+        return self.props
+
+    def get_prop(self, name_hash) -> Optional[RtpcProperty]:
+        if self.props_by_hash is not None:
+            return self.props_by_hash.get(name_hash)
+        index = self.columns.find_node_prop_index(self.index, name_hash)
+        if index < 0:
+            return None
+        if self.props is not None:
+            return self.props[index - int(self.columns.node_prop_start[self.index])]
+        return self.columns.prop(index)
+
+    @property
+    def prop_map(self):
+        if self.props_by_hash is None:
+            self.props_by_hash = {prop.name_hash: prop for prop in self.prop_table}
+        return self.props_by_hash
+
+    @property
+    def child_table(self) -> List[RtpcNode]:
+        if self.children is None:
+            start = int(self.columns.node_child_start[self.index])
+            self.children = [self.columns.node(i) for i in range(start, start + self.child_count)]
+        return self.children
+
+    @property
+    def child_map(self):
+        if self.children_by_hash is None:
+            self.children_by_hash = {child.name_hash: child for child in self.child_table}
+        return self.children_by_hash
+
+
+def rtpc_columns_from_binary(buffer) -> RtpcColumns:
+    return RtpcColumns(buffer)
@@ -6,7 +6,8 @@
 from deca.path import UniPath
 from deca.file import ArchiveFile
 from deca.hashes import hash32_func
-from deca.util import align_to
+from deca.util import align_to, copy_file_data
+import io
 import os
 import numpy as np
 
@@ -140,7 +141,11 @@ class FileSarc:
 
             self.entries_end = f.tell()
 
-    def header_serialize(self, f):
+    def header_serialize(self, f, fill_data=True):
+        """
+        Lay out the entries and write the header, returns the end of the data. With fill_data the data area is
+        filled with zeros as well, otherwise only the header is written.
+        """
         vpath_string = b''
 
         if self.ver2 == 2:
@@ -201,7 +206,10 @@ class FileSarc:
                 entry.serialize_v2(f)
 
             # fill with zeros to data offset position
-            f.write(b'\00' * (data_write_pos - f.tell()))
+            if fill_data:
+                f.write(b'\00' * (data_write_pos - f.tell()))
+            else:
+                f.write(b'\00' * (16 + dir_block_len - f.tell()))
 
         elif self.ver2 == 3:
             f.write_u32(4)              # Version == 4 for supported sarc files
@@ -215,11 +223,72 @@ class FileSarc:
                 entry.serialize_v3(f)
 
             # fill with zeros to data offset position
-            f.write(b'\00' * (data_write_pos - f.tell()))
+            if fill_data:
+                f.write(b'\00' * (data_write_pos - f.tell()))
+            else:
+                f.write(b'\00' * (16 + dir_block_len - f.tell()))
 
         else:
             raise NotImplementedError('FileSarc.header_serialize: self.ver2 == {}'.format(self.ver2))
 
+        return data_write_pos
+
+    def serialize(self, fout, fin, changed_data=None):
+        """
+        Write the archive to fout with the entries in changed_data (v_path -> bytes) replaced. The header and the
+        changed entries are written from memory, every other entry is copied from its current offset in fin. The
+        entries are laid out again and get the offsets and lengths they have in fout.
+        """
+        if changed_data is None:
+            changed_data = {}
+
+        src_offsets = [entry.offset for entry in self.entries]
+        for entry in self.entries:
+            if entry.v_path in changed_data:
+                entry.length = len(changed_data[entry.v_path])
+
+        header = io.BytesIO()
+        data_end = self.header_serialize(ArchiveFile(header), fill_data=False)
+        fout.seek(0)
+        fout.write(header.getvalue())
+
+        data_pos = fout.tell()
+        for entry, src_offset in zip(self.entries, src_offsets):
+            if entry.is_symlink:
+                continue
+            data = changed_data.get(entry.v_path)
+            if data is None:
+                copy_file_data(fout, fin, src_offset, entry.offset, entry.length)
+            else:
+                fout.seek(entry.offset)
+                fout.write(data)
+            data_pos = max(data_pos, entry.offset + entry.length)
+
+        # zeros between the entries are left to the file system, only the tail is written
+        fout.seek(data_pos)
+        fout.write(b'\00' * (data_end - data_pos))
+
+    def sizes_match(self, changed_data):
+        for entry in self.entries:
+            data = changed_data.get(entry.v_path)
+            if data is not None and len(data) != entry.length:
+                return False
+        return True
+
+    def serialize_in_place(self, f, changed_data):
+        """
+        Write the entries in changed_data (v_path -> bytes) over an archive with this layout. Only works if the
+        entries keep their sizes, in which case the header and all other entries are already correct.
+        """
+        if not self.sizes_match(changed_data):
+            raise ValueError('FileSarc.serialize_in_place: changed entries must keep their sizes')
+
+        for entry in self.entries:
+            data = changed_data.get(entry.v_path)
+            if data is not None:
+                f.seek(entry.offset)
+                f.write(data)
+
     def dump_str(self):
         sbuf = ''
         for ent in self.entries:
@@ -3,6 +3,8 @@
 # Copyright (c) 2018–2019 Krzysztof Kamieniecki
 # Licensed under the MIT License. See LICENSE file for details.
 
+import mmap
+import os
 import struct
 from deca.errors import EDecaOutOfData
 
@@ -72,23 +74,21 @@ class ArchiveFile:
     def write(self, blk):
         return self.f.write(blk)
 
-    def read_strz(self, delim=b'\00'):
-        eof = False
-        r = b''
+    def read_strz(self, delim=b'\00', chunk_size=256):
+        # scan ahead in chunks and seek back past the delimiter instead of reading byte by byte
+        pos = self.f.tell()
+        parts = []
         while True:
-            v = self.f.read(1)
+            v = self.f.read(chunk_size)
             if len(v) == 0:
-                eof = True
-                break
-            elif v == delim:
-                break
-            else:
-                r = r + v
-
-        if eof:
-            return None
-        else:
-            return r
+                return None
+            idx = v.find(delim)
+            if idx >= 0:
+                parts.append(v[:idx])
+                self.f.seek(pos + idx + len(delim))
+                return b''.join(parts)
+            parts.append(v)
+            pos += len(v)
 
     def read_base(self, fmt, elen, n, raise_on_no_data):
         if n is None:
@@ -210,3 +210,87 @@ class ArchiveFile:
 
     def write_f64(self, v):
         return self.write_base('d', 8, v)
+
+
+class MmapArchiveFile(ArchiveFile):
+    """
+    Read only ArchiveFile over a memory mapped file.
+
+    Reads slice the mapping directly, so only the pages that are touched are loaded and
+    `read_view` can hand out data without copying it.
+    """
+
+    def __init__(self, f, debug=False, endian=None):
+        if isinstance(f, (str, os.PathLike)):
+            with open(f, 'rb') as fp:
+                mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(mm, debug=debug, endian=endian)
+        self.mm = mm
+        self.view = memoryview(mm)
+        self.pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.close()
+
+    def close(self):
+        self.view.release()
+        self.mm.close()
+
+    def __len__(self):
+        return len(self.mm)
+
+    def seek(self, pos):
+        self.pos = pos
+        return pos
+
+    def tell(self):
+        return self.pos
+
+    def read_view(self, n=None):
+        bpos = self.pos
+        if n is None:
+            epos = len(self.mm)
+        else:
+            epos = min(bpos + n, len(self.mm))
+        self.pos = max(bpos, epos)
+        return self.view[bpos:epos]
+
+    def read(self, n=None):
+        return self.read_view(n).tobytes()
+
+    def write(self, blk):
+        raise NotImplementedError('MmapArchiveFile is read only')
+
+    def read_strz(self, delim=b'\00', chunk_size=None):
+        idx = self.mm.find(delim, self.pos)
+        if idx < 0:
+            self.pos = max(self.pos, len(self.mm))
+            return None
+        v = self.mm[self.pos:idx]
+        self.pos = idx + len(delim)
+        return v
+
+    def read_base(self, fmt, elen, n, raise_on_no_data):
+        count = 1 if n is None else n
+        if self.pos + elen * count > len(self.mm):
+            self.pos = len(self.mm)
+            if raise_on_no_data:
+                raise EDecaOutOfData()
+            return None
+        if n is None:
+            v = struct.unpack_from(fmt, self.mm, self.pos)[0]
+        else:
+            v = struct.unpack_from(fmt * n, self.mm, self.pos)
+
+        if self.debug:
+            vs = ['{:02x}'.format(t) for t in self.mm[self.pos:self.pos + elen * count]]
+            vs = ''.join(vs)
+            print('{} {}'.format(vs, v))
+
+        self.pos += elen * count
+        return v
@@ -37,12 +37,12 @@ class CostModel(object):
 cost_model_params = 0
 
 
-@njit(inline=CostModel(cost_model_params))
+@njit(cache=True, inline=CostModel(cost_model_params))
 def rot(x, k):
     return (x << k) | (x >> (32 - k))
 
 
-@njit(inline=CostModel(cost_model_params))
+@njit(cache=True, inline=CostModel(cost_model_params))
 def mix(a, b, c):
     a &= 0xffffffff; b &= 0xffffffff; c &= 0xffffffff
     a -= c; a &= 0xffffffff; a ^= rot(c,4);  a &= 0xffffffff; c += b; c &= 0xffffffff
@@ -54,7 +54,7 @@ def mix(a, b, c):
     return a, b, c
 
 
-@njit(inline=CostModel(cost_model_params))
+@njit(cache=True, inline=CostModel(cost_model_params))
 def final(a, b, c):
     a &= 0xffffffff; b &= 0xffffffff; c &= 0xffffffff
     c ^= b; c &= 0xffffffff; c -= rot(b,14); c &= 0xffffffff
@@ -67,7 +67,7 @@ def final(a, b, c):
     return a, b, c
 
 
-@njit(inline=CostModel(cost_model_params))
+@njit(cache=True, inline=CostModel(cost_model_params))
 def hashlittle2(data, initval=0, initval2=0):
     length = lenpos = len(data)
 
@@ -105,7 +105,7 @@ def hashlittle2(data, initval=0, initval2=0):
     return c, b
 
 
-@njit(inline=CostModel(cost_model_params))
+@njit(cache=True, inline=CostModel(cost_model_params))
 def hash32_func_bytes(data, init_val=0):
     c, b = hashlittle2(data, init_val, 0)
     return c
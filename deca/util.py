@@ -115,6 +115,63 @@ def align_to(v, boundry):
     return ((v + boundry - 1) // boundry) * boundry
 
 
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def _file_descriptor(f):
+    try:
+        return f.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def copy_file_data(fout, fin, src_offset, dst_offset, length, block_size=COPY_BLOCK_SIZE):
+    """
+    Copy length bytes at src_offset in fin to dst_offset in fout. Real files are copied in the kernel with
+    os.copy_file_range or os.sendfile where the platform has them, everything else in block_size chunks.
+    """
+    fout.flush()
+    fd_in = _file_descriptor(fin)
+    fd_out = _file_descriptor(fout)
+
+    if fd_in is not None and fd_out is not None and hasattr(os, 'copy_file_range'):
+        try:
+            while length > 0:
+                n = os.copy_file_range(fd_in, fd_out, length, src_offset, dst_offset)
+                if n == 0:
+                    break
+                src_offset += n
+                dst_offset += n
+                length -= n
+        except OSError:
+            # not supported between these files (old kernel, different file systems, ...)
+            pass
+
+    if length > 0 and fd_in is not None and fd_out is not None and hasattr(os, 'sendfile'):
+        try:
+            os.lseek(fd_out, dst_offset, os.SEEK_SET)
+            while length > 0:
+                n = os.sendfile(fd_out, fd_in, src_offset, length)
+                if n == 0:
+                    break
+                src_offset += n
+                dst_offset += n
+                length -= n
+        except OSError:
+            pass
+
+    if length > 0:
+        fin.seek(src_offset)
+        fout.seek(dst_offset)
+        while length > 0:
+            blk = fin.read(min(block_size, length))
+            if not blk:
+                raise EOFError('copy_file_data: {} bytes missing at {}'.format(length, src_offset))
+            fout.write(blk)
+            src_offset += len(blk)
+            length -= len(blk)
+
+
 def make_dir_for_file(fn):
     new_dir = os.path.dirname(fn)
     os.makedirs(new_dir, exist_ok=True)
@@ -0,0 +1,4 @@
+from modbuilder.jit_cache import configure_jit_cache
+
+# has to run before deca compiles its kernels
+configure_jit_cache()
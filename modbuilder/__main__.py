@@ -1,6 +1,13 @@
-from modbuilder import gui
+import multiprocessing
+import sys
 
 def main():
+    # required for the build worker processes in frozen builds
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from modbuilder import cli
+        sys.exit(cli.main(sys.argv[1:]))
+    from modbuilder import gui
     gui.main()
 
 if __name__ == "__main__":
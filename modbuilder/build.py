@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import ModuleType
+from typing import Callable
+
+from modbuilder import build_journal, mods
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_mod_files(mod: ModuleType, mod_options: dict) -> list[str]:
+  if hasattr(mod, "FILE"):
+    if "*" in mod.FILE:
+      parent = os.path.dirname(mod.FILE)
+      return sorted(f"{parent}/{file.name}" for file in (mods.APP_DIR_PATH / "org").glob(mod.FILE))
+    return [mod.FILE]
+  return [file.replace("\\", "/") for file in mod.get_files(mod_options)]
+
+def _get_mod_resources(mod: ModuleType, mod_options: dict) -> set[str]:
+  files = get_mod_files(mod, mod_options)
+  resources = set(files)
+  if hasattr(mod, "merge_files"):
+    # plugin merges write into the bundles that contain their files
+    for file in files:
+      resources.update(mods.find_bundles(file))
+  return resources
+
+def plan_build(selected_mods: dict[str, dict]) -> list[dict[str, dict]]:
+  """Group mods that share files; each group keeps the order of the mod list"""
+  mod_keys = list(selected_mods.keys())
+  parents = list(range(len(mod_keys)))
+
+  def find(i: int) -> int:
+    while parents[i] != i:
+      parents[i] = parents[parents[i]]
+      i = parents[i]
+    return i
+
+  resource_owners = {}
+  for i, mod_key in enumerate(mod_keys):
+    mod = mods.get_mod(mod_key)
+    for resource in _get_mod_resources(mod, selected_mods[mod_key]):
+      if resource in resource_owners:
+        parents[find(i)] = find(resource_owners[resource])
+      else:
+        resource_owners[resource] = i
+
+  groups = {}
+  for i, mod_key in enumerate(mod_keys):
+    groups.setdefault(find(i), {})[mod_key] = selected_mods[mod_key]
+  return list(groups.values())
+
+def build_mod(mod_key: str, mod_options: dict) -> list[str]:
+  mod = mods.get_mod(mod_key)
+  if hasattr(mod, "FILE"):
+    modded_files = mods.copy_files_to_mod(mod.FILE)
+  else:
+    modded_files = mods.copy_all_files_to_mod(mod.get_files(mod_options))
+  mods.apply_mod(mod, mod_options)
+  if hasattr(mod, "merge_files"):
+    mod.merge_files(modded_files, mod_options)
+  return modded_files
+
+def build_group(group: dict[str, dict]) -> tuple[list[str], list[str], list[str]]:
+  # modded files stay in memory until every mod in the group has been applied
+  # returns the files of the mods, every dropzone file the group produced and every org file it read
+  mod_files = []
+  workspace = mods.open_workspace()
+  try:
+    for mod_key, mod_options in group.items():
+      workspace.source = mod_key
+      mod_files += build_mod(mod_key, mod_options)
+  except Exception:
+    mods.close_workspace(commit=False)
+    raise
+  written_files = mods.close_workspace()
+  # org files read before the build (plugin and global data loaded once per process) count for every group
+  inputs = workspace.inputs | mods.PROCESS_INPUTS
+  return mod_files, sorted(set(written_files) | workspace.outputs), sorted(inputs)
+
+def _init_worker() -> None:
+  mods.load_mods()
+
+def _get_group_resources(group: dict[str, dict]) -> set[str]:
+  resources = set()
+  for mod_key, mod_options in group.items():
+    resources.update(_get_mod_resources(mods.get_mod(mod_key), mod_options))
+  return resources
+
+def _get_group_bundles(resources: set[str]) -> set[str]:
+  # shared bundles that the group's files are merged into after all groups are built
+  merge_bundles = {bundle for bundle, _ in mods.get_merge_targets()}
+  bundles = resources & merge_bundles
+  for resource in resources:
+    bundles.update(mods.get_merge_bundles(resource))
+  return bundles
+
+def _fingerprint_group(group: dict[str, dict]) -> str:
+  # the org files a group reads are only known once it is built; the journal checks them, see build_journal.py
+  plugin_paths = {mod_key: mods.get_mod_path(mods.get_mod(mod_key)) for mod_key in group}
+  return build_journal.fingerprint_group(mods.__version__, group, plugin_paths)
+
+def _find_stale_groups(journal: build_journal.BuildJournal, fingerprints: list[str], group_resources: list[set[str]], group_bundles: list[set[str]]) -> tuple[set[int], set[str]]:
+  stale_groups = {i for i, fingerprint in enumerate(fingerprints) if not journal.is_group_current(fingerprint)}
+  dirty_bundles = {bundle for bundle in journal.bundles if not journal.is_bundle_current(bundle)}
+  deselected_files = set()
+  for fingerprint, journal_group in journal.groups.items():
+    if fingerprint not in fingerprints:
+      dirty_bundles.update(journal_group["bundles"])
+      deselected_files.update(journal_group["files"])
+  # dirty bundles are merged again from the loose files the groups left in the dropzone. A group is rebuilt
+  # when it writes into a dirty bundle itself, or when it shares a file with a group whose files are removed
+  changed = True
+  while changed:
+    changed = False
+    removed_files = set(deselected_files)
+    for i in stale_groups:
+      dirty_bundles.update(group_bundles[i])
+      if (journal_group := journal.groups.get(fingerprints[i])) is not None:
+        removed_files.update(journal_group["files"])
+    for i, fingerprint in enumerate(fingerprints):
+      if i in stale_groups:
+        continue
+      if not dirty_bundles.isdisjoint(group_resources[i]) or not removed_files.isdisjoint(journal.groups[fingerprint]["files"]):
+        stale_groups.add(i)
+        changed = True
+  return stale_groups, dirty_bundles
+
+def build_mods(selected_mods: dict[str, dict], progress: Callable[[float], None] = None, max_workers: int = None) -> None:
+  groups = plan_build(selected_mods)
+  group_resources = [_get_group_resources(group) for group in groups]
+  group_bundles = [_get_group_bundles(resources) for resources in group_resources]
+  fingerprints = [_fingerprint_group(group) for group in groups]
+
+  journal = build_journal.load_build_journal(mods.BUILD_JOURNAL_PATH, mods.MOD_PATH, mods.ORG_PATH)
+  if journal is None:
+    mods.clear_mod()
+    journal = build_journal.BuildJournal(mods.MOD_PATH, mods.ORG_PATH)
+  stale_groups, dirty_bundles = _find_stale_groups(journal, fingerprints, group_resources, group_bundles)
+
+  # remove everything the stale and deselected groups produced so it is copied fresh from org/
+  current_fingerprints = {fingerprint for i, fingerprint in enumerate(fingerprints) if i not in stale_groups}
+  new_journal = build_journal.BuildJournal(mods.MOD_PATH, mods.ORG_PATH)
+  new_journal.input_hashes.update(journal.input_hashes)
+  merged_files = []
+  for fingerprint, journal_group in journal.groups.items():
+    if fingerprint in current_fingerprints:
+      new_journal.groups[fingerprint] = journal_group
+      merged_files += journal_group["merged"]
+    else:
+      for file in journal_group["files"]:
+        (mods.MOD_PATH / file).unlink(missing_ok=True)
+  for bundle, stat in journal.bundles.items():
+    if bundle in dirty_bundles:
+      (mods.MOD_PATH / bundle).unlink(missing_ok=True)
+    else:
+      new_journal.bundles[bundle] = stat
+
+  stale_indexes = sorted(stale_groups)
+  if max_workers is None:
+    max_workers = os.cpu_count() or 1
+  max_workers = min(max_workers, len(stale_indexes))
+  logger.debug(f"Building {len(selected_mods)} mods in {len(groups)} groups ({len(groups) - len(stale_indexes)} unchanged) with {max_workers} workers")
+
+  mod_files = []
+  group_files = {}
+  completed = sum(len(group) for i, group in enumerate(groups) if i not in stale_groups)
+  if progress and completed:
+    progress(completed / len(selected_mods))
+  def group_completed(i: int, files: tuple[list[str], list[str], list[str]]) -> None:
+    nonlocal completed
+    mod_files.extend(files[0])
+    group_files[i] = files
+    completed += len(groups[i])
+    if progress:
+      progress(completed / len(selected_mods))
+
+  if max_workers <= 1:
+    for i in stale_indexes:
+      group_completed(i, build_group(groups[i]))
+  else:
+    # spawn so workers never inherit GUI state; each worker loads the plugins once
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker) as executor:
+      futures = {executor.submit(build_group, groups[i]): i for i in stale_indexes}
+      for future in as_completed(futures):
+        group_completed(futures[future], future.result())
+
+  # only the dirty bundles are merged, from the files of the rebuilt groups and those kept from the last build
+  mods.open_workspace()
+  try:
+    mods.merge_files(mod_files + merged_files, bundles=dirty_bundles)
+  except Exception:
+    mods.close_workspace(commit=False)
+    raise
+  mods.close_workspace()
+  mods.package_mod()
+
+  for i, (group_mod_files, output_files, input_files) in group_files.items():
+    files = (group_resources[i] | set(group_mod_files) | set(output_files)) - group_bundles[i]
+    # the org bundles the group's files are merged into are read by the merge
+    inputs = set(input_files) | group_bundles[i]
+    merged = [file for file in group_mod_files if mods.get_merge_bundles(file)]
+    new_journal.add_group(fingerprints[i], list(groups[i].keys()), list(files), list(group_bundles[i]), merged, list(inputs))
+  for bundle in dirty_bundles:
+    new_journal.add_bundle(bundle)
+  new_journal.save(mods.BUILD_JOURNAL_PATH)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Record of the last build, used to only rebuild the groups of mods whose inputs changed
+#
+# Each group is stored under a fingerprint of its app version, mod keys and options and plugin
+# sources, along with the dropzone files it produced and the org files it read while it was
+# built. Org files are compared by a hash of their content; the hash is only computed again
+# when the size or mtime of the file changed. Bundles that collect files from several groups
+# are tracked separately and merged again from the loose files the groups left in the dropzone.
+BUILD_JOURNAL_VERSION = 2
+
+
+def _file_stat(path: Path) -> list[int] | None:
+  try:
+    stat = path.stat()
+  except OSError:
+    return None
+  return [stat.st_size, stat.st_mtime_ns]
+
+
+def _file_hash(path: Path) -> str:
+  digest = hashlib.blake2b(digest_size=16)
+  with path.open("rb") as fp:
+    while chunk := fp.read(1024 * 1024):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def fingerprint_group(app_version: str, group: dict[str, dict], plugin_paths: dict[str, Path]) -> str:
+  digest = hashlib.blake2b(digest_size=16)
+  digest.update(json.dumps([BUILD_JOURNAL_VERSION, app_version]).encode("utf-8"))
+  for mod_key, mod_options in group.items():
+    digest.update(json.dumps([mod_key, mod_options], sort_keys=True, default=str).encode("utf-8"))
+    digest.update(plugin_paths[mod_key].read_bytes())
+  return digest.hexdigest()
+
+
+class BuildJournal:
+  def __init__(self, base_path: Path, org_path: Path, groups: dict[str, dict] = None, bundles: dict[str, list[int]] = None) -> None:
+    self.base_path = base_path
+    self.org_path = org_path
+    self.groups = {} if groups is None else groups  # fingerprint -> {"mods", "files", "bundles", "merged", "inputs"}
+    self.bundles = {} if bundles is None else bundles  # shared bundle -> stat after the last merge
+    self.input_hashes = {}  # org file -> [size, mtime, hash] of the org files read by the groups
+    for group in self.groups.values():
+      self.input_hashes.update(group["inputs"])
+
+  def get_input_record(self, file: str) -> list | None:
+    # the hash is only computed again when the size or mtime of the org file changed
+    path = self.org_path / file
+    stat = _file_stat(path)
+    if stat is None:
+      return None
+    record = self.input_hashes.get(file)
+    if record is None or record[:2] != stat:
+      record = stat + [_file_hash(path)]
+      self.input_hashes[file] = record
+    return record
+
+  def is_group_current(self, fingerprint: str) -> bool:
+    group = self.groups.get(fingerprint)
+    if group is None:
+      return False
+    if not all(_file_stat(self.base_path / file) == stat for file, stat in group["files"].items()):
+      return False
+    for file, record in group["inputs"].items():
+      current = self.get_input_record(file)
+      if current is None or current[2] != record[2]:
+        return False
+      group["inputs"][file] = current
+    return True
+
+  def is_bundle_current(self, bundle: str) -> bool:
+    return bundle in self.bundles and _file_stat(self.base_path / bundle) == self.bundles[bundle]
+
+  def add_group(self, fingerprint: str, mod_keys: list[str], files: list[str], bundles: list[str], merged: list[str], inputs: list[str]) -> None:
+    # merged = files of the group that are merged into the shared bundles
+    self.groups[fingerprint] = {
+      "mods": mod_keys,
+      "files": {file: stat for file in sorted(set(files)) if (stat := _file_stat(self.base_path / file)) is not None},
+      "bundles": sorted(bundles),
+      "merged": sorted(set(merged)),
+      "inputs": {file: record for file in sorted(set(inputs)) if (record := self.get_input_record(file)) is not None},
+    }
+
+  def add_bundle(self, bundle: str) -> None:
+    if (stat := _file_stat(self.base_path / bundle)) is not None:
+      self.bundles[bundle] = stat
+
+  def save(self, journal_path: Path) -> None:
+    journal_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = journal_path.with_name(f"{journal_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"version": BUILD_JOURNAL_VERSION, "groups": self.groups, "bundles": self.bundles}, indent=1), encoding="utf-8")
+    os.replace(tmp_path, journal_path)
+
+
+def load_build_journal(journal_path: Path, base_path: Path, org_path: Path) -> BuildJournal | None:
+  # the journal is removed while a build runs, so an interrupted build starts from scratch
+  if not journal_path.exists():
+    return None
+  try:
+    journal = json.loads(journal_path.read_text(encoding="utf-8"))
+    journal_path.unlink()
+    if journal.get("version") != BUILD_JOURNAL_VERSION:
+      return None
+    return BuildJournal(base_path, org_path, journal["groups"], journal["bundles"])
+  except (OSError, ValueError, KeyError) as ex:
+    logger.debug(f"Ignoring unreadable build journal: {ex}")
+    return None
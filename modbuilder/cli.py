@@ -0,0 +1,94 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from deepmerge import always_merger
+from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn, TimeElapsedColumn
+
+from modbuilder import build, mods
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _read_mod_list(mod_list: str) -> dict:
+  # accept either the name of a saved mod list or a path to one
+  path = Path(mod_list)
+  if path.suffix.lower() == ".json" and path.exists():
+    return json.loads(path.read_text())
+  saved_path = mods.APP_DIR_PATH / "saves" / f"{mod_list}.json"
+  if not saved_path.exists():
+    raise FileNotFoundError(f"Could not find saved mod list: {mod_list}")
+  return mods.load_saved_mod_list(mod_list)
+
+
+def load_mod_list(mod_list: str) -> tuple[dict[str, dict], dict[str, str]]:
+  """Validate a saved mod list the same way the GUI does when loading it; returns (mods to build, skipped mods)"""
+  loaded_mods_json = _read_mod_list(mod_list)
+  version = loaded_mods_json.get("version", "0.0.0")
+  loaded_saved_mods = loaded_mods_json["mod_options"] if version != "0.0.0" else loaded_mods_json
+  mods_to_keep = {}
+  updated_mods = {}
+  skipped_mods = {}
+  for mod_key, mod_options in loaded_saved_mods.items():
+    result, output = mods.validate_and_update_mod(mod_key, mod_options, version)
+    if result == "invalid":
+      skipped_mods[mod_key] = "unsupported mod configuration"
+    elif result == "update":
+      updated_mods = always_merger.merge(updated_mods, output)
+    elif result == "error":
+      skipped_mods[mod_key] = str(output)
+    elif result == "valid":
+      mods_to_keep[mod_key] = mod_options
+    else:
+      raise ValueError(f"Error validating/updating mod: {mods.format_mod_display_name(mod_key, mod_options)}")
+  return always_merger.merge(mods_to_keep, updated_mods), skipped_mods
+
+
+def build_mod_list(mod_list: str, game_path: Path = None, replace: bool = False, max_workers: int = None, strict: bool = False) -> int:
+  mods.load_mods()
+  selected_mods, skipped_mods = load_mod_list(mod_list)
+  for mod_key, reason in skipped_mods.items():
+    logger.warning(f"Skipping {mod_key}: {reason}")
+  if strict and skipped_mods:
+    logger.error(f"{len(skipped_mods)} mods in {mod_list} could not be loaded")
+    return 1
+  if not selected_mods:
+    logger.error(f"No mods to build in {mod_list}")
+    return 1
+
+  start_time = time.perf_counter()
+  with Progress(TextColumn("{task.description}"), BarColumn(), TaskProgressColumn(), TimeElapsedColumn()) as progress:
+    task = progress.add_task(f"Building {len(selected_mods)} mods", total=1)
+    build.build_mods(selected_mods, progress=lambda completed: progress.update(task, completed=completed), max_workers=max_workers)
+    progress.update(task, completed=1)
+  logger.info(f"Built {len(selected_mods)} mods from {mod_list} in {time.perf_counter() - start_time:.2f}s: {mods.APP_DIR_PATH / 'mod'}")
+
+  if game_path is not None:
+    mods.copy_dropzone(replace=replace, game_path=game_path)
+    logger.info(f"Copied mods to {game_path / 'dropzone'}")
+  return 0
+
+
+def main(argv: list[str] = None) -> int:
+  parser = argparse.ArgumentParser(prog="modbuilder", description="Build mods without opening the Mod Builder window")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  build_parser = subparsers.add_parser("build", help="build a saved mod list into the mod/dropzone folder")
+  build_parser.add_argument("mod_list", help="name of a saved mod list in saves/ or path to a saved mod list JSON file")
+  build_parser.add_argument("--game-path", type=Path, help="copy the built mods to the dropzone folder of this game folder")
+  build_parser.add_argument("--replace", action="store_true", help="delete the game's dropzone folder before copying")
+  build_parser.add_argument("--workers", type=int, help="number of worker processes (defaults to the number of CPUs)")
+  build_parser.add_argument("--strict", action="store_true", help="fail instead of skipping mods that cannot be loaded")
+  args = parser.parse_args(argv)
+
+  try:
+    return build_mod_list(args.mod_list, args.game_path, args.replace, args.workers, args.strict)
+  except FileNotFoundError as ex:
+    logger.error(ex)
+    return 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
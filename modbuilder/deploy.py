@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Deployment of the built dropzone into the game's dropzone folder
+#
+# A manifest in the game's dropzone lists every file Mod Builder deployed with its size and
+# hash, the stat of the build file it was hashed from and the stat of the deployed copy. Only
+# files whose hash changed (or whose deployed copy was touched) are copied, and only files from
+# the previous manifest that are no longer built are deleted; files put there by anyone else are
+# left alone unless the dropzone is replaced. An empty or missing build is never deployed, it
+# would delete every mod from the game's dropzone.
+DEPLOY_MANIFEST_NAME = "modbuilder_manifest.json"
+DEPLOY_MANIFEST_VERSION = 1
+DEPLOY_MAX_WORKERS = 8
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _file_stat(path: Path) -> list[int] | None:
+  try:
+    stat = path.stat()
+  except OSError:
+    return None
+  return [stat.st_size, stat.st_mtime_ns]
+
+
+def hash_file(path: Path) -> str:
+  digest = hashlib.blake2b(digest_size=16)
+  with path.open("rb") as fp:
+    while block := fp.read(HASH_BLOCK_SIZE):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def load_manifest(dropzone_path: Path) -> dict[str, dict]:
+  manifest_path = dropzone_path / DEPLOY_MANIFEST_NAME
+  try:
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest.get("version") != DEPLOY_MANIFEST_VERSION:
+      return {}
+    return manifest["files"]
+  except FileNotFoundError:
+    return {}
+  except (OSError, ValueError, KeyError) as ex:
+    logger.debug(f"Ignoring unreadable deploy manifest: {ex}")
+    return {}
+
+
+def save_manifest(dropzone_path: Path, files: dict[str, dict]) -> None:
+  manifest_path = dropzone_path / DEPLOY_MANIFEST_NAME
+  tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+  tmp_path.write_text(json.dumps({"version": DEPLOY_MANIFEST_VERSION, "files": files}, indent=1, sort_keys=True), encoding="utf-8")
+  os.replace(tmp_path, manifest_path)
+
+
+def _describe_file(src_path: Path, previous: dict | None) -> dict:
+  # the hash of an unchanged build file is taken from the previous manifest
+  stat = _file_stat(src_path)
+  if previous is not None and previous.get("source") == stat:
+    file_hash = previous["hash"]
+  else:
+    file_hash = hash_file(src_path)
+  return {"size": stat[0], "hash": file_hash, "source": stat}
+
+
+def _copy_file(src_path: Path, dest_path: Path) -> list[int]:
+  dest_path.parent.mkdir(parents=True, exist_ok=True)
+  tmp_path = dest_path.with_name(f"{dest_path.name}.{os.getpid()}.tmp")
+  try:
+    shutil.copy2(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+  finally:
+    tmp_path.unlink(missing_ok=True)
+  return _file_stat(dest_path)
+
+
+def _remove_empty_dirs(root: Path, files: list[str]) -> None:
+  for directory in sorted({(root / file).parent for file in files}, key=lambda path: len(path.parts), reverse=True):
+    while directory != root and directory.is_relative_to(root):
+      try:
+        directory.rmdir()
+      except OSError:
+        break
+      directory = directory.parent
+
+
+def deploy_dropzone(src_path: Path, dropzone_path: Path, replace: bool = False, max_workers: int = DEPLOY_MAX_WORKERS) -> tuple[list[str], list[str]]:
+  """Copy the built dropzone into the game's dropzone; returns (copied files, deleted files)"""
+  src_files = sorted(path.relative_to(src_path).as_posix() for path in src_path.rglob("*") if path.is_file())
+  src_files = [file for file in src_files if file != DEPLOY_MANIFEST_NAME]
+  if not src_files:
+    raise FileNotFoundError(f"There are no built mods to copy in {src_path}!\nBuild the mods before loading them.")
+  old_files = load_manifest(dropzone_path)
+
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    described = executor.map(lambda file: _describe_file(src_path / file, old_files.get(file)), src_files)
+    new_files = dict(zip(src_files, described))
+
+    to_copy = []
+    for file, entry in new_files.items():
+      old_entry = old_files.get(file)
+      if old_entry is None or old_entry["hash"] != entry["hash"] or _file_stat(dropzone_path / file) != old_entry.get("deployed"):
+        to_copy.append(file)
+      else:
+        entry["deployed"] = old_entry["deployed"]
+    deployed = executor.map(lambda file: _copy_file(src_path / file, dropzone_path / file), to_copy)
+    for file, stat in zip(to_copy, deployed):
+      new_files[file]["deployed"] = stat
+
+  if replace:
+    # everything that is not part of this build goes, whoever put it there
+    stale_files = [
+      path.relative_to(dropzone_path).as_posix() for path in dropzone_path.rglob("*")
+      if path.is_file() and path.relative_to(dropzone_path).as_posix() not in new_files
+    ]
+    stale_files = [file for file in stale_files if file != DEPLOY_MANIFEST_NAME]
+  else:
+    stale_files = [file for file in old_files if file not in new_files]
+  for file in stale_files:
+    (dropzone_path / file).unlink(missing_ok=True)
+  _remove_empty_dirs(dropzone_path, stale_files)
+
+  dropzone_path.mkdir(parents=True, exist_ok=True)
+  save_manifest(dropzone_path, new_files)
+  logger.debug(f"Deployed {len(to_copy)} of {len(new_files)} files to {dropzone_path}, deleted {len(stale_files)}")
+  return to_copy, stale_files
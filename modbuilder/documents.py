@@ -0,0 +1,71 @@
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Parsed game files shared by every plugin in a process
+#
+# Documents are stored per (kind, path, org/modded) together with the hash of the bytes they
+# were parsed from. A lookup with different bytes replaces the old parse, so a dropzone copy that
+# was modified since it was parsed is never served stale. Writes to modded files also drop their
+# documents right away. The total size of the source bytes is capped and the least recently used
+# documents are evicted first.
+#
+# Documents are shared, callers must not modify them.
+DOCUMENT_CACHE_SIZE = 128 * 1024 * 1024
+
+
+class DocumentRegistry:
+  def __init__(self, max_size: int = DOCUMENT_CACHE_SIZE) -> None:
+    self.max_size = max_size
+    self.size = 0
+    self.hits = 0
+    self.misses = 0
+    self.documents: OrderedDict[tuple[str, str, bool], tuple[bytes, int, any]] = OrderedDict()  # key -> (digest, size, document)
+
+  def __len__(self) -> int:
+    return len(self.documents)
+
+  def get(self, kind: str, path: str | Path, modded: bool, data: bytes, parse: Callable[[bytes], any]) -> any:
+    key = (kind, Path(path).as_posix(), modded)
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    entry = self.documents.get(key)
+    if entry is not None and entry[0] == digest:
+      self.documents.move_to_end(key)
+      self.hits += 1
+      return entry[2]
+
+    self.misses += 1
+    document = parse(data)
+    self._remove(key)
+    if len(data) <= self.max_size:
+      self.documents[key] = (digest, len(data), document)
+      self.size += len(data)
+      while self.size > self.max_size:
+        evicted_key = next(iter(self.documents))
+        logger.debug(f"Evicting {evicted_key[0]} document {evicted_key[1]}")
+        self._remove(evicted_key)
+    return document
+
+  def _remove(self, key: tuple[str, str, bool]) -> None:
+    entry = self.documents.pop(key, None)
+    if entry is not None:
+      self.size -= entry[1]
+
+  def invalidate(self, path: str | Path) -> None:
+    # drop the documents parsed from a modded file that is being written
+    path = Path(path).as_posix()
+    for key in [key for key in self.documents if key[2] and key[1] == path]:
+      self._remove(key)
+
+  def invalidate_modded(self) -> None:
+    for key in [key for key in self.documents if key[2]]:
+      self._remove(key)
+
+  def clear(self) -> None:
+    self.documents.clear()
+    self.size = 0
@@ -10,7 +10,7 @@ import requests
 from deepmerge import always_merger
 from packaging.version import Version as package_version
 
-from modbuilder import logo, mods, party
+from modbuilder import build, logo, mods, party
 from modbuilder.logging_config import get_logger
 from modbuilder.widgets import create_option, generate_buttons, valid_option_value
 
@@ -113,35 +113,50 @@ def _get_mod_options() -> list[dict]:
   possible_mods = mods.MODS_LIST
   options = []
   for mod_key, mod in possible_mods.items():
-    mod_details = []
-    mod_details.append([sg.T("Description:", p=(10, 10), font="_ 14 underline", text_color="orange")])
-    mod_details.append([sg.T(textwrap.fill(mod.DESCRIPTION, TEXT_WRAP), p=(10,0))])
-
-    if hasattr(mod, "WARNING"):
-      warning_header = sg.T(" WARNING ", font="_ 14", text_color="firebrick1", p=(10, 10), background_color="black")
-      warning = sg.T(textwrap.fill(mod.WARNING, TEXT_WRAP), p=(10,0))
-      mod_details.append([warning_header])
-      mod_details.append([warning])
-
-    if hasattr(mod, "PRESETS"):
-      mod_details.append([sg.T("Presets:", font="_ 14 underline", text_color="orange", p=((10,10),(10,0)))])
-      presets = []
-      for preset in mod.PRESETS:
-        presets.append(preset["name"])
-      mod_details.append([sg.Combo(presets, k=f"preset__{mod_key}", enable_events=True, p=(30,10))])
-
-    mod_details.append([sg.T("Options:", font="_ 14 underline", text_color="orange", p=((10,10),(10,0)))])
-    if hasattr(mod, "OPTIONS"):
-      for mod_option in mod.OPTIONS:
-        mod_name = mod_option['name'] if "name" in mod_option else None
-        key = f"{mod_key}__{_mod_name_to_key(mod_name)}"
-        mod_details.extend(create_option(mod_option, key))
-    else:
-      mod_details.append([mod.get_option_elements()])
-
-    options.append([sg.pin(sg.Column(mod_details, k=mod_key, visible=False, expand_y=True, expand_x=True))])
+    # plugins that build their options at runtime are loaded when they are first selected
+    mod_details = _get_mod_details(mod_key, mod) if _has_static_options(mod) else []
+    options.append([sg.pin(sg.Column(mod_details, k=mod_key, visible=False, expand_y=True, expand_x=True, metadata=bool(mod_details)))])
   return options
 
+def _has_static_options(mod) -> bool:
+  if mods.is_mod_loaded(mod):
+    return True
+  return mod.is_static("DESCRIPTION", "WARNING", "PRESETS", "OPTIONS") and hasattr(mod, "OPTIONS")
+
+def _get_mod_details(mod_key: str, mod) -> list[list]:
+  mod_details = []
+  mod_details.append([sg.T("Description:", p=(10, 10), font="_ 14 underline", text_color="orange")])
+  mod_details.append([sg.T(textwrap.fill(mod.DESCRIPTION, TEXT_WRAP), p=(10,0))])
+
+  if hasattr(mod, "WARNING"):
+    warning_header = sg.T(" WARNING ", font="_ 14", text_color="firebrick1", p=(10, 10), background_color="black")
+    warning = sg.T(textwrap.fill(mod.WARNING, TEXT_WRAP), p=(10,0))
+    mod_details.append([warning_header])
+    mod_details.append([warning])
+
+  if hasattr(mod, "PRESETS"):
+    mod_details.append([sg.T("Presets:", font="_ 14 underline", text_color="orange", p=((10,10),(10,0)))])
+    presets = []
+    for preset in mod.PRESETS:
+      presets.append(preset["name"])
+    mod_details.append([sg.Combo(presets, k=f"preset__{mod_key}", enable_events=True, p=(30,10))])
+
+  mod_details.append([sg.T("Options:", font="_ 14 underline", text_color="orange", p=((10,10),(10,0)))])
+  if hasattr(mod, "OPTIONS"):
+    for mod_option in mod.OPTIONS:
+      mod_name = mod_option['name'] if "name" in mod_option else None
+      key = f"{mod_key}__{_mod_name_to_key(mod_name)}"
+      mod_details.extend(create_option(mod_option, key))
+  else:
+    mod_details.append([mod.get_option_elements()])
+  return mod_details
+
+def _load_mod_options(mod_key: str, mod, window: sg.Window) -> None:
+  column = window[mod_key]
+  if not column.metadata:
+    window.extend_layout(column, _get_mod_details(mod_key, mod))
+    column.metadata = True
+
 def _show_mod_options(mod_name: str, window: sg.Window) -> None:
   for mod in window["modification"].metadata:
     if mod == mod_name:
@@ -490,6 +505,7 @@ def main() -> None:
         mod_name = values["modification"]
         mod_key = _mod_name_to_key(mod_name)
         mod = mods.get_mod(mod_key)
+        _load_mod_options(mod_key, mod, window)
         _show_mod_options(mod_name, window)
         window["add_mod"].update(disabled=False)
         window.visibility_changed()
@@ -547,25 +563,7 @@ def main() -> None:
         _enable_mod_button(window)
       elif event == "build_mod":
         window["build_mod"].update(disabled=True)
-        mods.clear_mod()
-        mod_files = []
-        step = 1
-        progress_step = 95 / len(selected_mods.keys())
-        for mod_key, mod_options in selected_mods.items():
-          mod = mods.get_mod(mod_key)
-          if hasattr(mod, "FILE"):
-            modded_files = mods.copy_files_to_mod(mod.FILE)
-          else:
-            modded_files = mods.copy_all_files_to_mod(mod.get_files(mod_options))
-          mod_files += modded_files
-          mods.apply_mod(mod, mod_options)
-          if hasattr(mod, "merge_files"):
-            mod.merge_files(modded_files, mod_options)
-          step_progress = math.floor(step * progress_step)
-          window["build_progress"].update(step_progress)
-          step += 1
-        mods.merge_files(mod_files)
-        mods.package_mod()
+        build.build_mods(selected_mods, progress=lambda completed: window["build_progress"].update(math.floor(completed * 95)))
         selected_mods = _format_selected_mods(selected_mods, window)
         _enable_mod_button(window)
         window["remove_mod"].update(disabled=True)
@@ -0,0 +1,41 @@
+import os
+import platform
+import shutil
+import sys
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+# Numba writes the compiled deca kernels here so only the first launch pays for compiling them.
+# The folder is keyed by everything that invalidates machine code, and folders left behind by
+# other versions are removed.
+JIT_CACHE_PATH = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent)) / "cache/numba"
+
+
+def _package_version(name: str) -> str:
+  try:
+    return version(name)
+  except PackageNotFoundError:
+    return "unknown"
+
+
+def get_jit_cache_key() -> str:
+  python_version = f"{sys.implementation.name}{sys.version_info.major}{sys.version_info.minor}"
+  return f"numba{_package_version('numba')}-numpy{_package_version('numpy')}-{python_version}-{platform.machine().lower()}"
+
+
+def configure_jit_cache(cache_path: Path = JIT_CACHE_PATH) -> Path | None:
+  # an explicit NUMBA_CACHE_DIR wins; worker processes inherit the one set here
+  if os.environ.get("NUMBA_CACHE_DIR"):
+    return Path(os.environ["NUMBA_CACHE_DIR"])
+  jit_cache_path = cache_path / get_jit_cache_key()
+  try:
+    jit_cache_path.mkdir(parents=True, exist_ok=True)
+    for old_cache in cache_path.iterdir():
+      if old_cache.is_dir() and old_cache != jit_cache_path:
+        shutil.rmtree(old_cache, ignore_errors=True)
+  except OSError:
+    return None  # numba falls back to its default cache location
+  os.environ["NUMBA_CACHE_DIR"] = str(jit_cache_path)
+  if "numba" in sys.modules:
+    sys.modules["numba"].config.CACHE_DIR = str(jit_cache_path)
+  return jit_cache_path
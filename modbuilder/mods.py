@@ -1,3 +1,4 @@
+import copy
 import importlib.util
 import io
 import json
@@ -6,25 +7,30 @@ import re
 import shutil
 import struct
 import sys
+from contextlib import contextmanager
 from importlib.metadata import version
 from pathlib import Path
 from types import ModuleType
+from typing import Callable, Iterator
 
 import FreeSimpleGUI as sg
 import yaml
 
 from deca.ff_adf import Adf, AdfValue
-from deca.ff_rtpc import RtpcNode, RtpcProperty, rtpc_from_binary
+from deca.ff_rtpc import RtpcNode, RtpcProperty, rtpc_columns_from_binary
 from deca.ff_sarc import EntrySarc, FileSarc
-from deca.file import ArchiveFile
-from modbuilder import adf_profile, mods2
+from deca.file import MmapArchiveFile
+from modbuilder import adf_profile, deploy, documents, mods2, plugin_manifest, sarc_index, staging
 from modbuilder.logging_config import get_logger
+from modbuilder.nearest import NearestValues
+from modbuilder.workspace import ModdedFile, ModWorkspace
 
 logger = get_logger(__name__)
 
 __version__ = version("modbuilder-revived")
 
 APP_DIR_PATH = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
+ORG_PATH = APP_DIR_PATH / "org"
 MOD_PATH = APP_DIR_PATH / "mod/dropzone"
 LOOKUP_PATH = APP_DIR_PATH / "org/lookups"
 PLUGINS_FOLDER = "plugins"
@@ -37,10 +43,20 @@ ELMER_MOVEMENT_NETWORK_PATH = APP_DIR_PATH / "org" / ELMER_MOVEMENT_NETWORK_SRC_
 GLOBAL_ANIMALS_SRC_PATH = "global/global_animal_types.bl"
 GLOBAL_ANIMALS_PATH = APP_DIR_PATH / "org" / GLOBAL_ANIMALS_SRC_PATH
 GAME_PATH_FILE = APP_DIR_PATH / "game_path.txt"
+CACHE_PATH = APP_DIR_PATH / "cache"
+PLUGIN_MANIFEST_PATH = CACHE_PATH / "plugin_manifest.json"
+SARC_INDEX_PATH = APP_DIR_PATH / "org.sarcindex"
+BUILD_JOURNAL_PATH = APP_DIR_PATH / "mod/build_journal.json"
 EQUIPMENT_DATA_FILE = "settings/hp_settings/equipment_data.bin"
 EQUIPMENT_UI_FILE = "settings/hp_settings/equipment_stats_ui.bin"
 MODS_EQUIPMENT_UI_DATA = None
 MODS_LIST = DEBUG_MODS_LIST = None
+SARC_INDEX = None
+WORKSPACE = None
+PROCESS_INPUTS = set()  # org files read outside of a build workspace, e.g. while plugins load
+DOCUMENTS = documents.DocumentRegistry()
+LOOKUPS = {}         # lookup JSON files under org/lookups, read once per process
+LOOKUP_INDEXES = {}  # nearest-value index of the "numbers" in each lookup file
 GLOBAL_FILES = LOCAL_PLAYER_FILES = NETWORK_PLAYER_FILES = GLOBAL_ANIMAL_FILES = None
 with open(APP_DIR_PATH / "name_map.yaml", "r") as file:
     NAME_MAP = yaml.safe_load(file)
@@ -49,9 +65,12 @@ GLOBAL_FILES: dict
 LOCAL_PLAYER_FILES: dict
 NETWORK_PLAYER_FILES: dict
 GLOBAL_ANIMAL_FILES: dict
-MODS_LIST: dict[str, ModuleType]
-DEBUG_MODS_LIST: dict[str, ModuleType]
+MODS_LIST: dict[str, plugin_manifest.LazyPlugin]
+DEBUG_MODS_LIST: dict[str, plugin_manifest.LazyPlugin]
 MODS_EQUIPMENT_UI_DATA: Adf
+SARC_INDEX: sarc_index.SarcIndex
+WORKSPACE: ModWorkspace
+DOCUMENTS: documents.DocumentRegistry
 NAME_MAP: dict[str, dict]
 
 
@@ -103,9 +122,10 @@ def get_mods() -> None:
   global MODS_LIST, DEBUG_MODS_LIST
   MODS_LIST = {}
   DEBUG_MODS_LIST = {}
-  clear_mod()
+  # plugins are only executed when something needs more than their manifest metadata
+  manifest = plugin_manifest.load_plugin_manifest(APP_DIR_PATH / PLUGINS_FOLDER, mod_filenames, PLUGIN_MANIFEST_PATH)
   for mod_filename in mod_filenames:
-    loaded_mod = _load_mod(mod_filename)
+    loaded_mod = plugin_manifest.LazyPlugin(mod_filename, manifest[mod_filename], _load_mod) if manifest[mod_filename] else _load_mod(mod_filename)
     if getattr(loaded_mod, "DEBUG", True):
       DEBUG_MODS_LIST[mod_filename] = loaded_mod
     else:
@@ -125,6 +145,9 @@ def _load_mod(filename: str) -> ModuleType:
   spec.loader.exec_module(py_mod)
   return py_mod
 
+def get_mod_path(mod: ModuleType) -> Path:
+  return APP_DIR_PATH / PLUGINS_FOLDER / f"{mod.__name__}.py"
+
 def get_mod_keys() -> list[str]:
   return _get_mod_filenames()
 
@@ -150,9 +173,12 @@ def format_mod_display_name(mod_key:str, mod_options) -> str:
 
 def delegate_event(event: str, window: sg.Window, values: dict) -> None:
   for mod in MODS_LIST.values():
-    if hasattr(mod, "handle_event"):
+    if is_mod_loaded(mod) and hasattr(mod, "handle_event"):  # plugins that were never loaded have no elements in the window
       mod.handle_event(event, window, values)
 
+def is_mod_loaded(mod: ModuleType | plugin_manifest.LazyPlugin) -> bool:
+  return not isinstance(mod, plugin_manifest.LazyPlugin) or mod.loaded
+
 def get_mod_name_from_key(mod_key: str) -> str:
   return " ".join(mod_key.lower().split("_"))
 
@@ -195,14 +221,17 @@ def clear_mod() -> None:
   path = APP_DIR_PATH / "mod"
   if path.exists():
     shutil.rmtree(path)
+  DOCUMENTS.invalidate_modded()
 
 def get_relative_path(path: str) -> str:
   return os.path.relpath(path, APP_DIR_PATH / "org").replace("\\", "/")
 
 def copy_file(src_path: Path, dest_path: Path) -> None:
+  # the copy shares its data with src_path until it is written, see staging.py
+  record_org_read(src_path)
+  record_mod_output(dest_path)
   if not dest_path.exists():
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy(src_path, dest_path)
+    staging.stage_file(src_path, dest_path)
 
 def copy_file_to_mod(src_filename: str) -> None:
   dest_path = APP_DIR_PATH / "mod/dropzone" / src_filename
@@ -231,7 +260,9 @@ def copy_all_files_to_mod(filenames: list[str]) -> list[str]:
   return filenames
 
 def get_org_file(src_filename: str) -> Path:
-  return APP_DIR_PATH / "org" / src_filename
+  org_file = APP_DIR_PATH / "org" / src_filename
+  record_org_read(org_file)
+  return org_file
 
 def get_modded_file(src_filename: str) -> Path:
   return APP_DIR_PATH / "mod/dropzone" / src_filename
@@ -245,96 +276,106 @@ def read_file_at_offset(src_filename: str, offset: int, format: str) -> any:
       value_at_offset = struct.unpack("f", fp.read(4))[0]
   return value_at_offset
 
-def update_file_at_offsets(src_filename: str, offsets: list[int], value: any, transform: str = None, format: str = None) -> None:
+def open_workspace() -> ModWorkspace:
+  global WORKSPACE
+  WORKSPACE = ModWorkspace(MOD_PATH)
+  return WORKSPACE
+
+def close_workspace(commit: bool = True) -> list[str]:
+  global WORKSPACE
+  written_files = []
+  if WORKSPACE is not None and commit:
+    written_files = WORKSPACE.commit()
+  WORKSPACE = None
+  return written_files
+
+def _in_workspace(path: Path) -> bool:
+  return WORKSPACE is not None and path in WORKSPACE
+
+def record_org_read(path: Path) -> None:
+  # org files read while a group of mods builds are the inputs of that group, see build_journal.py
+  path = Path(path)
+  if not path.is_absolute() or not path.is_relative_to(ORG_PATH):
+    return
+  file = path.relative_to(ORG_PATH).as_posix()
+  if WORKSPACE is not None:
+    WORKSPACE.inputs.add(file)
+  else:
+    PROCESS_INPUTS.add(file)
+
+def record_mod_output(path: Path) -> None:
+  # dropzone files created outside of the workspace, e.g. copies of org files
+  if WORKSPACE is not None and (key := WORKSPACE.get_key(path)) is not None:
+    WORKSPACE.outputs.add(key)
+
+@contextmanager
+def open_modded_file(src_filename: str) -> Iterator[ModdedFile]:
+  DOCUMENTS.invalidate(get_modded_file(src_filename))
+  if WORKSPACE is not None:
+    yield WORKSPACE.get(get_modded_file(src_filename))
+  else:
+    modded_file = ModdedFile(get_modded_file(src_filename))
+    yield modded_file
+    modded_file.save()
+
+def read_file_bytes(path: Path) -> bytes:
+  if _in_workspace(path):
+    return WORKSPACE.get(path).getvalue()
+  record_org_read(path)
+  return Path(path).read_bytes()
+
+def read_modded_bytes(src_filename: str) -> bytes:
+  return read_file_bytes(get_modded_file(src_filename))
+
+def remove_modded_file(src_filename: str) -> None:
+  path = get_modded_file(src_filename)
+  DOCUMENTS.invalidate(path)
+  if WORKSPACE is not None:
+    WORKSPACE.discard(path)
+  path.unlink(missing_ok=True)
+
+def write_modded_bytes(src_filename: str, data: bytes) -> None:
   dest_path = get_modded_file(src_filename)
-  with open(dest_path, "r+b") as fp:
+  DOCUMENTS.invalidate(dest_path)
+  if WORKSPACE is not None:
+    WORKSPACE.set(dest_path, data)
+  else:
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    staging.unshare(dest_path)
+    dest_path.write_bytes(data)
+
+def get_update_source() -> str | None:
+  return WORKSPACE.source if WORKSPACE is not None else None
+
+def update_file_at_offsets(src_filename: str, offsets: list[int], value: any, transform: str = None, format: str = None) -> None:
+  with open_modded_file(src_filename) as modded_file:
+    source = get_update_source()
     for offset in offsets:
       # logger.debug(f"Value: {value}   Offset: {offset}   Transform: {transform}   Format: {format}")
-      fp.seek(offset)
-      if format:
-        if format == "sint08":
-          fp.write(struct.pack("h", value))
-      else:
-        if isinstance(value, str):
-          fp.write(struct.pack(f"{len(value)}s", value.encode("utf-8")))
-        elif isinstance(value, float):
-          new_value = value
-          if transform == "multiply":
-            existing_value = struct.unpack('f', fp.read(4))[0]
-            new_value = value * existing_value
-            fp.seek(offset)
-          fp.write(struct.pack("f", new_value))
-        elif isinstance(value, int):
-          new_value = value
-          if transform == "add":
-            existing_value = struct.unpack("i", fp.read(4))[0]
-            new_value = value + existing_value
-          elif transform == "multiply":
-            existing_value = struct.unpack("i", fp.read(4))[0]
-            new_value = round(value * existing_value)
-          fp.seek(offset)
-          fp.write(struct.pack("i", new_value))
-      fp.flush()
+      modded_file.update(offset, value, transform, format, source)
 
 def update_file_at_offsets_with_values(src_filename: str, values: list[(int, any)]) -> None:
-  dest_path = get_modded_file(src_filename)
-  with open(dest_path, "r+b") as fp:
+  with open_modded_file(src_filename) as modded_file:
+    source = get_update_source()
     for offset, value in values:
-      fp.seek(offset)
-      if isinstance(value, int):
-        fp.write(struct.pack("i", value))
-      elif isinstance(value, str):
-        fp.write(struct.pack(f"{len(value)}s", value.encode("utf-8")))
-      elif isinstance(value, bytes):
-        fp.write(struct.pack(f"{len(value)}s", value))
-      elif isinstance(value, float):
-        fp.write(struct.pack("f", value))
-      fp.flush()
+      modded_file.update(offset, value, source=source)
 
 def update_file_at_offset(src_filename: str, offset: int, value: any, transform: str = None, format: str = None) -> None:
   update_file_at_offsets(src_filename, [offset], value, transform, format)
 
 def apply_updates_to_file(src_filename: str, updates: list[dict]):
-  dest_path = get_modded_file(src_filename)
-  with open(dest_path, "r+b") as fp:
+  # updates are planned on the modded file and folded per offset, see ModdedFile.update
+  with open_modded_file(src_filename) as modded_file:
+    source = get_update_source()
     for update in updates:
       value = update["value"]
       offset = update["offset"]
       transform = update.get("transform")
-      format = update.get("format")
-      # logger.debug(f"Value: {value}   Offset: {offset}   Transform: {transform}   Format: {format}")
+      # logger.debug(f"Value: {value}   Offset: {offset}   Transform: {transform}   Format: {update.get('format')}")
       if transform == "insert":
-        insert_bytearray(fp, update)
+        modded_file.insert(offset, value, update.get("bytes_to_remove", 0))
       else:
-        fp.seek(offset)
-        if format:
-          if format == "sint08":
-            fp.write(struct.pack("h", value))
-          if format == "uint08":
-            fp.write(struct.pack("B", value))
-        else:
-          if isinstance(value, str):
-            fp.write(struct.pack(f"{len(value)}s", value.encode("utf-8")))
-          elif isinstance(value, bytes):
-            fp.write(struct.pack(f"{len(value)}s", value))
-          elif isinstance(value, float):
-            new_value = value
-            if transform == "multiply":
-              existing_value = struct.unpack('f', fp.read(4))[0]
-              new_value = value * existing_value
-              fp.seek(offset)
-            fp.write(struct.pack("f", new_value))
-          elif isinstance(value, int):
-            new_value = value
-            if transform == "add":
-              existing_value = struct.unpack("i", fp.read(4))[0]
-              new_value = value + existing_value
-            elif transform == "multiply":
-              existing_value = struct.unpack("i", fp.read(4))[0]
-              new_value = round(value * existing_value)
-            fp.seek(offset)
-            fp.write(struct.pack("i", new_value))
-      fp.flush()
+        modded_file.update(offset, value, transform, update.get("format"), source)
 
 def apply_mod(mod: any, options: dict) -> None:
   if hasattr(mod, "update_values_at_offset"):
@@ -348,9 +389,15 @@ def apply_mod(mod: any, options: dict) -> None:
   else:
     mod.process(options)
 
+def get_document(kind: str, path: Path, parse: Callable[[bytes], any], data: bytes = None) -> any:
+  # parse of a file shared with every other caller in this process, see documents.py
+  if data is None:
+    data = read_file_bytes(path)
+  return DOCUMENTS.get(kind, path, Path(path).is_relative_to(MOD_PATH), data, parse)
+
 def open_rtpc(filename: Path) -> RtpcNode:
-  with filename.open("rb") as f:
-    data = rtpc_from_binary(f)
+  # nodes are decoded as they are visited, see RtpcColumns. The nodes are shared and must not be modified
+  data = get_document("rtpc", filename, rtpc_columns_from_binary)
   root = data.root_node
   return root
 
@@ -358,13 +405,34 @@ def get_global_file_info() -> dict:
   global_files = {}
   return global_files
 
+def get_sarc_index() -> sarc_index.SarcIndex:
+  global SARC_INDEX
+  if SARC_INDEX is None:
+    SARC_INDEX = sarc_index.load_sarc_index(APP_DIR_PATH / "org", SARC_INDEX_PATH)
+  return SARC_INDEX
+
+def find_bundles(filename: str, bundle_folder: str = None) -> list[str]:
+  bundles = []
+  for entry in get_sarc_index().find(filename):
+    if entry.is_symlink:
+      continue
+    if bundle_folder is None or entry.bundle.startswith(bundle_folder.rstrip("/") + "/"):
+      bundles.append(entry.bundle)
+  return bundles
+
 def get_sarc_file_info(filename: Path, include_details: bool = False) -> dict:
+  record_org_read(filename)
+  if not include_details:
+    # unmodified bundles are served from the prebuilt index instead of parsing the header
+    entries = get_sarc_index().get_bundle_entries(get_relative_path(filename))
+    if entries is not None:
+      return {entry.vpath: entry.offset for entry in entries}
+
   bundle_files = {}
   sarc = FileSarc()
-  with filename.open("rb") as fp:
-    sarc.header_deserialize(fp)
-    for sarc_file in sarc.entries:
-      bundle_files[sarc_file.v_path.decode("utf-8")] = sarc_file if include_details else sarc_file.offset
+  sarc.header_deserialize(MmapArchiveFile(filename))
+  for sarc_file in sarc.entries:
+    bundle_files[sarc_file.v_path.decode("utf-8")] = sarc_file if include_details else sarc_file.offset
   return bundle_files
 
 def get_sarc_file_info_details(bundle_file: Path, filename: str) -> EntrySarc:
@@ -386,95 +454,144 @@ def is_file_in_global(filename: str) -> bool:
 def is_file_in_bundle(filename: str, lookup: dict) -> bool:
   return filename in lookup.keys()
 
+def _parse_sarc_header(header: bytes) -> FileSarc:
+  sarc = FileSarc()
+  sarc.header_deserialize(io.BytesIO(header))
+  return sarc
+
+def read_sarc_header(bundle_filename: str, modded: bool = True) -> FileSarc:
+  # only the directory block of the bundle is read; the file data is left where it is
+  # the header is shared and must not be modified
+  bundle_path = get_modded_file(bundle_filename) if modded else get_org_file(bundle_filename)
+  if _in_workspace(bundle_path):
+    bundle = WORKSPACE.get(bundle_path)
+    dir_block_len = struct.unpack("<I", bundle.read(12, 4))[0]
+    header = bundle.read(0, 16 + dir_block_len)
+  else:
+    with MmapArchiveFile(bundle_path) as bundle:
+      dir_block_len = struct.unpack_from("<I", bundle.mm, 12)[0]
+      header = bundle.mm[:16 + dir_block_len]
+  return get_document("sarc", bundle_path, _parse_sarc_header, header)
+
+def get_sarc_entry(bundle_filename: str, filename: str, modded: bool = True) -> EntrySarc:
+  encoded_filename = filename.encode("utf-8")
+  for entry in read_sarc_header(bundle_filename, modded).entries:
+    if entry.v_path == encoded_filename:
+      return entry
+  raise KeyError(f"{filename} is not in {bundle_filename}")
+
+def read_sarc_entry(bundle_filename: str, filename: str, modded: bool = True) -> bytes:
+  entry = get_sarc_entry(bundle_filename, filename, modded)
+  bundle_path = get_modded_file(bundle_filename) if modded else get_org_file(bundle_filename)
+  if _in_workspace(bundle_path):
+    return WORKSPACE.get(bundle_path).read(entry.offset, entry.length)
+  with MmapArchiveFile(bundle_path) as bundle:
+    bundle.seek(entry.offset)
+    return bundle.read(entry.length)
+
+def write_into_bundle(bundle_filename: str, offset: int, data: bytes) -> None:
+  bundle_path = get_modded_file(bundle_filename)
+  DOCUMENTS.invalidate(bundle_path)
+  if _in_workspace(bundle_path):
+    WORKSPACE.get(bundle_path).write(offset, data)
+    return
+  # bundles that are not already loaded are patched in place instead of being read into memory
+  staging.materialize(bundle_path)
+  with bundle_path.open("r+b") as bundle:
+    bundle.seek(offset)
+    bundle.write(data)
+
+def replace_sarc_entry(bundle_filename: str, filename: str, data: bytes) -> None:
+  copy_files_to_mod(bundle_filename)
+  entry = get_sarc_entry(bundle_filename, filename)
+  if len(data) != entry.length:
+    raise ValueError(f"Replacing {filename} in {bundle_filename} would change its size from {entry.length} to {len(data)} bytes")
+  write_into_bundle(bundle_filename, entry.offset, data)
+
 def merge_into_archive(filename: str, merge_path: str, merge_lookup: dict, delete_src: bool = False) -> None:
-  src_path = APP_DIR_PATH / "mod/dropzone" / filename
-  mod_merge_path = APP_DIR_PATH / "mod/dropzone" / merge_path
   copy_files_to_mod(merge_path)
-  filename_bytes = bytearray(src_path.read_bytes())
-  merge_bytes = bytearray(mod_merge_path.read_bytes())
-  filename_offset = merge_lookup[filename]
-  merge_bytes[filename_offset:filename_offset+len(filename_bytes)] = filename_bytes
-  mod_merge_path.write_bytes(merge_bytes)
+  write_into_bundle(merge_path, merge_lookup[filename], read_modded_bytes(filename))
   if delete_src:
-    src_path.unlink()
+    remove_modded_file(filename)
+
+def write_sarc_entries(bundle_filename: str, changed_data: dict[bytes, bytes], from_org: bool = False) -> None:
+  # entries that keep their size are written over the modded bundle, otherwise the bundle is written again
+  # with the unchanged entries streamed from the modded bundle (or the org bundle with from_org)
+  bundle_path = get_modded_file(bundle_filename)
+  src_path = get_org_file(bundle_filename) if from_org else bundle_path
+  sarc = copy.deepcopy(read_sarc_header(bundle_filename, modded=not from_org))
+  missing_files = sorted(set(changed_data) - {entry.v_path for entry in sarc.entries})
+  if missing_files:
+    missing_names = ", ".join(file.decode("utf-8") for file in missing_files)
+    raise KeyError(f"{missing_names} not in {bundle_filename}")
+  DOCUMENTS.invalidate(bundle_path)
+  if _in_workspace(bundle_path):
+    bundle = WORKSPACE.get(bundle_path)
+    if not from_org and sarc.sizes_match(changed_data):
+      for entry in sarc.entries:
+        if entry.v_path in changed_data:
+          bundle.write(entry.offset, changed_data[entry.v_path])
+      return
+    with io.BytesIO() as new_bundle:
+      with (src_path.open("rb") if from_org else io.BytesIO(bundle.getvalue())) as src_bundle:
+        sarc.serialize(new_bundle, src_bundle, changed_data)
+      bundle.replace(new_bundle.getvalue())
+    return
+
+  if not from_org and sarc.sizes_match(changed_data):
+    staging.materialize(bundle_path)
+    with bundle_path.open("r+b") as bundle:
+      sarc.serialize_in_place(bundle, changed_data)
+    return
+  bundle_path.parent.mkdir(parents=True, exist_ok=True)
+  record_mod_output(bundle_path)
+  tmp_path = bundle_path.with_name(f"{bundle_path.name}.{os.getpid()}.tmp")
+  try:
+    with src_path.open("rb") as src_bundle, tmp_path.open("wb") as new_bundle:
+      sarc.serialize(new_bundle, src_bundle, changed_data)
+    os.replace(tmp_path, bundle_path)
+  finally:
+    tmp_path.unlink(missing_ok=True)
 
 def recreate_archive(changed_filenames: list[str], archive_path: str) -> None:
-  org_archive_path = APP_DIR_PATH / "org" / archive_path
-  new_archive_path = APP_DIR_PATH / "mod/dropzone" / archive_path
-
-  sarc_file = FileSarc()
-  sarc_file.header_deserialize(org_archive_path.open("rb"))
-
-  org_entries = {}
-  for entry in sarc_file.entries:
+  sarc = read_sarc_header(archive_path, modded=False)
+  changed_data = {}
+  for entry in sarc.entries:
     file = entry.v_path.decode("utf-8")
     if file in changed_filenames:
-      entry.length = (APP_DIR_PATH / "mod/dropzone" / file).stat().st_size
-    else:
-      org_entries[file] = entry.offset
-
-  new_archive_path.parent.mkdir(parents=True, exist_ok=True)
+      changed_data[entry.v_path] = read_modded_bytes(file)
+  write_sarc_entries(archive_path, changed_data, from_org=True)
 
-  with ArchiveFile(new_archive_path.open("wb")) as new_archive:
-    with org_archive_path.open("rb") as org_archive:
-      sarc_file.header_serialize(new_archive)
+def expand_into_archive(filename: str, merge_path: str) -> None:
+  merge_into_bundle(merge_path, [filename])
+
+def merge_into_bundle(bundle_filename: str, filenames: list[str]) -> None:
+  # every file is merged in one pass over the bundle; files that change size move the entries after them
+  copy_files_to_mod(bundle_filename)
+  write_sarc_entries(bundle_filename, {filename.encode("utf-8"): read_modded_bytes(filename) for filename in filenames})
+
+def get_merge_targets() -> list[tuple[str, dict]]:
+  # (bundle, files in the bundle)
+  return [
+    (GLOBAL_SRC_PATH, GLOBAL_FILES),
+    (ELMER_MOVEMENT_LOCAL_SRC_PATH, LOCAL_PLAYER_FILES),
+    (ELMER_MOVEMENT_NETWORK_SRC_PATH, NETWORK_PLAYER_FILES),
+    (GLOBAL_ANIMALS_SRC_PATH, GLOBAL_ANIMAL_FILES),
+  ]
 
-      for entry in sarc_file.entries:
-        data = None
-        file = entry.v_path.decode("utf-8")
-        if file in changed_filenames:
-          data = (APP_DIR_PATH / "mod/dropzone" / file).read_bytes()
-        elif entry.is_symlink:
-          continue
-        else:
-          org_archive.seek(org_entries[file])
-          data = org_archive.read(entry.length)
+def get_merge_bundles(filename: str) -> list[str]:
+  return [bundle for bundle, lookup in get_merge_targets() if is_file_in_bundle(filename, lookup)]
 
-        new_archive.seek(entry.offset)
-        new_archive.write(data)
-
-def expand_into_archive(filename: str, merge_path: str) -> None:
-  src_path = APP_DIR_PATH / "mod/dropzone" / filename
-  mod_merge_path = APP_DIR_PATH / "mod/dropzone" / merge_path
-  copy_files_to_mod(merge_path)
-  archive_info = get_sarc_file_info(mod_merge_path, True)
-  offsets_to_update = []
-  old_file_size = None
-  new_file_size = len(src_path.read_bytes())
-  file_offset = None
-  file_length_offset = None
-  prev_offset = None
-  for file, sarc_entry in archive_info.items():
-    if file == filename:
-      file_offset = sarc_entry.offset
-      file_length_offset = sarc_entry.META_entry_size_ptr
-    if file_offset != None and prev_offset == file_offset:
-      old_file_size = sarc_entry.offset - file_offset
-    if file_offset and sarc_entry.offset > file_offset:
-      offsets_to_update.append((file, sarc_entry.META_entry_offset_ptr, sarc_entry.offset + (new_file_size - old_file_size)))
-    prev_offset = sarc_entry.offset
-
-  merge_bytes = bytearray(mod_merge_path.read_bytes())
-  for file_to_update in offsets_to_update:
-    merge_bytes[file_to_update[1]:file_to_update[1]+4] = adf_profile.create_u32(file_to_update[2])
-
-  filename_bytes = bytearray(src_path.read_bytes())
-  merge_bytes[file_length_offset:file_length_offset+4] = adf_profile.create_u32(new_file_size)
-  del merge_bytes[file_offset:file_offset+old_file_size]
-  merge_bytes[file_offset:file_offset] = filename_bytes
-  mod_merge_path.write_bytes(merge_bytes)
-
-def merge_files(filenames: list[str]) -> None:
-  filenames = [*set(filenames)]
-  for filename in filenames:
-    if is_file_in_global(filename):
-      merge_into_archive(filename, GLOBAL_SRC_PATH, GLOBAL_FILES, False)
-    if is_file_in_bundle(filename, LOCAL_PLAYER_FILES):
-      merge_into_archive(filename, ELMER_MOVEMENT_LOCAL_SRC_PATH, LOCAL_PLAYER_FILES)
-    if is_file_in_bundle(filename, NETWORK_PLAYER_FILES):
-      merge_into_archive(filename, ELMER_MOVEMENT_NETWORK_SRC_PATH, NETWORK_PLAYER_FILES)
-    if is_file_in_bundle(filename, GLOBAL_ANIMAL_FILES):
-      merge_into_archive(filename, GLOBAL_ANIMALS_SRC_PATH, GLOBAL_ANIMAL_FILES)
+def merge_files(filenames: list[str], bundles: set[str] = None) -> None:
+  # each bundle is written once with all of its files. bundles = only merge into these bundles
+  # the merged files stay in the dropzone, so a bundle can always be merged again from them
+  filenames = sorted(set(filenames))
+  for bundle, lookup in get_merge_targets():
+    if bundles is not None and bundle not in bundles:
+      continue
+    bundle_files = [filename for filename in filenames if is_file_in_bundle(filename, lookup)]
+    if bundle_files:
+      merge_into_bundle(bundle, bundle_files)
 
 def package_mod() -> None:
   for p in list(Path(APP_DIR_PATH / "mod").glob("**/*")):
@@ -538,56 +655,43 @@ def get_dropzone() -> Path:
     return epic_games_path
   return None
 
-def copy_dropzone(replace: bool = False) -> None:
-  dropzone_path = get_dropzone()
+def copy_dropzone(replace: bool = False, game_path: Path = None) -> None:
+  # only files that changed since the last deployment are copied, see deploy.py
+  dropzone_path = get_dropzone() if game_path is None else Path(game_path)
   if dropzone_path:
-    dropzone_path = dropzone_path / "dropzone"
-    if replace:
-      try:
-        shutil.rmtree(dropzone_path)
-      except FileNotFoundError as e:  # suppress error if user hits "Replace" when there is no /dropzone folder
-        pass
-    shutil.copytree(APP_DIR_PATH / "mod/dropzone", dropzone_path, dirs_exist_ok=True)
+    deploy.deploy_dropzone(APP_DIR_PATH / "mod/dropzone", dropzone_path / "dropzone", replace=replace)
   else:
     raise FileNotFoundError('Could not find game path to save mods!\nUse the "set path" button to select your game directory.')
 
-def find_closest_lookup(desired_value: float, filename: str) -> int:
+def load_lookup(filename: str) -> dict:
   root, _ = os.path.splitext(filename)
-  numbers = json.load((LOOKUP_PATH / f"{root}.json").open())["numbers"]
-  exact_match = None
-  for number, cell_index in numbers.items():
-    if float(number) == desired_value:
-      exact_match = int(cell_index)
-      break
-  if exact_match:
-    return exact_match
-  else:
-    closest_delta = 9999999
-    closest_match = None
-    for number, cell_index in numbers.items():
-      delta = abs(float(number) - desired_value)
-      if delta < closest_delta:
-        closest_match = int(cell_index)
-        closest_delta = delta
-    return closest_match
+  record_org_read(LOOKUP_PATH / f"{root}.json")
+  lookup = LOOKUPS.get(root)
+  if lookup is None:
+    with (LOOKUP_PATH / f"{root}.json").open() as fp:
+      lookup = json.load(fp)
+    LOOKUPS[root] = lookup
+  return lookup
+
+def get_lookup_index(numbers: dict) -> tuple[list[int], NearestValues]:
+  # lookup "numbers" map the text of a value to the cell index that holds it
+  cell_indexes = [int(cell_index) for cell_index in numbers.values()]
+  return cell_indexes, NearestValues([float(number) for number in numbers])
+
+def find_closest_lookups(desired_values: list[float], filename: str) -> list[int]:
+  root, _ = os.path.splitext(filename)
+  if root not in LOOKUP_INDEXES:
+    LOOKUP_INDEXES[root] = get_lookup_index(load_lookup(filename)["numbers"])
+  cell_indexes, nearest = LOOKUP_INDEXES[root]
+  return [cell_indexes[i] if i >= 0 else None for i in nearest.find(desired_values).tolist()]
+
+def find_closest_lookup(desired_value: float, filename: str) -> int:
+  return find_closest_lookups([desired_value], filename)[0]
 
 def find_closest_lookup2(desired_value: float, numbers: dict) -> int:
-  exact_match = None
-  for number, cell_index in numbers.items():
-    if float(number) == desired_value:
-      exact_match = int(cell_index)
-      break
-  if exact_match:
-    return exact_match
-  else:
-    closest_delta = 9999999
-    closest_match = None
-    for number, cell_index in numbers.items():
-      delta = abs(float(number) - desired_value)
-      if delta < closest_delta:
-        closest_match = int(cell_index)
-        closest_delta = delta
-    return closest_match
+  cell_indexes, nearest = get_lookup_index(numbers)
+  i = nearest.find_one(desired_value)
+  return cell_indexes[i] if i is not None else None
 
 def lookup_column(
   filename: str,
@@ -597,8 +701,7 @@ def lookup_column(
   end_row: int,
   multiplier: float
 ) -> tuple[list[int], list[int]]:
-  root, _ = os.path.splitext(filename)
-  data = json.load((LOOKUP_PATH / f"{root}.json").open())
+  data = load_lookup(filename)
   cells = data["sheets"][sheet]
   cell_indices = []
   for row in range(start_row, end_row + 1):
@@ -607,11 +710,8 @@ def lookup_column(
   target_cells = list(filter(lambda x: x["cell"] in cell_indices, cells))
   target_cells = sorted(target_cells, key=lambda x: x["cell"])
   # logger.debug("Target", [c["value"] for c in target_cells])
-  result = []
-  for c in target_cells:
-    cell_index = find_closest_lookup2(c["value"] * multiplier, data["numbers"])
-    result.append((c["cell_index_offset"], cell_index))
-  return result
+  closest_cell_indexes = find_closest_lookups([c["value"] * multiplier for c in target_cells], filename)
+  return [(c["cell_index_offset"], cell_index) for c, cell_index in zip(target_cells, closest_cell_indexes)]
 
 def create_bytearray(values: any, data_format: str) -> bytearray:
   result = bytearray()
@@ -682,18 +782,6 @@ def update_non_instance_offsets(extracted_adf: Adf, added_size: int) -> list[dic
 
   return updates
 
-def insert_bytearray(fp: io.BufferedRandom, update: dict) -> None:
-  # Read data after the section to delete
-  bytes_to_delete = update.get("bytes_to_remove", 0)
-  fp.seek(update["offset"] + bytes_to_delete)
-  remaining_data = fp.read()
-  # Write new data at the original offset
-  fp.seek(update["offset"])
-  fp.write(update["value"])
-  # Write back the remaining data and truncate to remove extra bytes if the new array is smaller
-  fp.write(remaining_data)
-  fp.truncate()
-
 def clean_equipment_name(name: str, equipment_type: str) -> str:
   name = name.removeprefix("equipment_").removeprefix(f"{equipment_type}_")
   if equipment_type == "optic":
@@ -1,25 +1,131 @@
+import bisect
 import copy
+import hashlib
+import io
 import logging
 import math
+import os
+import pickle
+import weakref
+from pathlib import Path
 
+import numpy as np
 from openpyxl.utils import column_index_from_string, get_column_letter
-from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.utils.cell import coordinate_from_string, range_boundaries
 
-from deca.ff_adf import Adf, AdfValue
+from deca.ff_adf import ADF_PARSER_VERSION, Adf, AdfValue
 from deca.file import ArchiveFile
 from modbuilder import mods
 from modbuilder.logging_config import get_logger
+from modbuilder.nearest import NearestValues
 
 logger = get_logger(__name__)
 
 
-def deserialize_adf(filename: str, modded: bool = True) -> Adf:
-  file = mods.get_modded_file(filename) if modded else mods.get_org_file(filename)
+def deserialize_adf(filename: str, modded: bool = True, numpy_arrays: bool = False, lazy: bool = False) -> Adf:
+  # numpy_arrays = decode primitive arrays as numpy arrays instead of lists. Only for callers that never modify the arrays
+  # lazy = decode structures on first access. For callers that only read a few values from large files
+  file = Path(mods.get_modded_file(filename) if modded else mods.get_org_file(filename))
+  data = mods.read_file_bytes(file)
+  array_mode = "numpy" if numpy_arrays else "list"
+  instance_mode = "lazy" if lazy else "full"
+  if numpy_arrays or lazy:
+    # callers of these modes only read the values, so a single parse is shared by all of them
+    return mods.get_document(f"adf:{array_mode}:{instance_mode}", file, lambda data: _load_adf(file, data, numpy_arrays, lazy), data)
+  return _load_adf(file, data, numpy_arrays, lazy)
+
+def _load_adf(file: Path, data: bytes, numpy_arrays: bool = False, lazy: bool = False) -> Adf:
+  cache_file = _get_adf_cache_file(file, numpy_arrays, lazy)
+  if cache_file is None:
+    return _parse_adf(data, numpy_arrays, lazy)
+
+  # cached parses are only valid for the exact file contents and parser that produced them
+  array_mode = "numpy" if numpy_arrays else "list"
+  instance_mode = "lazy" if lazy else "full"
+  cache_key = f"{ADF_PARSER_VERSION}:{array_mode}:{instance_mode}:{hashlib.blake2b(data, digest_size=16).hexdigest()}\n".encode("utf-8")
+  adf = _load_cached_adf(cache_file, cache_key)
+  if adf is None:
+    adf = _parse_adf(data, numpy_arrays, lazy)
+    _save_cached_adf(cache_file, cache_key, adf)
+  elif not (numpy_arrays or lazy):
+    # the source data is not pickled, serialize needs it to keep the layout of the file
+    adf.source_data = data[:adf.total_size]
+  return adf
+
+def select_adf_values(filename: str, path: str, modded: bool = True, instance_index: int = 0) -> list[tuple[any, int]]:
+  # (value, data_offset) for each match of an ADF path such as "FpsSettings.JumpSpeed" or "Parameters[*].Keys[0]"
+  # only the header of the file is parsed, the values are read straight from the instance data
+  return AdfSelection(filename, modded).values(path, instance_index)
+
+def select_adf_value(filename: str, path: str, modded: bool = True, instance_index: int = 0) -> tuple[any, int]:
+  return AdfSelection(filename, modded).value(path, instance_index)
+
+def _parse_adf(data: bytes, numpy_arrays: bool = False, lazy: bool = False) -> Adf:
+  # numpy and lazy parses are shared read-only documents that are never serialized, they do not keep the file data
   adf = Adf()
-  with ArchiveFile(open(file, 'rb')) as f:
-    adf.deserialize(f)
+  with ArchiveFile(io.BytesIO(data)) as f:
+    adf.deserialize(f, numpy_arrays=numpy_arrays, lazy=lazy, keep_source=not (numpy_arrays or lazy))
   return adf
 
+def _parse_adf_header(data: bytes) -> Adf:
+  adf = Adf()
+  with ArchiveFile(io.BytesIO(data)) as f:
+    adf.deserialize(f, process_instances=False)
+  return adf
+
+def _get_adf_cache_file(file: Path, numpy_arrays: bool = False, lazy: bool = False) -> Path | None:
+  # only unmodified game files are cached; modded copies change on every build
+  try:
+    relative_path = file.resolve().relative_to((mods.APP_DIR_PATH / "org").resolve())
+  except ValueError:
+    return None
+  suffix = f"{'.np' if numpy_arrays else ''}{'.lazy' if lazy else ''}.cache"
+  return mods.CACHE_PATH / "adf" / relative_path.with_name(f"{relative_path.name}{suffix}")
+
+def _load_cached_adf(cache_file: Path, cache_key: bytes) -> Adf | None:
+  try:
+    with open(cache_file, "rb") as fp:
+      if fp.read(len(cache_key)) != cache_key:
+        return None
+      return pickle.load(fp)
+  except FileNotFoundError:
+    return None
+  except Exception as ex:
+    logger.debug(f"Ignoring unreadable ADF cache {cache_file}: {ex}")
+    return None
+
+def _save_cached_adf(cache_file: Path, cache_key: bytes, adf: Adf) -> None:
+  tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+  try:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp_file, "wb") as fp:
+      fp.write(cache_key)
+      pickle.dump(adf, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+  except Exception as ex:
+    logger.debug(f"Unable to write ADF cache {cache_file}: {ex}")
+    tmp_file.unlink(missing_ok=True)
+
+
+class AdfSelection:
+  # an ADF file read once to select several paths from it, see select_adf_values
+  __slots__ = ('filename', 'data', 'adf')
+
+  def __init__(self, filename: str, modded: bool = True) -> None:
+    file = Path(mods.get_modded_file(filename) if modded else mods.get_org_file(filename))
+    self.filename = filename
+    self.data = mods.read_file_bytes(file)
+    self.adf = mods.get_document("adf:header", file, _parse_adf_header, self.data)
+
+  def values(self, path: str, instance_index: int = 0) -> list[tuple[any, int]]:
+    return self.adf.select(self.data, path, instance_index)
+
+  def value(self, path: str, instance_index: int = 0) -> tuple[any, int]:
+    values = self.values(path, instance_index)
+    if len(values) != 1:
+      raise ValueError(f"{path} matches {len(values)} values in {self.filename}")
+    return values[0]
+
 
 class XlsxCell:
   __slots__ = (
@@ -76,7 +182,9 @@ class XlsxCell:
     col_str, row = coordinate_from_string(self.coordinates)
     col = column_index_from_string(col_str)
     self.index = ( ( row - 1 ) * sheet["Cols"].value ) + col - 1  # -1 because spreadsheets start at A1 but lists start at 0
+    self._get_definition_and_value(adf_values, sheet, src_filename)
 
+  def _get_definition_and_value(self, adf_values: dict[str, AdfValue], sheet: AdfValue, src_filename: str) -> None:
     self.definition_index = int(sheet["CellIndex"].value[self.index])
     self.definition_index_offset = int(sheet["CellIndex"].data_offset + ( self.index * 4 ))
 
@@ -102,6 +210,22 @@ class XlsxCell:
     if self.value is None:
       raise ValueError(f'Unable to find cell "{self.coordinates}" on sheet "{self.sheet_name}" in file "{src_filename}"')
 
+  @classmethod
+  def from_index(cls, src_filename: str, extracted_adf: Adf, update_data: dict, sheet_index: int, index: int) -> 'XlsxCell':
+    # for cells that were already located in the sheet, e.g. by resolve_range_updates
+    cell = cls.__new__(cls)
+    adf_values = extracted_adf.table_instance_full_values[0].value
+    sheet = adf_values["Sheet"].value[sheet_index].value
+    cell.src_filename = src_filename
+    cell.sheet_name = update_data["sheet"]
+    cell.sheet_index = sheet_index
+    cell.index = index
+    cell.coordinates = calculate_coordinates(index, sheet["Cols"].value)
+    cell._get_definition_and_value(adf_values, sheet, src_filename)
+    if "value" in update_data:
+      cell._format_desired_data(update_data)
+    return cell
+
   def _format_desired_data(self, update_data: dict) -> dict:
     transform = update_data.get("transform")
     if transform == "multiply":
@@ -132,34 +256,225 @@ def get_sheet(extracted_adf: Adf, sheet_name: str) -> tuple[AdfValue, int]:
   return None, None
 
 
+DATA_ARRAY_NAMES = {0: "BoolData", 1: "StringData", 2: "ValueData"}
+
+
+def data_array_key(data_type: int, value: any) -> any:
+  # ValueData is stored as float32, so values are compared the way they read back from the file
+  if data_type == 2:
+    return float(np.float32(value))
+  return value
+
+
+def get_data_array_values(adf_values: dict[str, AdfValue], data_type: int) -> list:
+  array_values = adf_values[DATA_ARRAY_NAMES[data_type]].value
+  if data_type == 1:  # StringData is an array of AdfValues
+    return [s.value for s in array_values]
+  if data_type == 2:
+    return np.asarray(array_values, dtype=np.float32).tolist()
+  return list(array_values)
+
+
+class CellReferences:
+  """
+  Reverse index of the cell references in an extracted sheet ADF.
+
+  Tracks which cells use each cell definition, which definitions point at each data array
+  value, which indexes hold each value, and which definitions and values are unused. Every
+  change to CellIndex, DataIndex, Type or a data array made while processing cell updates
+  goes through this index so it stays current.
+  """
+
+  def __init__(self, adf_values: dict[str, AdfValue]) -> None:
+    self.adf_values = adf_values
+    self.definition_keys = []           # definition_index -> (data_type, value_index)
+    self.definitions_by_value = {}      # (data_type, value_index) -> {definition_index}
+    self.cells_by_definition = {}       # definition_index -> {(sheet_index, cell_index)}
+    self.cell_counts_by_value = {}      # (data_type, value_index) -> number of cells
+    for definition_index, definition in enumerate(adf_values["Cell"].value):
+      key = (int(definition.value["Type"].value), int(definition.value["DataIndex"].value))
+      self.definition_keys.append(key)
+      self.definitions_by_value.setdefault(key, set()).add(definition_index)
+    for sheet_index, sheet in enumerate(adf_values["Sheet"].value):
+      for cell_index, definition_index in enumerate(sheet.value["CellIndex"].value):
+        self.cells_by_definition.setdefault(int(definition_index), set()).add((sheet_index, cell_index))
+
+    self.unused_definitions = set(range(len(self.definition_keys))).difference(self.cells_by_definition)
+    for definition_index, cells in self.cells_by_definition.items():
+      if definition_index < len(self.definition_keys):
+        key = self.definition_keys[definition_index]
+        self.cell_counts_by_value[key] = self.cell_counts_by_value.get(key, 0) + len(cells)
+    self.unused_values = {}  # data_type -> {value_index}
+    for data_type, array_name in DATA_ARRAY_NAMES.items():
+      self.unused_values[data_type] = {
+        i for i in range(len(adf_values[array_name].value))
+        if not self.cell_counts_by_value.get((data_type, i))
+      }
+    self.value_keys = {}     # data_type -> [value key of each value_index]
+    self.value_indexes = {}  # data_type -> {value key -> [value_index]}
+    for data_type in DATA_ARRAY_NAMES:
+      self.value_keys[data_type] = get_data_array_values(adf_values, data_type)
+      self.value_indexes[data_type] = {}
+      for value_index, key in enumerate(self.value_keys[data_type]):
+        self.value_indexes[data_type].setdefault(key, []).append(value_index)
+    self._nearest_values = None  # sorted ValueData, built on the first closest value search and kept up to date after that
+
+  def _update_cell_count(self, key: tuple[int, int], difference: int) -> None:
+    old_count = self.cell_counts_by_value.get(key, 0)
+    new_count = old_count + difference
+    self.cell_counts_by_value[key] = new_count
+    data_type, value_index = key
+    if data_type not in self.unused_values or value_index >= len(self.adf_values[DATA_ARRAY_NAMES[data_type]].value):
+      return
+    if new_count == 0:
+      self.unused_values[data_type].add(value_index)
+    elif old_count == 0:
+      self.unused_values[data_type].discard(value_index)
+
+  def get_cells(self, definition_index: int, ignore_cell: XlsxCell = None) -> list[tuple[int, int, int]]:  # (sheet_index, cell_index, definition_index)
+    cells = self.cells_by_definition.get(definition_index, ())
+    return [
+      (sheet_index, cell_index, definition_index)
+      for (sheet_index, cell_index) in sorted(cells)
+      if not ignore_cell or (sheet_index, cell_index) != (ignore_cell.sheet_index, ignore_cell.index)
+    ]
+
+  def count_cells(self, definition_index: int, ignore_cell: XlsxCell = None) -> int:
+    cells = self.cells_by_definition.get(definition_index, ())
+    if ignore_cell and (ignore_cell.sheet_index, ignore_cell.index) in cells:
+      return len(cells) - 1
+    return len(cells)
+
+  def count_cells_with_value(self, data_type: int, value_index: int, ignore_cell: XlsxCell = None) -> int:
+    count = self.cell_counts_by_value.get((data_type, value_index), 0)
+    if ignore_cell:
+      definition_index = int(self.adf_values["Sheet"].value[ignore_cell.sheet_index].value["CellIndex"].value[ignore_cell.index])
+      if self.definition_keys[definition_index] == (data_type, value_index):
+        count -= 1
+    return count
+
+  def get_definitions(self, data_type: int, value_indexes: list[int]) -> list[int]:
+    definition_indexes = set()
+    for value_index in value_indexes:
+      definition_indexes.update(self.definitions_by_value.get((data_type, value_index), ()))
+    return sorted(definition_indexes)
+
+  def set_cell_definition(self, sheet_index: int, cell_index: int, definition_index: int) -> None:
+    cell_indexes = self.adf_values["Sheet"].value[sheet_index].value["CellIndex"].value
+    old_definition_index = int(cell_indexes[cell_index])
+    cell_indexes[cell_index] = definition_index
+    if old_definition_index == definition_index:
+      return
+    old_cells = self.cells_by_definition[old_definition_index]
+    old_cells.discard((sheet_index, cell_index))
+    if not old_cells:
+      self.unused_definitions.add(old_definition_index)
+    self.cells_by_definition.setdefault(definition_index, set()).add((sheet_index, cell_index))
+    self.unused_definitions.discard(definition_index)
+    self._update_cell_count(self.definition_keys[old_definition_index], -1)
+    self._update_cell_count(self.definition_keys[definition_index], 1)
+
+  def set_definition_value(self, definition_index: int, value_index: int, data_type: int = None) -> None:
+    definition = self.adf_values["Cell"].value[definition_index].value
+    definition["DataIndex"].value = value_index
+    if data_type is not None:
+      definition["Type"].value = data_type
+    old_key = self.definition_keys[definition_index]
+    new_key = (int(definition["Type"].value), int(value_index))
+    if old_key == new_key:
+      return
+    self.definition_keys[definition_index] = new_key
+    self.definitions_by_value[old_key].discard(definition_index)
+    self.definitions_by_value.setdefault(new_key, set()).add(definition_index)
+    if cell_count := len(self.cells_by_definition.get(definition_index, ())):
+      self._update_cell_count(old_key, -cell_count)
+      self._update_cell_count(new_key, cell_count)
+
+  def find_values(self, data_type: int, value: any) -> list[int]:
+    return list(self.value_indexes[data_type].get(data_array_key(data_type, value), ()))
+
+  def get_nearest_values(self) -> NearestValues:
+    if self._nearest_values is None:
+      self._nearest_values = NearestValues(self.adf_values["ValueData"].value)
+    return self._nearest_values
+
+  def set_value(self, data_type: int, value_index: int, value: any) -> None:
+    if data_type == 2 and self._nearest_values is not None:
+      self._nearest_values.set_value(value_index, self.adf_values["ValueData"].value[value_index])
+    old_key = self.value_keys[data_type][value_index]
+    new_key = data_array_key(data_type, value)
+    if old_key == new_key:
+      return
+    self.value_keys[data_type][value_index] = new_key
+    old_indexes = self.value_indexes[data_type][old_key]
+    old_indexes.remove(value_index)
+    if not old_indexes:
+      del self.value_indexes[data_type][old_key]
+    bisect.insort(self.value_indexes[data_type].setdefault(new_key, []), value_index)
+
+  def add_value(self, data_type: int) -> None:
+    array_values = self.adf_values[DATA_ARRAY_NAMES[data_type]].value
+    value_index = len(array_values) - 1
+    if data_type == 2 and self._nearest_values is not None and value_index == len(self._nearest_values.values):
+      self._nearest_values.append(array_values[value_index])
+    if value_index == len(self.value_keys[data_type]):  # not indexed yet
+      value = array_values[value_index].value if data_type == 1 else array_values[value_index]
+      key = data_array_key(data_type, value)
+      self.value_keys[data_type].append(key)
+      self.value_indexes[data_type].setdefault(key, []).append(value_index)
+    if not self.cell_counts_by_value.get((data_type, value_index)):
+      self.unused_values[data_type].add(value_index)
+
+  def add_definition(self) -> None:
+    definition_index = len(self.definition_keys)
+    definition = self.adf_values["Cell"].value[definition_index].value
+    key = (int(definition["Type"].value), int(definition["DataIndex"].value))
+    self.definition_keys.append(key)
+    self.definitions_by_value.setdefault(key, set()).add(definition_index)
+    if not self.cells_by_definition.get(definition_index):
+      self.unused_definitions.add(definition_index)
+
+
+_CELL_REFERENCES = weakref.WeakKeyDictionary()
+
+def get_cell_references(extracted_adf: Adf) -> CellReferences:
+  # built once per extracted ADF and kept up to date by process_cell_update
+  references = _CELL_REFERENCES.get(extracted_adf)
+  if references is None:
+    references = CellReferences(extracted_adf.table_instance_full_values[0].value)
+    _CELL_REFERENCES[extracted_adf] = references
+  return references
+
+
 def process_cell_update(cell: XlsxCell, extracted_adf: Adf, skip_add_data: bool = False, allow_new_data: bool = False, force: bool = False) -> list[dict]:
-  # skip_add_data = completely skip attempts to data to the file - just re-use existing values. This can be slow on large spreadsheets (animal_senses.bin)
+  # skip_add_data = completely skip attempts to data to the file - just re-use existing values
   # allow_new_data = enablie adding new String/Value data and cell definitions. Some files will cause crashes with added data
   adf_values = extracted_adf.table_instance_full_values[0].value
+  references = get_cell_references(extracted_adf)
   logger.debug("")
   logger.debug(f'Cell = Coordinates: {cell.coordinates}   Sheet: {cell.sheet_name}   Value: {cell.value}   Data Type: {cell.data_type}   Value Index: {cell.value_index}')
   logger.debug(f'Definition = Index: {cell.definition_index}   AttributeIndex: {cell.attribute_index}')
   logger.debug(f'Desired = Value: {cell.desired_value}   Data Type: {cell.desired_data_type}')
 
   # 0. If current cell already has desired value and is the correct type, don't change anything
-  if cell.value == cell.desired_value and cell.data_type == cell.desired_data_type:
+  if cell.data_type == cell.desired_data_type and data_array_key(cell.data_type, cell.value) == data_array_key(cell.desired_data_type, cell.desired_value):
     logger.debug('0. Current value and data type match. No changes to apply')
     return []
 
   # Try to find a safe way to overwrite data or repoint cell definitions to preferred values
   # 1. Check if the desired value is already in the data array. If it is then work with it
-  if is_desired_value_in_data_array(adf_values, cell):
+  if is_desired_value_in_data_array(adf_values, cell, references=references):
     logger.debug(f'1. Desired value {cell.desired_value} is in data array {cell.desired_data_array_name}')
-    if (file_updates := use_value_from_data_array(adf_values, cell)):
+    if (file_updates := use_value_from_data_array(adf_values, references, cell)):
       return file_updates
 
   # 2. Desired value does not exist in the data array. See if we can write it in without conflicts
   if not skip_add_data:
     logger.debug(f'2. Desired value {cell.desired_value} is NOT in the data array {cell.desired_data_array_name}')
-    if (file_updates := write_value_to_data_array(extracted_adf, cell)):
+    if (file_updates := write_value_to_data_array(extracted_adf, references, cell)):
       return file_updates
     if allow_new_data:
-      if (file_updates := add_new_value_to_data_array(extracted_adf, cell)):
+      if (file_updates := add_new_value_to_data_array(extracted_adf, references, cell)):
         return file_updates
 
   # 3. Cannot update the value of the specified cell to match the exact desired value without affecting other cells
@@ -171,33 +486,27 @@ def process_cell_update(cell: XlsxCell, extracted_adf: Adf, skip_add_data: bool
 
   # Locate the closest value in the data array and see if we can work with that. This only works for ValueData cells
   if cell.data_array_name == "ValueData":
-    if (file_updates := use_closest_value_in_array(adf_values, cell)):
+    if (file_updates := use_closest_value_in_array(adf_values, references, cell)):
       return file_updates
 
   # If you got all the way down here then you're out of luck for now.
   raise NotImplementedError(f'Unable to update cell {cell.coordinates} with the desired value {cell.desired_value}. Exiting...')
 
 
-def is_desired_value_in_data_array(adf_values: dict[str, AdfValue], cell: XlsxCell) -> bool:
-  if cell.data_array_name in ["BoolData", "ValueData"]:  # values stored directly in array
-    return cell.desired_value in adf_values[cell.desired_data_array_name].value
-  if cell.data_array_name == "StringData":  # StringData is an array of AdfValues
-    array_values = [s.value for s in adf_values["StringData"].value]
-    return cell.desired_value in array_values
-  return False
+def is_desired_value_in_data_array(adf_values: dict[str, AdfValue], cell: XlsxCell, references: CellReferences = None) -> bool:
+  if references is None:
+    references = CellReferences(adf_values)
+  return bool(references.find_values(cell.desired_data_type, cell.desired_value))
 
 
-def use_value_from_data_array(adf_values: dict[str, AdfValue], cell: XlsxCell) -> list[dict]:
+def use_value_from_data_array(adf_values: dict[str, AdfValue], references: CellReferences, cell: XlsxCell) -> list[dict]:
   # Value may exist more than once in array
-  if cell.desired_data_array_name == "StringData":
-    desired_value_indexes = [i for i, data in enumerate(adf_values[cell.desired_data_array_name].value) if data.value == cell.desired_value]
-  else:
-    desired_value_indexes = [i for i, value in enumerate(adf_values[cell.desired_data_array_name].value) if value == cell.desired_value]
+  desired_value_indexes = references.find_values(cell.desired_data_type, cell.desired_value)
 
   file_updates = []
   # 1a. Point current cell at a different definition that references the desired value
   #     The definition must also match our cell's attributes (text and background color)
-  cell_defs_with_matching_value = find_cell_definitions(adf_values, cell.desired_data_type, desired_value_indexes)
+  cell_defs_with_matching_value = find_cell_definitions(adf_values, cell.desired_data_type, desired_value_indexes, references=references)
   matching_definition = None
   if cell_defs_with_matching_value:
     logger.debug(f"   Found {len(cell_defs_with_matching_value)} cells with the desired value")
@@ -207,47 +516,47 @@ def use_value_from_data_array(adf_values: dict[str, AdfValue], cell: XlsxCell) -
       matching_definition = cell_defs_with_matching_attribute.pop()
     if matching_definition:
       file_updates.append({"offset": cell.definition_index_offset, "value": matching_definition[0]})
-      adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = matching_definition[0]
+      references.set_cell_definition(cell.sheet_index, cell.index, matching_definition[0])
       logger.debug(f'1a. Cell definition {matching_definition[0]} points at the desired value. Updating cell to use that definition.')
       return file_updates
 
   # 1b. Check if any other cells use the same definition as our cell
   #     If not, point current cell definition at desired value
-  cells_with_same_definition = find_cells(adf_values, definition_indexes=[cell.definition_index], ignore_cell=cell)
-  logger.debug(f'1b. {len(cells_with_same_definition)} other cells point at the same definition.')
+  cells_with_same_definition = references.count_cells(cell.definition_index, ignore_cell=cell)
+  logger.debug(f'1b. {cells_with_same_definition} other cells point at the same definition.')
   if not cells_with_same_definition:
     file_updates.append({"offset": cell.value_index_offset, "value": desired_value_indexes[0]})
-    adf_values["Cell"].value[cell.definition_index].value["DataIndex"].value = desired_value_indexes[0]
+    references.set_definition_value(cell.definition_index, desired_value_indexes[0])
     logger.debug(f'1b. No other cells share the same definition. Repointing defintiion at desired value {cell.desired_value} at index {desired_value_indexes[0]}.')
     return file_updates
 
   # 1c. Overwrite an unused cell definition (if one exists) to point it at the desired value in the data array
   #     Then point our cell at the customized cell definition
-  unused_definition_indexes = get_unused_cell_def_indexes(adf_values)
+  unused_definition_indexes = get_unused_cell_def_indexes(adf_values, references=references)
   if unused_definition_indexes:
     unused_definition_index = unused_definition_indexes.pop()
     logger.debug(f'1c. Overwriting unused cell definition {unused_definition_index} to point at desired value {cell.desired_value} at index {desired_value_indexes[0]}')
     unused_definition = adf_values["Cell"].value[unused_definition_index].value
     # Point unused cell definition at the desired value index
     file_updates.append({"offset": unused_definition["DataIndex"].data_offset, "value": desired_value_indexes[0]})
-    adf_values["Cell"].value[unused_definition_index].value["DataIndex"].value = desired_value_indexes[0]
+    references.set_definition_value(unused_definition_index, desired_value_indexes[0])
     # Point our cell at the updated definition
     file_updates.append({"offset": cell.definition_index_offset, "value": unused_definition_index})
-    adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = unused_definition_index
+    references.set_cell_definition(cell.sheet_index, cell.index, unused_definition_index)
     return file_updates
   # 1z. Unable to use the existing value in the array. Find another way to do it
   return None
 
 
-def write_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict]:
+def write_value_to_data_array(extracted_adf: Adf, references: CellReferences, cell: XlsxCell) -> list[dict]:
   adf_values = extracted_adf.table_instance_full_values[0].value
   file_updates = []
   logger.debug(f"2a. Attempting to writing value {cell.desired_value} to the data array")
   # 2a. Check if we can overwrite our current value
   #     Check if any other cells in the entire sheet point at the same value as our cell
   #     There might be a cell index that points at our cell but it could be unused
-  cells_with_shared_value = find_cells(adf_values, data_type=cell.data_type, value_index=cell.value_index, ignore_cell=cell)
-  logger.debug(f"  - {len(cells_with_shared_value)} other cells point at the same value.")
+  cells_with_shared_value = references.count_cells_with_value(cell.data_type, cell.value_index, ignore_cell=cell)
+  logger.debug(f"  - {cells_with_shared_value} other cells point at the same value.")
   if not cells_with_shared_value:  # if none are found then overwrite our current value in the data array
     logger.debug(f'  - Overwriting {cell.desired_data_array_name} value at index {cell.value_index} to new value {cell.desired_value}')
     file_updates.extend(overwrite_value(extracted_adf, cell))
@@ -256,7 +565,7 @@ def write_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict]:
     logger.debug(f'  - Cannot overwrite data at index {cell.value_index} directly without affecting other cells.')
 
   # 2b/c. Try to find an unused item in the data array to overwrite
-  unused_values = get_unused_values(adf_values, cell.desired_data_array_name, cell.desired_data_type)
+  unused_values = get_unused_values(adf_values, cell.desired_data_array_name, cell.desired_data_type, references=references)
   # 2b. If one exists, check if any other cells share our definition
   #     If not, overwrite the value and point our definition at the new value
   if unused_values:
@@ -264,20 +573,20 @@ def write_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict]:
     if logger.isEnabledFor(logging.DEBUG):  # skip this loop if logger is not in DEBUG mode
       for unused_value in unused_values:
         logger.debug(f'  - Index: {unused_value["index"]}   Value: {unused_value["value"]}')
-    if not find_cells(adf_values, definition_indexes=[cell.definition_index], ignore_cell=cell):
+    if not references.count_cells(cell.definition_index, ignore_cell=cell):
       # Overwrite the unused data array item
       unused_value = unused_values.pop()
       logger.debug(f'  - Overwriting unused {cell.desired_data_array_name} value at index {unused_value["index"]} to new value {cell.desired_value}')
       file_updates.extend(overwrite_value(extracted_adf, cell, unused_value))
       file_updates.append({"offset": cell.value_index_offset, "value": unused_value["index"]})
-      adf_values["Cell"].value[cell.definition_index].value["DataIndex"].value = unused_value["index"]
+      references.set_definition_value(cell.definition_index, unused_value["index"])
       logger.debug(f'  - Pointing cell {cell.coordinates} definition {cell.definition_index} at value index {unused_value["index"]} with value {cell.desired_value}')
       return file_updates
 
   # 2c. There's still an unused data array item we can overwrite
   #     Check if there is an unused cell definition that we can repurpose
   #     If so. overwrite the unused data item, repoint the unused definition, and repoint our cell at that definition
-  unused_definition_indexes = get_unused_cell_def_indexes(adf_values)
+  unused_definition_indexes = get_unused_cell_def_indexes(adf_values, references=references)
   if unused_values and unused_definition_indexes:
     unused_value = unused_values.pop()
     unused_definition_index = unused_definition_indexes.pop()
@@ -290,16 +599,15 @@ def write_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict]:
     # Point the unused cell definition at the new data array item
     logger.debug(f'  - Overwriting unused cell definition {unused_definition_index} to point at value index {unused_value["index"]}')
     file_updates.append({"offset": unused_definition["DataIndex"].data_offset, "value": unused_value["index"]})
-    adf_values["Cell"].value[unused_definition_index].value["DataIndex"].value = unused_value["index"]
     # Copy our cell definition type and attribute to the unused cell definition
     file_updates.append({"offset": unused_definition["Type"].data_offset, "value": cell.data_type})
     file_updates.append({"offset": unused_definition["AttributeIndex"].data_offset, "value": cell.attribute_index})
-    adf_values["Cell"].value[unused_definition_index].value["Type"].value = cell.data_type
+    references.set_definition_value(unused_definition_index, unused_value["index"], data_type=cell.data_type)
     adf_values["Cell"].value[unused_definition_index].value["AttributeIndex"].value = cell.attribute_index
     # Point our cell at the definition
     logger.debug(f'  - Pointing cell {cell.coordinates} at definition {unused_definition_index} with value {cell.desired_value}')
     file_updates.append({"offset": cell.definition_index_offset, "value": unused_definition_index})
-    adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = unused_definition_index
+    references.set_cell_definition(cell.sheet_index, cell.index, unused_definition_index)
     return file_updates
 
   # 2z. Unable to update a value in the array. Find another way to do it
@@ -316,6 +624,7 @@ def overwrite_value(extracted_adf: Adf, cell: XlsxCell, target: dict = None) ->
     # ValueData are 4-byte float and can be directly overwritten
     file_updates.append({"offset": target["offset"], "value": cell.desired_value})
     adf_values["ValueData"].value[target["index"]] = cell.desired_value
+    get_cell_references(extracted_adf).set_value(cell.desired_data_type, target["index"], cell.desired_value)
     return file_updates
   if cell.desired_data_array_name == "StringData":
     stringdata = adf_values["StringData"]
@@ -333,27 +642,18 @@ def overwrite_value(extracted_adf: Adf, cell: XlsxCell, target: dict = None) ->
       new_str_bytes += b'\x00' * difference
       file_updates.append({"offset": target["offset"], "value": new_str_bytes})
       stringdata.value[target["index"]].value = cell.desired_value
+      get_cell_references(extracted_adf).set_value(cell.desired_data_type, target["index"], cell.desired_value)
       logger.debug(f"   Overwriting value '{target["value"]}' with new value {cell.desired_value} at offset {target["offset"]}")
       return file_updates
-    else:  # new string is too long. Insert in the new string and shift all data the comes later in the file
-      # update headers and instance offsets
-      file_updates.extend(mods.update_non_instance_offsets(extracted_adf, difference))
-      file_updates.extend(update_instance_offsets(extracted_adf, difference, "StringData"))
-      # increase offsets of all string data values later in the array
-      file_updates.extend(update_stringdata_offsets(extracted_adf, difference, index=target["index"]))
-      logger.debug(f"   Overwriting value '{target["value"]}' with new value {cell.desired_value} at offset {target["offset"]}")
-      # add to array and increase array length in header
-      file_updates.append({
-        "offset": target["offset"],
-        "value": new_str_bytes,
-        "transform": "insert",
-        "bytes_to_remove": len(old_str_bytes),
-      })
+    else:  # new string is too long. The file is serialized again with the new string
+      logger.debug(f"   Replacing value '{target["value"]}' with longer value {cell.desired_value}")
       stringdata.value[target["index"]].value = cell.desired_value
+      get_cell_references(extracted_adf).set_value(cell.desired_data_type, target["index"], cell.desired_value)
+      file_updates.append(SERIALIZE_UPDATE)
       return file_updates
 
 
-def add_new_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict]:
+def add_new_value_to_data_array(extracted_adf: Adf, references: CellReferences, cell: XlsxCell) -> list[dict]:
   adf_values = extracted_adf.table_instance_full_values[0].value
   file_updates = []
   logger.debug(f'2d. Adding value {cell.desired_value} to the data array')
@@ -366,57 +666,58 @@ def add_new_value_to_data_array(extracted_adf: Adf, cell: XlsxCell) -> list[dict
   else:
     return []
   # Check if any other cells share our definition
-  if not find_cells(adf_values, definition_indexes=[cell.definition_index], ignore_cell=cell):
+  if not references.count_cells(cell.definition_index, ignore_cell=cell):
     # Point our cell definition at new array value
     logger.debug(f'  - Pointing cell {cell.coordinates} definition {cell.definition_index} at value index {new_value_index} with value {cell.desired_value}')
     file_updates.append({"offset": cell.value_index_offset, "value": new_value_index})
-    adf_values["Cell"].value[cell.definition_index].value["DataIndex"].value = new_value_index
+    references.set_definition_value(cell.definition_index, new_value_index)
   else:  # Check if there is an unused definition we can overwrite
-    if unused_definition_indexes:= get_unused_cell_def_indexes(adf_values):
+    if unused_definition_indexes:= get_unused_cell_def_indexes(adf_values, references=references):
       logger.debug(f"  - Found {len(unused_definition_indexes)} unused definitions: {unused_definition_indexes}")
       def_index = unused_definition_indexes.pop()
       # Update the Type of the unused cell definition
       file_updates.append({"offset": adf_values["Cell"].value[def_index].value["Type"].data_offset, "value": cell.desired_data_type})
-      adf_values["Cell"].value[def_index].value["Type"].value = cell.desired_data_type
       # Update the AttributeIndex of the unused cell definition
       file_updates.append({"offset": adf_values["Cell"].value[def_index].value["AttributeIndex"].data_offset, "value": cell.attribute_index})
       adf_values["Cell"].value[def_index].value["AttributeIndex"].value = cell.attribute_index
       # Point unused cell definition at the desired value index
       file_updates.append({"offset": adf_values["Cell"].value[def_index].value["DataIndex"].data_offset, "value": new_value_index})
-      adf_values["Cell"].value[def_index].value["DataIndex"].value = new_value_index
+      references.set_definition_value(def_index, new_value_index, data_type=cell.desired_data_type)
       # Point our cell at the updated definition
       file_updates.append({"offset": cell.definition_index_offset, "value": def_index})
-      adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = def_index
+      references.set_cell_definition(cell.sheet_index, cell.index, def_index)
       logger.debug(f'  - Overwriting unused cell definition {def_index} to point at desired value {cell.desired_value} at index {new_value_index}')
     else:  # Create a new one with our desired specs
       def_index = len(adf_values["Cell"].value)
       logger.debug(f'  - Creating new cell definition at index {def_index} (Type: {cell.desired_data_type}  DataIndex: {new_value_index}  AttributeIndex: {cell.attribute_index})')
       file_updates.extend(add_cell_definition(extracted_adf, cell, new_value_index))
+      references.add_definition()
     # Point our cell at the selected definition
     logger.debug(f'  - Pointing cell {cell.coordinates} at definition {def_index} with value {cell.desired_value}')
     file_updates.append({"offset": cell.definition_index_offset, "value": def_index})
-    adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = def_index
+    references.set_cell_definition(cell.sheet_index, cell.index, def_index)
     file_updates.append({"offset": 4, "value": 3})  # ADFv3 to prevent crash on load
+    extracted_adf.version = 3
   return file_updates
 
 
-def use_closest_value_in_array(adf_values: dict[str, AdfValue], cell: XlsxCell) -> list[tuple[int, int]]:
+def use_closest_value_in_array(adf_values: dict[str, AdfValue], references: CellReferences, cell: XlsxCell) -> list[tuple[int, int]]:
   file_updates = []
   # Find the closest value in the array
-  closest_value_index, closest_value = find_closest_value(adf_values["ValueData"].value, cell.desired_value)
+  closest_value_index, closest_value = find_closest_value(adf_values["ValueData"].value, cell.desired_value, nearest=references.get_nearest_values())
   logger.debug(f'  Closest value in data array is {closest_value} at index {closest_value_index}')
   # 3a. Check if any other cells are using the same definition as our cell.
   #     If not, point our cell definition at the closest value in the array
-  cells_with_same_definition = find_cells(adf_values, definition_indexes=[cell.definition_index], ignore_cell=cell)
-  logger.debug(f'3a. {len(cells_with_same_definition)} cells point at the same definition as our cell.')
+  cells_with_same_definition = references.count_cells(cell.definition_index, ignore_cell=cell)
+  logger.debug(f'3a. {cells_with_same_definition} cells point at the same definition as our cell.')
   if not cells_with_same_definition:
     file_updates.append({"offset": cell.value_index_offset, "value": closest_value_index})
-    adf_values["Cell"].value[cell.definition_index].value["DataIndex"].value = closest_value_index
+    references.set_definition_value(cell.definition_index, closest_value_index)
     logger.debug(f'  - Pointing cell {cell.coordinates} definition {cell.definition_index} with closest value {closest_value}')
     return file_updates
   # 3b. Check if any other definitions are pointing at the closest value
   #     If one is found then point our cell at that definition
-  defs_with_closest_value = find_cell_definitions(adf_values, cell.data_type, [closest_value_index])
+  defs_with_closest_value = find_cell_definitions(adf_values, cell.data_type, [closest_value_index], references=references)
   logger.debug(f'  - {len(defs_with_closest_value)} cell definitions point at a definition with the closest value {closest_value}: {[d[0] for d in defs_with_closest_value]}')
   if defs_with_closest_value:
     defs_with_same_attributes = [(i,d) for (i,d) in defs_with_closest_value if d["AttributeIndex"].value == cell.attribute_index]
@@ -426,107 +727,28 @@ def use_closest_value_in_array(adf_values: dict[str, AdfValue], cell: XlsxCell)
     else:
       chosen_definition = defs_with_closest_value.pop()
     file_updates.append({"offset": cell.definition_index_offset, "value": chosen_definition[0]})
-    adf_values["Sheet"].value[cell.sheet_index].value["CellIndex"].value[cell.index] = chosen_definition[0]
+    references.set_cell_definition(cell.sheet_index, cell.index, chosen_definition[0])
     logger.debug(f'3b. Pointing cell {cell.coordinates} at definition {chosen_definition[0]} with closest value {closest_value}')
     return file_updates
   # 3c. Point our cell definition at the closest value
   #     This will have unintended consequences since other cells use this cell definition
   file_updates.append({"offset": cell.value_index_offset, "value": closest_value_index})
-  adf_values["Cell"].value[cell.definition_index].value["DataIndex"].value = closest_value_index
+  references.set_definition_value(cell.definition_index, closest_value_index)
   logger.debug(f'3c. Pointing cell {cell.coordinates} definition {cell.definition_index} at value index {closest_value_index} with closest value {closest_value}')
   return file_updates
 
 
-def update_instance_offsets(extracted_adf: Adf, added_size: int, data_array_name: str) -> list[dict]:
-  file_updates = []
-  adf_values = extracted_adf.table_instance_full_values[0].value
-  # only update arrays that are later in the file. Thankfully dictionaries are ordered
-  array_names = list(adf_values.keys())
-  if data_array_name in array_names:
-    i = array_names.index(data_array_name)
-    arrays_to_update = array_names[i + 1:]
-  for array_name in arrays_to_update:
-    file_updates.extend(update_array_offsets(extracted_adf, added_size, array_name))
-  return file_updates
-
-
-def update_array_offsets(extracted_adf: Adf, added_size: int, array_name: str) -> list[dict]:
-  file_updates = []
-  instance_offset = extracted_adf.table_instance[0].offset
-  adf_values = extracted_adf.table_instance_full_values[0].value
-  if adf_values[array_name].data_offset != instance_offset:  # an empty array has the same offset as the instance
-    logger.debug(f"  Updating {array_name} array offsets by {added_size}")
-    file_updates.append({
-      "offset": adf_values[array_name].info_offset,
-      "value": added_size,
-      "transform": "add"
-    })
-    adf_values[array_name].data_offset += added_size
-    # StringData stores strings of arbitrary length in AdfValue objects that have separate info offsets
-    if array_name == "StringData":
-      file_updates.extend(update_stringdata_offsets(extracted_adf, added_size))
-    # Attribute array contains AdfValues with nested dictionaries of AdfValues
-    # These just point to offsets in other arrays. Update the extracted Adf but don't write anything back to the file
-    if array_name == "Attribute":
-      for i in adf_values[array_name].value:
-        i.info_offset += added_size
-        i.data_offset += added_size
-        for k,v in i.value.items():
-          v.info_offset += added_size
-          v.data_offset += added_size
-    if array_name == "DateData":  # never seen DateData and don't know what it looks like. If we find data then error out
-      if adf_values[array_name].value:
-        raise NotImplementedError("Updating DateData is not supported")
-
-  else:
-    logger.debug(f"  No offset update for array {array_name}")
-  return file_updates
-
-
-def update_stringdata_offsets(extracted_adf: Adf, added_size: int, index: int = -1) -> list[dict]:
-  # StringData values are arbitrary lengths. Their data_offsets are stored at the info_offset in StringData headers before the string array
-  file_updates = []
-  stringdata_array = extracted_adf.table_instance_full_values[0].value["StringData"].value
-  if logger.isEnabledFor(logging.DEBUG):  # skip this if logger is in DEBUG mode
-    i_to_update = [i for i in range(len(stringdata_array)) if i > index]
-    info_text = "info and " if index >= 0 else ""
-    logger.debug(f"  Updating {len(i_to_update)} StringData {info_text}data offsets by {added_size}")
-    # logger.debug(i_to_update)
-  for i, s in enumerate(stringdata_array):
-    if (
-      index == -1  # data was added before StringData = shift all offsets
-      or index > len(stringdata_array)  # new string was added and the end of array = adjust for new header uint32
-      or i > index  # existing string was overwritten = shift offsets for all strings later in the array
-    ):
-        file_updates.append({"offset": s.info_offset, "value": added_size, "transform": "add"})
-        s.data_offset += added_size
-        if index == -1:  # only need to shift info offsets if data was added before the StringData array
-            s.info_offset += added_size
-  return file_updates
+# Data added to a sheet is only added to the extracted ADF. This update tells apply_adf_updates_to_file to
+# serialize the whole file once all updates are made, instead of inserting bytes and shifting every offset after them
+SERIALIZE_UPDATE = {"transform": "serialize"}
 
 
 def add_float_to_valuedata(extracted_adf: Adf, value: float) -> list[dict]:
   logger.debug(f"  Adding value {value} to ValueData array")
   valuedata = extracted_adf.table_instance_full_values[0].value["ValueData"]
-  value_bytes = mods.create_bytearray(value, "float32")
-  file_updates = []
-  # update headers and instance offsets
-  file_updates.extend(mods.update_non_instance_offsets(extracted_adf, len(value_bytes)))
-  file_updates.extend(update_instance_offsets(extracted_adf, len(value_bytes), "ValueData"))
-  # add to array and increase array length in header
-  new_value_offset = valuedata.data_offset + (len(valuedata.value) * len(value_bytes))
-  file_updates.append({
-    "offset": new_value_offset,
-    "value": value_bytes,
-    "transform": "insert",
-  })
   valuedata.value.append(value)
-  file_updates.append({
-    "offset": valuedata.info_offset + 8,
-    "value": 1,
-    "transform": "add"
-  })
-  return file_updates
+  get_cell_references(extracted_adf).add_value(2)
+  return [SERIALIZE_UPDATE]
 
 
 def copy_string(old_string: AdfValue, str_bytes: bytearray) -> AdfValue:
@@ -543,41 +765,10 @@ def copy_string(old_string: AdfValue, str_bytes: bytearray) -> AdfValue:
 def add_string_to_stringdata(extracted_adf: Adf, value: str) -> list[dict]:
   stringdata = extracted_adf.table_instance_full_values[0].value["StringData"]
   logger.debug(f"  Adding value {value} to StringData Array at index {len(stringdata.value)}")
-  str_bytearray = mods.create_bytearray(value, "string")
   # Strings are stored as AdfValue objects. Copy the last string and update the values and offsets
-  new_string = copy_string(stringdata.value[-1], value)
-  file_updates = []
-  # update headers and instance offsets
-  added_size = len(str_bytearray) + 8  # padded byte length + info offset
-  file_updates.extend(mods.update_non_instance_offsets(extracted_adf, added_size))
-  file_updates.extend(update_instance_offsets(extracted_adf, added_size, "StringData"))
-  # increase all string data offsets by 8 bytes for the new info offset in stringdata headers
-  file_updates.extend(update_stringdata_offsets(extracted_adf, 8, index=len(stringdata.value)+1))
-  logger.debug(f"  Writing string offset {new_string.data_offset} at offset {new_string.info_offset}")
-  logger.debug(f"  Writing string value {bytes(str_bytearray)} at offset {new_string.data_offset}")
-  # info offsets are separated by a uint32 of "8" (08 00 00 00)
-  # there are also 4 null bytes before the first string
-  # add uint32 separator before the new info offset and insert it before the null padding
-  # string data_offsets are aligned to BOF in Adf object but aligned to instance_offset in bin
-  instance_offset = extracted_adf.table_instance[0].offset
-  file_updates.append({
-    "offset": new_string.info_offset - 4,
-    "value": mods.create_bytearray([8, new_string.data_offset - instance_offset], "uint32"),
-    "transform": "insert"
-  })
-  # add to array and increase array length in header
-  file_updates.append({
-    "offset": new_string.data_offset,
-    "value": str_bytearray,
-    "transform": "insert",
-  })
-  stringdata.value.append(new_string)
-  file_updates.append({
-    "offset": stringdata.info_offset + 8,
-    "value": 1,
-    "transform": "add"
-  })
-  return file_updates
+  stringdata.value.append(copy_string(stringdata.value[-1], value))
+  get_cell_references(extracted_adf).add_value(1)
+  return [SERIALIZE_UPDATE]
 
 
 def copy_cell_definition(old_cell_def: AdfValue, cell: XlsxCell, value_index: int) -> AdfValue:
@@ -601,26 +792,17 @@ def add_cell_definition(extracted_adf: Adf, cell: XlsxCell, value_index: int) ->
   logger.debug(f"  Adding new cell definition (Type: {cell.desired_data_type}  DataIndex: {value_index}  AttributeIndex: {cell.attribute_index})")
   cell_def_array = extracted_adf.table_instance_full_values[0].value["Cell"]
   # Cell definitions are AdfValue objects. Copy the last cell definition and update the values and offsets
-  cell_def = copy_cell_definition(cell_def_array.value[-1], cell, value_index)
-  cell_def_bytes = mods.create_bytearray([cell_def], "cell_definition")
-  added_size = len(cell_def_bytes)
-  file_updates = []
-  # update headers and instance offsets
-  file_updates.extend(mods.update_non_instance_offsets(extracted_adf, added_size))
-  file_updates.extend(update_instance_offsets(extracted_adf, added_size, "Cell"))
-  # add to array and increase array length in header
-  file_updates.append({
-    "offset": cell_def.data_offset,
-    "value": cell_def_bytes,
-    "transform": "insert",
-  })
-  cell_def_array.value.append(cell_def)
-  file_updates.append({
-    "offset": cell_def_array.info_offset + 8,
-    "value": 1,
-    "transform": "add"
-  })
-  return file_updates
+  cell_def_array.value.append(copy_cell_definition(cell_def_array.value[-1], cell, value_index))
+  return [SERIALIZE_UPDATE]
+
+
+def apply_adf_updates_to_file(src_filename: str, extracted_adf: Adf, file_updates: list[dict]) -> None:
+  # every update is also made to extracted_adf, so when data was added the file is written from it in one pass
+  if SERIALIZE_UPDATE in file_updates:
+    logger.debug(f"Serializing {src_filename} with added data")
+    mods.write_modded_bytes(src_filename, extracted_adf.serialize())
+  else:
+    mods.apply_updates_to_file(src_filename, file_updates)
 
 
 def apply_coordinate_updates_to_file(src_filename: str, coordinate_updates: list[dict], skip_add_data: bool = False, allow_new_data: bool = False, force: bool = False) -> None:
@@ -630,14 +812,14 @@ def apply_coordinate_updates_to_file(src_filename: str, coordinate_updates: list
     cell = XlsxCell(src_filename, extracted_adf, coordinate_update)
     allow_new_data = coordinate_update.get("allow_new_data", allow_new_data)
     file_updates.extend(process_cell_update(cell, extracted_adf, skip_add_data=skip_add_data, allow_new_data=allow_new_data, force=force))
-  mods.apply_updates_to_file(src_filename, file_updates)
+  apply_adf_updates_to_file(src_filename, extracted_adf, file_updates)
 
 
 def update_file_at_coordinates(src_filename: str, coordinate_update: dict, skip_add_data: bool = False, allow_new_data: bool = False, force: bool = False) -> None:
   extracted_adf = deserialize_adf(src_filename)
   cell = XlsxCell(src_filename, extracted_adf, coordinate_update)
   file_updates = process_cell_update(cell, extracted_adf, skip_add_data=skip_add_data, allow_new_data=allow_new_data, force=force)
-  mods.apply_updates_to_file(src_filename, file_updates)
+  apply_adf_updates_to_file(src_filename, extracted_adf, file_updates)
 
 
 def update_file_at_multiple_coordinates_with_value(src_filename: str, sheet_name: str, coordinates_list: list[str], value: any, transform: str = None, skip_add_data: bool = False, allow_new_data: bool = False, force: bool = False) -> None:
@@ -653,6 +835,104 @@ def update_file_at_multiple_coordinates_with_value(src_filename: str, sheet_name
   apply_coordinate_updates_to_file(src_filename, coordinate_updates, skip_add_data=skip_add_data, allow_new_data=allow_new_data, force=force)
 
 
+def get_range_cell_indexes(sheet: dict[str, AdfValue], range_update: dict) -> np.ndarray:
+  # indexes of the cells in a range, column by column like get_coordinates_range_from_file
+  # the range is either "range" in A1 notation ("B39:B43", "B:B", "3:4") or "rows" and "cols" like get_coordinates_range_from_file
+  if "range" in range_update:
+    col_start, row_start, col_end, row_end = range_boundaries(range_update["range"])
+  else:
+    row_start, row_end = range_update.get("rows", (None, None))
+    cols = range_update.get("cols", (None, None))
+    col_start = column_index_from_string(cols[0]) if cols[0] else None
+    col_end = column_index_from_string(cols[1]) if cols[1] else None
+  sheet_rows = sheet["Rows"].value
+  sheet_cols = sheet["Cols"].value
+  row_start = row_start or 1
+  row_end = row_end or sheet_rows  # default to last row in sheet
+  col_start = col_start or 1
+  col_end = col_end or sheet_cols  # default to last column in sheet
+  if row_end > sheet_rows or col_end > sheet_cols:
+    raise ValueError(f'Range {get_column_letter(col_start)}{row_start}:{get_column_letter(col_end)}{row_end} is outside of sheet "{range_update["sheet"]}"')
+  rows = np.arange(row_start - 1, row_end, dtype=np.int64)
+  cols = np.arange(col_start - 1, col_end, dtype=np.int64)
+  return (cols[:, np.newaxis] + rows[np.newaxis, :] * sheet_cols).ravel()
+
+
+def _get_desired_values(values: np.ndarray, range_update: dict) -> np.ndarray:
+  # desired values of ValueData cells, NaN where the desired value is not a number and has to be worked out per cell
+  value = range_update["value"]
+  if isinstance(value, bool) or not isinstance(value, (int, float)):
+    return np.full(len(values), np.nan)
+  transform = range_update.get("transform")
+  if transform == "multiply":
+    return values * value
+  if transform == "add":
+    return values + value
+  return np.full(len(values), float(value))
+
+
+def resolve_range_updates(extracted_adf: Adf, range_updates: list[dict]) -> list[tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+  """
+  Locate the cells of every range update with array operations on CellIndex, Cell and ValueData.
+  Returns (sheet_index, cell_indexes, definition_indexes, value_indexes, values, unchanged) per range update,
+  where unchanged marks the ValueData cells that already hold their desired value.
+  """
+  adf_values = extracted_adf.table_instance_full_values[0].value
+  references = get_cell_references(extracted_adf)
+  definition_keys = np.asarray(references.definition_keys, dtype=np.int64).reshape(-1, 2)
+  value_data = np.asarray(adf_values["ValueData"].value, dtype=np.float64)
+  sheet_cell_indexes = {}
+  resolved = []
+  for range_update in range_updates:
+    sheet, sheet_index = get_sheet(extracted_adf, range_update["sheet"])
+    if sheet is None:
+      raise ValueError(f'Unable to find sheet "{range_update["sheet"]}"')
+    if sheet_index not in sheet_cell_indexes:
+      sheet_cell_indexes[sheet_index] = np.asarray(sheet["CellIndex"].value, dtype=np.int64)
+    cell_indexes = get_range_cell_indexes(sheet, range_update)
+    definition_indexes = sheet_cell_indexes[sheet_index][cell_indexes]
+    data_types = definition_keys[definition_indexes, 0]
+    value_indexes = definition_keys[definition_indexes, 1]
+    is_value_data = data_types == 2
+    values = np.full(len(cell_indexes), np.nan)
+    values[is_value_data] = value_data[value_indexes[is_value_data]]
+    unchanged = is_value_data & (_get_desired_values(values, range_update).astype(np.float32) == values.astype(np.float32))
+    resolved.append((sheet_index, cell_indexes, definition_indexes, value_indexes, values, unchanged))
+  return resolved
+
+
+def update_file_at_ranges(src_filename: str, range_updates: list[dict], skip_add_data: bool = False, allow_new_data: bool = False, force: bool = False) -> None:
+  """
+  Update many ranges of a sheet ADF with a single read and write of the file.
+  range_updates = [{"sheet": "species_data", "range": "B39:B43", "value": 0.5, "transform": "multiply"}, ...]
+  Cells that already hold their desired value are skipped, the rest are updated in order like apply_coordinate_updates_to_file.
+  """
+  extracted_adf = deserialize_adf(src_filename)
+  adf_values = extracted_adf.table_instance_full_values[0].value
+  references = get_cell_references(extracted_adf)
+  value_data = adf_values["ValueData"].value
+  file_updates = []
+  for range_update, resolved in zip(range_updates, resolve_range_updates(extracted_adf, range_updates)):
+    sheet_index, cell_indexes, definition_indexes, value_indexes, values, unchanged = resolved
+    cell_definitions = adf_values["Sheet"].value[sheet_index].value["CellIndex"].value
+    update_allow_new_data = range_update.get("allow_new_data", allow_new_data)
+    logger.debug(f'Updating {len(cell_indexes)} cells on sheet "{range_update["sheet"]}", {int(unchanged.sum())} already have the desired value')
+    for cell_index, definition_index, value_index, value, is_unchanged in zip(
+      cell_indexes.tolist(), definition_indexes.tolist(), value_indexes.tolist(), values.tolist(), unchanged.tolist()
+    ):
+      # earlier updates in the batch can repoint a cell or its definition, so the resolved value must still be current
+      if (
+        is_unchanged
+        and cell_definitions[cell_index] == definition_index
+        and references.definition_keys[definition_index] == (2, value_index)
+        and data_array_key(2, value_data[value_index]) == data_array_key(2, value)
+      ):
+        continue
+      cell = XlsxCell.from_index(src_filename, extracted_adf, range_update, sheet_index, cell_index)
+      file_updates.extend(process_cell_update(cell, extracted_adf, skip_add_data=skip_add_data, allow_new_data=update_allow_new_data, force=force))
+  apply_adf_updates_to_file(src_filename, extracted_adf, file_updates)
+
+
 def get_data_array_for_data_type(extracted_adf: AdfValue, data_type: int) -> tuple[list, int]:
   if data_type == 0:
     array_name = "BoolData"
@@ -669,16 +949,17 @@ def find_cells(
     data_type: int = None,
     value_index: int = None,
     ignore_cell: XlsxCell = None,
+    references: CellReferences = None,
   ) -> list[tuple[int, int, int]]:  # (sheet_index, cell_index, definition_index)
+  if references is None:
+    references = CellReferences(adf_values)
   matching_cells = []
   if definition_indexes:  # find cells with same definition index
-    for sheet_index, sheet in enumerate(adf_values["Sheet"].value):
-      matching_cells.extend([(sheet_index, cell_index, def_index) for cell_index, def_index in enumerate(sheet.value["CellIndex"].value) if def_index in definition_indexes])
+    for definition_index in sorted(set(definition_indexes)):
+      matching_cells.extend(references.get_cells(definition_index, ignore_cell=ignore_cell))
   if data_type is not None and value_index is not None:  # find cells that point at the same value index
-    defs_with_value_match = find_cell_definitions(adf_values, data_type, [value_index])
-    matching_cells.extend(find_cells(adf_values, definition_indexes=[i for (i,_d) in defs_with_value_match]))
-  if ignore_cell:  # don't return the cell we're trying to match
-    matching_cells = [c for c in matching_cells if c != (ignore_cell.sheet_index, ignore_cell.index, ignore_cell.definition_index)]
+    for definition_index in references.get_definitions(data_type, [value_index]):
+      matching_cells.extend(references.get_cells(definition_index, ignore_cell=ignore_cell))
   return matching_cells
 
 
@@ -686,35 +967,27 @@ def find_cell_definitions(
     adf_values: dict[str, AdfValue],
     data_type: int,
     value_indexes: list[int],
+    references: CellReferences = None,
   ) -> list[tuple[int, dict]]:  # (definition_index, definition_object.value)
+  if references is None:
+    references = CellReferences(adf_values)
   cell_definitions = adf_values["Cell"].value
-  defs_with_value_match = [
-    (i, d.value)
-    for i,d in enumerate(cell_definitions)
-    if d.value["Type"].value == data_type and d.value["DataIndex"].value in value_indexes
-  ]
+  defs_with_value_match = [(i, cell_definitions[i].value) for i in references.get_definitions(data_type, value_indexes)]
   logger.debug(f"  Found {len(defs_with_value_match)} definitions with data type {data_type} pointing at value indexes in {value_indexes}")
   return defs_with_value_match
 
 
-def get_unused_cell_def_indexes(extracted_adf: AdfValue) -> list[int]:  # defitition_index
-  unused_definition_indexes = set(range(len(extracted_adf["Cell"].value)))
-  for sheet in extracted_adf["Sheet"].value:
-    in_use = set(sheet.value["CellIndex"].value)
-    unused_definition_indexes.difference_update(in_use)
-  return list(unused_definition_indexes)
-
+def get_unused_cell_def_indexes(extracted_adf: AdfValue, references: CellReferences = None) -> list[int]:  # defitition_index
+  if references is None:
+    references = CellReferences(extracted_adf)
+  return sorted(references.unused_definitions)
 
-def get_unused_values(adf_values: dict[str, AdfValue], data_array_name: str, data_type: int) -> list[dict]:
-  all_value_indexes = list(range(len(adf_values[data_array_name].value)))
-  unused_value_indexes = []
-  for value_index in all_value_indexes:
-     # check if any cells point at the index
-    if not find_cells(adf_values, data_type=data_type, value_index=value_index):
-      unused_value_indexes.append(value_index)
 
+def get_unused_values(adf_values: dict[str, AdfValue], data_array_name: str, data_type: int, references: CellReferences = None) -> list[dict]:
+  if references is None:
+    references = CellReferences(adf_values)
   unused_values = []
-  for index in unused_value_indexes:
+  for index in sorted(references.unused_values[data_type]):
     if data_array_name == "StringData":
       value = adf_values[data_array_name].value[index].value
       offset = adf_values[data_array_name].value[index].data_offset
@@ -725,21 +998,14 @@ def get_unused_values(adf_values: dict[str, AdfValue], data_array_name: str, dat
   return unused_values
 
 
-def find_closest_value(value_array: list[float], desired_value: float) -> tuple[int, float]:
-  match_index = None
-  closest_delta = 9999999
-  closest_match_index = None
-  for i, number in enumerate(value_array):
-    if float(number) == desired_value:
-      match_index = i
-      break
-    delta = abs(float(number) - desired_value)
-    if delta < closest_delta:
-      closest_match_index = i
-      closest_delta = delta
-  if match_index is not None:
-    return match_index, value_array[match_index]
-  return closest_match_index, value_array[closest_match_index]
+def find_closest_value(value_array: list[float], desired_value: float, nearest: NearestValues = None) -> tuple[int, float]:
+  # nearest = sorted index of value_array, e.g. from CellReferences.get_nearest_values
+  if nearest is None:
+    nearest = NearestValues(value_array)
+  closest_index = nearest.find_one(desired_value)
+  if closest_index is None:
+    return None, None
+  return closest_index, value_array[closest_index]
 
 
 def calculate_coordinates(index: int, cols: int) -> str:
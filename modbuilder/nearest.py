@@ -0,0 +1,70 @@
+import numpy as np
+
+# Nearest-value queries over a set of numbers
+#
+# The numbers are sorted once and every query is a binary search (np.searchsorted) instead of a
+# scan over all of them. The result is the same as the scans this replaces: an exact match wins,
+# otherwise the closest number, and of equally close numbers the one that comes first.
+# A changed or added number is moved into its place in the sorted order instead of sorting again.
+
+
+class NearestValues:
+  """Sorted index of values for finding the position of the value closest to a desired value"""
+
+  def __init__(self, values: list[float]) -> None:
+    self.values = np.array(values, dtype=np.float64)
+    positions = np.flatnonzero(~np.isnan(self.values))
+    # a stable sort keeps equal values in their original order, so the first of them is found first
+    self.positions = positions[np.argsort(self.values[positions], kind="stable")]
+    self.sorted_values = self.values[self.positions]
+
+  def __len__(self) -> int:
+    return len(self.sorted_values)
+
+  def _sorted_index(self, position: int, value: float) -> int:
+    # where (value, position) is or belongs in the sorted order, equal values are ordered by position
+    start = int(np.searchsorted(self.sorted_values, value, side="left"))
+    end = int(np.searchsorted(self.sorted_values, value, side="right"))
+    return start + int(np.searchsorted(self.positions[start:end], position))
+
+  def _insert(self, position: int, value: float) -> None:
+    if not np.isnan(value):
+      i = self._sorted_index(position, value)
+      self.positions = np.insert(self.positions, i, position)
+      self.sorted_values = np.insert(self.sorted_values, i, value)
+
+  def set_value(self, position: int, value: float) -> None:
+    old_value = self.values[position]
+    if old_value == value:
+      return
+    if not np.isnan(old_value):
+      i = self._sorted_index(position, old_value)
+      self.positions = np.delete(self.positions, i)
+      self.sorted_values = np.delete(self.sorted_values, i)
+    self.values[position] = value
+    self._insert(position, self.values[position])
+
+  def append(self, value: float) -> None:
+    self.values = np.append(self.values, value)
+    self._insert(len(self.values) - 1, self.values[-1])
+
+  def find(self, desired_values: list[float]) -> np.ndarray:
+    # positions of the closest values for many desired values at once, -1 where there is no value
+    desired = np.atleast_1d(np.asarray(desired_values, dtype=np.float64))
+    if not len(self.sorted_values):
+      return np.full(len(desired), -1, dtype=np.int64)
+    last = len(self.sorted_values) - 1
+    above = np.searchsorted(self.sorted_values, desired, side="left")  # first value >= desired
+    right = np.minimum(above, last)
+    left = np.searchsorted(self.sorted_values, self.sorted_values[np.maximum(above - 1, 0)], side="left")
+    left_delta = np.abs(self.sorted_values[left] - desired)
+    right_delta = np.abs(self.sorted_values[right] - desired)
+    left_positions = self.positions[left]
+    right_positions = self.positions[right]
+    use_left = (left_delta < right_delta) | ((left_delta == right_delta) & (left_positions < right_positions))
+    closest = np.where(use_left, left_positions, right_positions)
+    return np.where(np.isnan(desired), -1, closest)
+
+  def find_one(self, desired_value: float) -> int | None:
+    position = int(self.find([desired_value])[0])
+    return position if position >= 0 else None
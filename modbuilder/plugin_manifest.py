@@ -0,0 +1,225 @@
+import ast
+import json
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Metadata read from the plugin sources without executing them
+#
+# Each plugin entry records the file size/mtime it was read from, every top-level name the
+# plugin defines, the source of the metadata constants that are plain literals, and the keys
+# handled by `handle_key` when it is a simple equality or `startswith` check.
+PLUGIN_MANIFEST_VERSION = 1
+METADATA_NAMES = ("NAME", "DESCRIPTION", "DEBUG", "WARNING", "OPTIONS", "PRESETS", "FILE")
+
+
+def _get_assigned_names(node: ast.stmt) -> list[str]:
+  if isinstance(node, ast.Assign):
+    targets = node.targets
+  elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+    targets = [node.target]
+  else:
+    return []
+  names = []
+  for target in targets:
+    for name in ast.walk(target):
+      if isinstance(name, ast.Name):
+        names.append(name.id)
+  return names
+
+
+def _get_literal_source(source: str, node: ast.expr) -> str | None:
+  try:
+    ast.literal_eval(node)
+  except (ValueError, TypeError):
+    return None
+  return ast.get_source_segment(source, node)
+
+
+def _get_handled_keys(function: ast.FunctionDef, constants: dict[str, ast.expr]) -> dict[str, list[str]] | None:
+  # returns None when the keys can only be known by running `handle_key`
+  returns = [node for node in ast.walk(function) if isinstance(node, ast.Return)]
+  if not returns:
+    return {"equals": [], "prefixes": []}
+  if len(returns) != 1 or not function.args.args:
+    return None
+  arg_name = function.args.args[0].arg
+  value = returns[0].value
+
+  def literal_strings(node: ast.expr) -> list[str] | None:
+    if isinstance(node, ast.Name) and node.id in constants:
+      node = constants[node.id]
+    try:
+      literal = ast.literal_eval(node)
+    except (ValueError, TypeError):
+      return None
+    if isinstance(literal, str):
+      return [literal]
+    if isinstance(literal, tuple) and all(isinstance(item, str) for item in literal):
+      return list(literal)
+    return None
+
+  if (
+    isinstance(value, ast.Compare)
+    and isinstance(value.left, ast.Name) and value.left.id == arg_name
+    and len(value.ops) == 1 and isinstance(value.ops[0], ast.Eq)
+  ):
+    if (equals := literal_strings(value.comparators[0])) is not None:
+      return {"equals": equals, "prefixes": []}
+  if (
+    isinstance(value, ast.Call)
+    and isinstance(value.func, ast.Attribute) and value.func.attr == "startswith"
+    and isinstance(value.func.value, ast.Name) and value.func.value.id == arg_name
+    and len(value.args) == 1 and not value.keywords
+  ):
+    if (prefixes := literal_strings(value.args[0])) is not None:
+      return {"equals": [], "prefixes": prefixes}
+  return None
+
+
+def read_plugin_metadata(plugin_path: Path) -> dict:
+  source = plugin_path.read_text(encoding="utf-8")
+  tree = ast.parse(source, filename=str(plugin_path))
+  names = []
+  constants = {}
+  handle_key = None
+  for node in tree.body:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+      names.append(node.name)
+      if node.name == "handle_key":
+        handle_key = node
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+      names.extend((alias.asname or alias.name).split(".")[0] for alias in node.names)
+    elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+      assigned_names = _get_assigned_names(node)
+      names.extend(assigned_names)
+      if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None and len(assigned_names) == 1:
+        constants[assigned_names[0]] = node.value
+      else:
+        for name in assigned_names:
+          constants.pop(name, None)
+    else:  # names bound inside top-level if/try/for/with blocks
+      for child in ast.walk(node):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+          names.append(child.id)
+          constants.pop(child.id, None)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+          names.append(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+          names.extend((alias.asname or alias.name).split(".")[0] for alias in child.names)
+  # functions can also create module attributes through `global`
+  for node in ast.walk(tree):
+    if isinstance(node, ast.Global):
+      names.extend(node.names)
+      for name in node.names:
+        constants.pop(name, None)
+
+  values = {}
+  for name in METADATA_NAMES:
+    if name in constants and (literal_source := _get_literal_source(source, constants[name])) is not None:
+      values[name] = literal_source
+  return {
+    "names": sorted(set(names)),
+    "values": values,
+    "handled_keys": _get_handled_keys(handle_key, constants) if handle_key else None,
+  }
+
+
+def load_plugin_manifest(plugins_path: Path, plugin_names: list[str], manifest_path: Path) -> dict[str, dict | None]:
+  # plugins that cannot be parsed are left out as None so they are loaded (and fail) the usual way
+  manifest = {}
+  if manifest_path.exists():
+    try:
+      cached = json.loads(manifest_path.read_text(encoding="utf-8"))
+      if cached.get("version") == PLUGIN_MANIFEST_VERSION:
+        manifest = cached["plugins"]
+    except (OSError, ValueError, KeyError) as ex:
+      logger.debug(f"Rebuilding unreadable plugin manifest: {ex}")
+
+  plugins = {}
+  changed = False
+  for plugin_name in plugin_names:
+    plugin_path = plugins_path / f"{plugin_name}.py"
+    stat = plugin_path.stat()
+    entry = manifest.get(plugin_name)
+    if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+      try:
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **read_plugin_metadata(plugin_path)}
+      except (SyntaxError, ValueError, UnicodeDecodeError) as ex:
+        logger.debug(f"Unable to read plugin metadata from {plugin_path}: {ex}")
+        plugins[plugin_name] = None
+        continue
+      changed = True
+    plugins[plugin_name] = entry
+
+  if changed or plugins.keys() != manifest.keys():
+    try:
+      manifest_path.parent.mkdir(parents=True, exist_ok=True)
+      tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+      readable_plugins = {name: entry for name, entry in plugins.items() if entry is not None}
+      tmp_path.write_text(json.dumps({"version": PLUGIN_MANIFEST_VERSION, "plugins": readable_plugins}, indent=1), encoding="utf-8")
+      os.replace(tmp_path, manifest_path)
+      logger.debug(f"Updated plugin manifest with {len(plugins)} plugins")
+    except OSError as ex:
+      logger.debug(f"Unable to write plugin manifest {manifest_path}: {ex}")
+  return plugins
+
+
+class LazyPlugin:
+  """
+  Stand-in for a plugin module that only executes the plugin on first use.
+
+  Literal metadata and `handle_key` checks are answered from the manifest. Any other
+  attribute the plugin defines loads the module; names it does not define raise
+  AttributeError without loading, so `hasattr` checks stay cheap.
+  """
+
+  def __init__(self, name: str, metadata: dict, load: Callable[[str], ModuleType]) -> None:
+    self.__name__ = name
+    self._name = name
+    self._metadata = metadata
+    self._names = set(metadata["names"])
+    self._load = load
+    self._module = None
+    self._values = {}
+
+  def __repr__(self) -> str:
+    state = "loaded" if self._module else "not loaded"
+    return f"<plugin {self._name} ({state})>"
+
+  @property
+  def loaded(self) -> bool:
+    return self._module is not None
+
+  def load(self) -> ModuleType:
+    if self._module is None:
+      logger.debug(f"Loading plugin {self._name}")
+      self._module = self._load(self._name)
+    return self._module
+
+  def is_static(self, *names: str) -> bool:
+    # True if the given attributes can be read without running the plugin
+    if self._module is not None:
+      return True
+    return all(name not in self._names or name in self._metadata["values"] for name in names)
+
+  def _handle_key(self, mod_key: str) -> bool:
+    handled_keys = self._metadata["handled_keys"]
+    return mod_key in handled_keys["equals"] or mod_key.startswith(tuple(handled_keys["prefixes"]))
+
+  def __getattr__(self, name: str) -> any:
+    if name.startswith("_") or name not in self._names:
+      raise AttributeError(f"Plugin {self._name} has no attribute {name}")
+    if self._module is None:
+      if name in self._metadata["values"]:
+        if name not in self._values:
+          self._values[name] = ast.literal_eval(self._metadata["values"][name])
+        return self._values[name]
+      if name == "handle_key" and self._metadata["handled_keys"] is not None:
+        return self._handle_key
+    return getattr(self.load(), name)
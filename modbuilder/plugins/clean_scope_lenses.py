@@ -41,13 +41,14 @@ def merge_files(files: list[str], options: dict) -> None:
 def process(options: dict) -> None:
   night_vision = options.get("remove_night_vision_tint")
   if night_vision:
-    white_adf = mods2.deserialize_adf(NIGHT_VISION_WHITE_FILE, modded=False)
-    tint_index = white_adf.table_instance_full_values[0].value["Hashes"].value.index(2219558163)
-    tint_value_1 = white_adf.table_instance_full_values[0].value["Parameters"].value[tint_index].value["Keys"].value[0]
-    tint_value_2 = white_adf.table_instance_full_values[0].value["Parameters"].value[tint_index].value["Values"].value[0]
-    green_adf = mods2.deserialize_adf(NIGHT_VISION_FILE)
-    tint_offset_1 = green_adf.table_instance_full_values[0].value["Parameters"].value[tint_index].value["Keys"].data_offset
-    tint_offset_2 = green_adf.table_instance_full_values[0].value["Parameters"].value[tint_index].value["Values"].data_offset
+    white_file = mods2.AdfSelection(NIGHT_VISION_WHITE_FILE, modded=False)
+    night_vision_file = mods2.AdfSelection(NIGHT_VISION_FILE)
+    hashes, _offset = white_file.value("Hashes")
+    tint_index = list(hashes).index(2219558163)
+    tint_value_1, _offset = white_file.value(f"Parameters[{tint_index}].Keys[0]")
+    tint_value_2, _offset = white_file.value(f"Parameters[{tint_index}].Values[0]")
+    _value, tint_offset_1 = night_vision_file.value(f"Parameters[{tint_index}].Keys")
+    _value, tint_offset_2 = night_vision_file.value(f"Parameters[{tint_index}].Values")
     mods.update_file_at_offsets_with_values(
       NIGHT_VISION_FILE,
       [
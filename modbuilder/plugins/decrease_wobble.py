@@ -29,22 +29,22 @@ def format_options(options: dict) -> str:
   return f"Decrease Wobble (-{int(stand_percent)}% stand, -{int(crouch_percent)}% crouch, -{int(prone_percent)}% prone)"
 
 def update_values_at_offset(options: dict) -> None:
-  movement_file = mods2.deserialize_adf(FILE)
-  weapon_settings = movement_file.table_instance_full_values[0].value["FpsSettings"].value["WeaponSkillSettings"].value
+  settings_path = "FpsSettings.WeaponSkillSettings"
   stand_percent = options['reduce_stand_percent']
   crouch_percent = options['reduce_crouch_percent']
   prone_percent = options['reduce_prone_percent']
+  movement_file = mods2.AdfSelection(FILE)
   updates = [
     {
-      "offset": weapon_settings["StandingWoobleModifier"].data_offset,
+      "offset": movement_file.value(f"{settings_path}.StandingWoobleModifier")[1],
       "value": float(1 - stand_percent / 100),
     },
     {
-      "offset": weapon_settings["CrouchWoobleModifier"].data_offset,
+      "offset": movement_file.value(f"{settings_path}.CrouchWoobleModifier")[1],
       "value": float(1 - crouch_percent / 100),
     },
     {
-      "offset": weapon_settings["CrawlWoobleModifier"].data_offset,
+      "offset": movement_file.value(f"{settings_path}.CrawlWoobleModifier")[1],
       "value": float(1 - prone_percent / 100),
     },
   ]
@@ -1,4 +1,4 @@
-from deca.ff_rtpc import rtpc_from_binary, RtpcProperty, RtpcNode
+from deca.ff_rtpc import rtpc_columns_from_binary, RtpcProperty, RtpcNode
 from pathlib import Path
 from modbuilder import mods
 from enum import Enum
@@ -53,9 +53,7 @@ def update_uint(data: bytearray, offset: int, new_value: int) -> None:
         data[offset + i] = value_bytes[i]
 
 def update_reserve_deployables(root: RtpcNode, f_bytes: bytearray, multiply: int) -> None:
-  for data_table in root.child_table:
-    if data_table.name_hash == 3050727908:  # 0xb5d669e4
-      deployables = data_table.child_table
+  deployables = root.child_map[3050727908].child_table  # 0xb5d669e4
   deployable_values = []
   for deployable in deployables:
     if is_deployable(deployable.prop_table):
@@ -70,13 +68,11 @@ def update_reserve_deployables(root: RtpcNode, f_bytes: bytearray, multiply: int
 
 def save_file(filename: str, data: bytearray) -> None:
     base_path = mods.APP_DIR_PATH / "mod/dropzone/settings/hp_settings"
-    base_path.mkdir(exist_ok=True, parents=True)
-    (base_path / filename).write_bytes(data)
+    mods.write_modded_bytes(base_path / filename, data)
 
 def open_reserve(filename: Path) -> tuple[RtpcNode, bytearray]:
-  with(filename.open("rb") as f):
-    data = rtpc_from_binary(f)
-  f_bytes = bytearray(filename.read_bytes())
+  f_bytes = bytearray(mods.read_file_bytes(filename))
+  data = rtpc_columns_from_binary(f_bytes)
   return (data.root_node, f_bytes)
 
 def update_all_deployables(source: Path, multiply: int) -> None:
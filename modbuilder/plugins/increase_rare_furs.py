@@ -7,6 +7,7 @@ NAME = "Increase Rare Furs"
 DESCRIPTION = "Increase the percentage of animals with rare fur variations. Default rare fur chance is ~1.5%. This mod affects existing animals and does not require deleting your population file."
 WARNING = "This mod runs client-side and is incompatible with multiplayer and the Animal Population Scanner tool. However, Trophies WILL save and display properly in lodges, even after removing the mod."
 FILE = "global/global_animal_types.blo"
+CLASS_HASH = 343126393  # 0x1473b179 - "_class"
 OPTIONS = [
   {
    "name": "Rare Fur Percentage",
@@ -35,41 +36,32 @@ def get_name(animal: RtpcNode) -> str:
   else:
     return animal.prop_table[-12].data.decode('utf-8')
 
-def get_varitions_table_index(animal: RtpcNode) -> int:
-  for i in range(len(animal.child_table)):
-      table_type = animal.child_table[i].prop_table[0].data
-      if type(table_type) == bytes and table_type.decode("utf-8") == 'CAnimalTypeVisualVariationSettings':
-        return i
-  return None
+def get_variations_tables(global_animal_types: RtpcNode) -> list[RtpcNode]:
+  # the fur variations of every animal type
+  return global_animal_types.columns.find_nodes_with_prop(CLASS_HASH, "CAnimalTypeVisualVariationSettings")
 
 class Fur:
   def __init__(self, variant_node: RtpcNode) -> None:
-   self.name = variant_node.prop_table[-1].data.decode("utf-8")
+   self.name = variant_node.get_prop(4080448159).data.decode("utf-8")  # 0xf336b29f
    self.get_fur_weight(variant_node)
    self.get_fur_rarity(variant_node)
 
   def get_fur_weight(self, variant_node: RtpcNode) -> None:
-    if type(variant_node.prop_table[-3].data) == int:
-      i = -3
-    else:
-      i = -4
-    self.weight = variant_node.prop_table[i].data
-    self.weight_offset = variant_node.prop_table[i].data_pos
+    weight = variant_node.get_prop(3634380208)  # 0xd8a03db0
+    self.weight = weight.data
+    self.weight_offset = weight.data_pos
 
   def get_fur_rarity(self, variant_node: RtpcNode) -> None:
     # 0 = common, 1 = uncommon, 2 = rare, 3 = veryrare
-    if type(variant_node.prop_table[6].data) == int:
-      i = 6
-    else:
-      i = 7
-    self.rarity = variant_node.prop_table[i].data
-    self.rarity_offset = variant_node.prop_table[i].data_pos
+    rarity = variant_node.get_prop(3358259124)  # 0xc82af7b4
+    self.rarity = rarity.data
+    self.rarity_offset = rarity.data_pos
 
-def get_furs(variation_details: RtpcNode) -> list[Fur]:
+def get_furs(variation_details: list[RtpcNode]) -> list[Fur]:
   furs = []
   for variant_node in variation_details:
-    variant_type = variant_node.prop_table[0].data
-    if type(variant_type) == bytes and variant_type.decode("utf-8") == "SAnimalTypeVisualVariation":
+    variant_type = variant_node.get_prop(CLASS_HASH)
+    if variant_type and variant_type.data == b"SAnimalTypeVisualVariation":
       fur = Fur(variant_node)
       if "great_one" not in fur.name:  # Do not modify Great Ones
         furs.append(fur)
@@ -109,13 +101,8 @@ def process(options: dict) -> None:
 
   offsets_and_values = []
   global_animal_types_rtpc = mods.open_rtpc(mods.APP_DIR_PATH / "mod/dropzone" / FILE)
-  animals = global_animal_types_rtpc.child_table[0].child_table
-  for animal in animals:
-    variations_table_index = get_varitions_table_index(animal)
-    if variations_table_index is None:
-      continue
-    variations_table = animal.child_table[variations_table_index].child_table
-    furs = get_furs(variations_table)
+  for variations_table in get_variations_tables(global_animal_types_rtpc):
+    furs = get_furs(variations_table.child_table)
     rarity_weights = calculate_rarity_weights(furs, rare_fur_percentage)
     for fur in furs:
       offsets_and_values.append((fur.weight_offset, rarity_weights[fur.rarity]))
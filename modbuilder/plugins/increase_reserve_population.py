@@ -1,4 +1,4 @@
-from deca.ff_rtpc import rtpc_from_binary, RtpcProperty, RtpcNode
+from deca.ff_rtpc import rtpc_columns_from_binary, RtpcProperty, RtpcNode
 from pathlib import Path
 from modbuilder import mods
 from functools import reduce
@@ -29,8 +29,7 @@ class ReserveValue:
 
 def _save_file(filename: str, data: bytearray) -> None:
     base_path = mods.APP_DIR_PATH / "mod/dropzone/settings/hp_settings"
-    base_path.mkdir(exist_ok=True, parents=True)
-    (base_path / filename).write_bytes(data)
+    mods.write_modded_bytes(base_path / filename, data)
 
 def _all_non_zero_props(props: list[RtpcProperty]) -> list[ReserveValue]:
   offsets = []
@@ -93,9 +92,8 @@ def update_reserve_population(root: RtpcNode, f_bytes: bytearray, multiply: floa
      logger.exception(f"received error: {ex}")
 
 def _open_reserve(filename: Path) -> tuple[RtpcNode, bytearray]:
-  with(filename.open("rb") as f):
-    data = rtpc_from_binary(f)
-  f_bytes = bytearray(filename.read_bytes())
+  f_bytes = bytearray(mods.read_file_bytes(filename))
+  data = rtpc_columns_from_binary(f_bytes)
   return (data.root_node, f_bytes)
 
 def update_all_populations(source: Path, multiply: float) -> None:
@@ -26,6 +26,18 @@ AMMO_CLASS_BUTTONS_STATE = [True] * (MAX_SUPPORTED_CLASS + 1)
 AMMO_UI_DATA: dict[str, dict] = {}
 ALL_AMMO: dict[str, list['Ammo']] = {}
 STATS = ["damage", "expansion", "kinetic_energy", "mass", "max_range", "penetration", "projectiles"]
+# names of the stats in the ammo ADF
+STAT_MEMBERS = {
+  "kinetic_energy": "kinetic_energy",
+  "mass": "mass",
+  "penetration": "projectile_penetration",
+  "damage": "projectile_damage",
+  "expansion": "projectile_expansion_rate",
+  "contraction": "projectile_contraction_rate",
+  "max_expansion": "projectile_max_expansion",
+  "projectiles": "projectiles_per_shot",
+  "max_range": "max_range",
+}
 
 
 @dataclass
@@ -43,10 +55,6 @@ class AmmoStats:
 @dataclass
 class AmmoClassesData:
   items: list[int]
-  offset: int
-  info_offset: int
-  length_offset: int
-  missing_class_data: bool
 
 class Ammo:
   __slots__ = (
@@ -70,7 +78,7 @@ class Ammo:
   def __init__(self, file: str) -> None:
     self.file = file
     self._parse_name_and_type()
-    extracted_adf = mods2.deserialize_adf(mods.get_org_file(file))
+    extracted_adf = mods2.deserialize_adf(mods.get_org_file(file), lazy=True)
     self._get_classes_data(extracted_adf)
     self._get_stats(extracted_adf)
     self.ui_data = AMMO_UI_DATA.get(self.name)
@@ -92,34 +100,10 @@ class Ammo:
 
   def _get_stats(self, extracted_adf: Adf) -> AmmoStats:
     ammo_data = extracted_adf.table_instance_full_values[0].value
-    self.stats = AmmoStats(
-      kinetic_energy=StatWithOffset(ammo_data["kinetic_energy"]),
-      mass=StatWithOffset(ammo_data["mass"]),
-      penetration=StatWithOffset(ammo_data["projectile_penetration"]),
-      damage=StatWithOffset(ammo_data["projectile_damage"]),
-      expansion=StatWithOffset(ammo_data["projectile_expansion_rate"]),
-      contraction=StatWithOffset(ammo_data["projectile_contraction_rate"]),
-      max_expansion=StatWithOffset(ammo_data["projectile_max_expansion"]),
-      projectiles=StatWithOffset(ammo_data["projectiles_per_shot"]),
-      max_range=StatWithOffset(ammo_data["max_range"]),
-    )
+    self.stats = AmmoStats(**{stat: StatWithOffset(ammo_data[member]) for stat, member in STAT_MEMBERS.items()})
 
   def _get_classes_data(self, extracted_adf: Adf) -> AmmoClassesData:
-    ammo_data = extracted_adf.table_instance_full_values[0].value
-    if ammo_data["ammunition_class"].data_offset == ammo_data["ammunition_class"].info_offset:
-      # ammo has no classes array. Set a flag to insert data in the correct position
-      classes_offset = extracted_adf.table_instance[0].offset + extracted_adf.table_instance[0].size - 4
-      missing_class_data = True
-    else:
-      classes_offset = ammo_data["ammunition_class"].data_offset
-      missing_class_data = False
-    self.classes = AmmoClassesData(
-      items=self._get_classes(extracted_adf),
-      offset=classes_offset,
-      info_offset=ammo_data["ammunition_class"].info_offset,
-      length_offset=ammo_data["ammunition_class"].info_offset + 8,
-      missing_class_data=missing_class_data,
-    )
+    self.classes = AmmoClassesData(items=self._get_classes(extracted_adf))
 
   def _get_classes(self, extracted_adf: Adf) -> list[int]:
     # There are "placeholder" ammos in the game files that are not available in game and do not have Class data
@@ -562,39 +546,21 @@ def get_bundle_file(file: str) -> Path:
   return Path(file).parent / f"{Path(file).name.split('.')[0]}.ee"
 
 def merge_files(files: list[str], options: dict) -> None:
+  bundle_files = {}
   for file in files:
-    if file is not mods.EQUIPMENT_UI_FILE:
-      bundle_file = get_bundle_file(file)
-      mods.expand_into_archive(file, str(bundle_file))
-
-def update_classes_array(ammo: Ammo, classes: list[int]) -> list[dict]:
-  updates = []
-  if classes:
-    # Update classes length value
-    updates.append({"offset": ammo.classes.length_offset, "value": len(classes)})
-    # Create arrays
-    old_classes_array = mods.create_bytearray(ammo.classes.items, "classes")
-    classes_array = mods.create_bytearray(classes, "classes")
-    # Increase offsets
-    extracted_adf = mods2.deserialize_adf(ammo.file)
-    added_size = len(classes_array) - len(old_classes_array)
-    if added_size != 0:
-      updates.extend(mods.update_non_instance_offsets(extracted_adf, added_size))
-    # Remove the old array and insert the new array
-    updates.append({
-      "offset": ammo.classes.offset,
-      "value": classes_array,
-      "transform": "insert",
-      "bytes_to_remove": len(old_classes_array),
-    })
-    if ammo.classes.missing_class_data:
-      # Enforce info/data offsets. This lets us modify "_PLACEHOLDER" ammos that have no class data
-      added_offset = ammo.classes.offset - ammo.classes.info_offset
-      updates.append({"offset": ammo.classes.info_offset, "value": added_offset})
-      # Add missing separator after classes (uint32 "4" - 04 00 00 00)
-      updates.append({"offset": ammo.classes.offset + len(classes_array), "value": mods.create_bytearray(4, "uint32"), "transform": "insert"})
-      updates.extend(mods.update_non_instance_offsets(extracted_adf, 4))
-  return updates
+    if file != mods.EQUIPMENT_UI_FILE:
+      bundle_files.setdefault(get_bundle_file(file).as_posix(), []).append(file)
+  for bundle_file, files_to_merge in bundle_files.items():
+    mods.merge_into_bundle(bundle_file, files_to_merge)
+
+def update_classes_array(extracted_adf: Adf, classes: list[int]) -> list[dict]:
+  # the classes array changes size, so it is replaced in the extracted ADF and the file is serialized again.
+  # Ammos without class data ("_PLACEHOLDER" ammos) get their array the same way
+  if not classes:
+    return []
+  ammo_classes = extracted_adf.table_instance_full_values[0].value["ammunition_class"]
+  ammo_classes.value = [{"level": ammo_class} for ammo_class in classes]
+  return [mods2.SERIALIZE_UPDATE]
 
 def _pct_signed(base: float, modifier: float) -> float:
   # Signed percent modifier so +% always increases the result even if base < 0
@@ -692,6 +658,8 @@ def process(options: dict) -> None:
     modified_stats = {key: modified_stats[key] for key in sorted(modified_stats.keys())}
 
     int_stats = ["projectiles"]  # all other stats are float
+    extracted_adf = mods2.deserialize_adf(ammo.file)
+    ammo_data = extracted_adf.table_instance_full_values[0].value
     updates = []
     for stat, value in modified_stats.items():
       offset = getattr(ammo.stats, stat).offset
@@ -699,9 +667,10 @@ def process(options: dict) -> None:
       if value is None:
         raise ValueError("Unable to convert stat %s to %s: %s", stat, "int" if stat in int_stats else "float", value)
       updates.append({"offset": offset, "value": fmt_value})
+      ammo_data[STAT_MEMBERS[stat]].value = fmt_value
 
-    updates.extend(update_classes_array(ammo, classes))
-    mods.apply_updates_to_file(ammo.file, updates)
+    updates.extend(update_classes_array(extracted_adf, classes))
+    mods2.apply_adf_updates_to_file(ammo.file, extracted_adf, updates)
 
     # use calculated modifiers to update the UI values
     if ammo.ui_data:
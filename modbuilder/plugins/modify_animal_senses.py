@@ -47,55 +47,44 @@ def get_files(options: dict) -> list[str]:
 def process(options: dict) -> list[dict]:
   # We're modifying nearly 100 cells in a file with 62K+ cells
   # There are ~350 float values in the file already
-  # Pass `skip_add_data=True` to our mods2 functions to save a ton of time
-  # This will just re-use the closest existing value in the file instead of
-  #  checking every cell for an unused value to overwrite or adding hundreds of new values
-
-  vision_shadow_cells = mods2.range_to_coordinates_list("B", 39, 43)
-  vision_prone_cells = mods2.range_to_coordinates_list("B", 45, 50)
-  vision_crouch_cells = mods2.range_to_coordinates_list("B", 54, 59)
-  vision_stand_cells = mods2.range_to_coordinates_list("B", 63, 68)
-  vision_run_cells = mods2.range_to_coordinates_list("B", 72, 77)
-  vision_swim_cells = mods2.range_to_coordinates_list("B", 81, 86)
-  vision_cells = vision_shadow_cells + vision_prone_cells + vision_crouch_cells + vision_stand_cells + vision_run_cells + vision_swim_cells
+  # mods2 resolves all of the ranges in one pass and writes the file once, so the ranges are collected first
+
   vision_multiplier = 1 - options['reduce_vision_detection_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", vision_cells, vision_multiplier, transform="multiply", skip_add_data=True)
-
-  sound_prone_cells = mods2.range_to_coordinates_list("B", 93, 95)
-  sound_crouch_cells = mods2.range_to_coordinates_list("B", 98, 100)
-  sound_stand_cells = mods2.range_to_coordinates_list("B", 103, 105)
-  sound_run_cells = mods2.range_to_coordinates_list("B", 108, 110)
-  sound_swim_cells = mods2.range_to_coordinates_list("B", 113, 116)
-  sound_cells = sound_prone_cells + sound_crouch_cells + sound_stand_cells + sound_run_cells + sound_swim_cells
+  vision_ranges = ["B39:B43", "B45:B50", "B54:B59", "B63:B68", "B72:B77", "B81:B86"]  # shadow, prone, crouch, stand, run, swim
   sound_multiplier = 1 - options['reduce_sound_detection_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", sound_cells, sound_multiplier, transform="multiply", skip_add_data=True)
-
-  scent_prone_cells = mods2.range_to_coordinates_list("B", 119, 126)
-  scent_crouch_cells = mods2.range_to_coordinates_list("B", 130, 137)
-  scent_stand_cells = mods2.range_to_coordinates_list("B", 141, 148)
-  scent_run_cells = mods2.range_to_coordinates_list("B", 152, 159)
-  scent_swim_cells = mods2.range_to_coordinates_list("B", 163, 170)
-  scent_cells = scent_prone_cells + scent_crouch_cells + scent_stand_cells + scent_run_cells + scent_swim_cells
+  sound_ranges = ["B93:B95", "B98:B100", "B103:B105", "B108:B110", "B113:B116"]  # prone, crouch, stand, run, swim
   scent_multiplier = 1 - options['reduce_scent_detection_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", scent_cells, scent_multiplier, transform="multiply", skip_add_data=True)
+  scent_ranges = ["B119:B126", "B130:B137", "B141:B148", "B152:B159", "B163:B170"]  # prone, crouch, stand, run, swim
+  range_updates = [
+    *[{"sheet": "species_data", "range": cell_range, "value": vision_multiplier, "transform": "multiply"} for cell_range in vision_ranges],
+    *[{"sheet": "species_data", "range": cell_range, "value": sound_multiplier, "transform": "multiply"} for cell_range in sound_ranges],
+    *[{"sheet": "species_data", "range": cell_range, "value": scent_multiplier, "transform": "multiply"} for cell_range in scent_ranges],
+  ]
 
   attentive_percent = 1 + options['increase_attentiveness_threshold_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B4", "B5"], attentive_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B4:B5", "value": attentive_percent, "transform": "multiply"})
 
   alert_percent = 1 + options['increase_alert_threshold_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B6", "B7"], alert_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B6:B7", "value": alert_percent, "transform": "multiply"})
 
   alarmed_percent = 1 + options['increase_alarmed_threshold_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B8", "B9"], alarmed_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B8:B9", "value": alarmed_percent, "transform": "multiply"})
 
   defensive_percent = 1 + options['increase_defensive_threshold_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B10", "B11"], defensive_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B10:B11", "value": defensive_percent, "transform": "multiply"})
 
   nervous_duration_percent = 1 - options['reduce_nervous_duration_percent'] / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B12", "B13"], nervous_duration_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B12:B13", "value": nervous_duration_percent, "transform": "multiply"})
 
   defensive_duration_percent = 1 - options.get('reduce_defensive_duration_percent', 0) / 100
-  mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "species_data", ["B14", "B15", "B16", "B17"], defensive_duration_percent, transform="multiply", skip_add_data=True)
+  range_updates.append({"sheet": "species_data", "range": "B14:B17", "value": defensive_duration_percent, "transform": "multiply"})
+
+  weapon_fire_distance = options.get("weapon_fire_detection_distance")
+  if weapon_fire_distance is not None:
+    weapon_fire_distance_multiplier = weapon_fire_distance / 300  # default range
+    range_updates.append({"sheet": "weapon_data", "rows": (3, 4), "cols": ("B", None), "value": weapon_fire_distance_multiplier, "transform": "multiply"})
+
+  mods2.update_file_at_ranges(ANIMAL_SENSES_FILE, range_updates)
 
   tent_distance = options.get("tent_detection_distance")
   if tent_distance is not None:
@@ -103,9 +92,5 @@ def process(options: dict) -> list[dict]:
     ai_data_ranges = ai_data.table_instance_full_values[0].value["Perception"].value["EventRanges"].value
     mods.update_file_at_offset(AI_FILE, ai_data_ranges["SpookInRadius"].data_offset, tent_distance)
 
-  weapon_fire_distance = options.get("weapon_fire_detection_distance")
   if weapon_fire_distance is not None:
-    weapon_fire_distance_multiplier = weapon_fire_distance / 300  # default range
-    weapon_fire_coordinates = mods2.get_coordinates_range_from_file(ANIMAL_SENSES_FILE, "weapon_data", rows=(3, 4), cols=("B", None))
-    mods2.update_file_at_multiple_coordinates_with_value(ANIMAL_SENSES_FILE, "weapon_data", weapon_fire_coordinates, weapon_fire_distance_multiplier, transform="multiply", skip_add_data=True)
     mods.update_file_at_offset(AI_FILE, ai_data_ranges["WeaponFire"].data_offset, weapon_fire_distance)
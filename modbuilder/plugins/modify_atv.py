@@ -254,8 +254,6 @@ def process(options: dict) -> None:
     update_camera_file(options["camera_distance"])
 
 def merge_files(files: list[str], options: dict) -> None:
+  files_to_merge = [file for file in files if file not in [ANIMAL_SENSES_FILE, CAMERA_FILE]]
   for bundle_file in [RED_MERGE_PATH, SILVER_MERGE_PATH, JADE_MERGE_PATH]:
-    bundle_lookup = mods.get_sarc_file_info(mods.APP_DIR_PATH / "org" / bundle_file)
-    for file in files:
-      if file not in [ANIMAL_SENSES_FILE, CAMERA_FILE]:
-        mods.merge_into_archive(file, str(bundle_file), bundle_lookup)
+    mods.merge_into_bundle(str(bundle_file), files_to_merge)
@@ -113,14 +113,13 @@ def merge_files(files: list[str], options: dict) -> None:
 
 def process(options: dict) -> None:
   file = options["file"]
-  tuning_file = mods2.deserialize_adf(file)
-  tuning_values = tuning_file.table_instance_full_values[0].value
+  tuning_file = mods2.AdfSelection(file)
   updates = [
-    {"offset": tuning_values["zoom_multiplier_level_0"].data_offset, "value": options["level_1"]},
-    {"offset": tuning_values["zoom_multiplier_level_1"].data_offset, "value": options["level_2"]},
-    {"offset": tuning_values["zoom_multiplier_level_2"].data_offset, "value": options["level_3"]},
-    {"offset": tuning_values["zoom_multiplier_level_3"].data_offset, "value": options["level_4"]},
-    {"offset": tuning_values["zoom_multiplier_level_4"].data_offset, "value": options["level_5"]},
+    {"offset": tuning_file.value("zoom_multiplier_level_0")[1], "value": options["level_1"]},
+    {"offset": tuning_file.value("zoom_multiplier_level_1")[1], "value": options["level_2"]},
+    {"offset": tuning_file.value("zoom_multiplier_level_2")[1], "value": options["level_3"]},
+    {"offset": tuning_file.value("zoom_multiplier_level_3")[1], "value": options["level_4"]},
+    {"offset": tuning_file.value("zoom_multiplier_level_4")[1], "value": options["level_5"]},
   ]
   mods.apply_updates_to_file(file, updates)
 
@@ -39,12 +39,10 @@ def process(options: dict) -> None:
   base_detect = 25.0
   base_track = 25.0
   base_retrieve = 25.0
-  new_passive_cell = mods.find_closest_lookup(base_passive * xp, DOG_FILE)
-  new_sit_cell = mods.find_closest_lookup(base_sit * xp, DOG_FILE)
-  new_heel_cell = mods.find_closest_lookup(base_heel * xp, DOG_FILE)
-  new_detect_cell = mods.find_closest_lookup(base_detect * xp, DOG_FILE)
-  new_track_cell = mods.find_closest_lookup(base_track * xp, DOG_FILE)
-  new_retrieve_cell = mods.find_closest_lookup(base_retrieve * xp, DOG_FILE)
+  new_passive_cell, new_sit_cell, new_heel_cell, new_detect_cell, new_track_cell, new_retrieve_cell = mods.find_closest_lookups(
+    [base_passive * xp, base_sit * xp, base_heel * xp, base_detect * xp, base_track * xp, base_retrieve * xp],
+    DOG_FILE,
+  )
   
   updates = [
     {
@@ -1,6 +1,5 @@
 from modbuilder import mods
-from deca.ff_rtpc import rtpc_from_binary, RtpcNode, RtpcProperty
-import json, os
+from deca.ff_rtpc import rtpc_columns_from_binary, RtpcNode, RtpcProperty
 from pathlib import Path
 
 DEBUG=False
@@ -66,14 +65,12 @@ class Lure:
     self.range_offset = properties[i].data_pos
 
 def open_file(filename: Path) -> tuple[RtpcNode, bytearray]:
-  with(filename.open("rb")) as f:
-    data = rtpc_from_binary(f)
   f_bytes = bytearray(filename.read_bytes())
+  data = rtpc_columns_from_binary(f_bytes)
   return (data.root_node, f_bytes)
 
 def load_lures() -> list[Lure]:
-  root, _ext = os.path.splitext(FILE)
-  equipment_name_hashes = json.load((mods.LOOKUP_PATH / f"{root}.json").open())["equipment_name_hash"]
+  equipment_name_hashes = mods.load_lookup(FILE)["equipment_name_hash"]
   rtpc_root, _data = open_file(mods.get_org_file(FILE))
 
   lures = []
@@ -32,19 +32,21 @@ PRESETS = [
 
 class Reticle:
   def __init__(self, equipment_node: RtpcNode) -> None:
-    if type(equipment_node.prop_table[2].data) == bytes:
-      name = equipment_node.prop_table[2].data.decode('utf-8')
+    name = equipment_node.get_prop(3541743236)  # 0xd31ab684 - "name"
+    if name and type(name.data) == bytes:
+      name = name.data.decode('utf-8')
       if "reticle" in name:
         self.name = name
-        if type(equipment_node.prop_table[0].data) == int:
-          self.cost = equipment_node.prop_table[0].data
-          self.offset = equipment_node.prop_table[0].data_pos
+        cost = equipment_node.get_prop(870267695)  # 0x33df3b2f - "price"
+        if cost and type(cost.data) == int:
+          self.cost = cost.data
+          self.offset = cost.data_pos
         else:
-          raise ValueError("Item does not have an integer at position 0")
+          raise ValueError("Item does not have an integer price")
       else:
         raise ValueError('Name does not contain "reticle"')
     else:
-      raise ValueError("Item does not have a name at position 2")
+      raise ValueError("Item does not have a name")
 
 def load_reticles() -> list[Reticle]:
   reticles = []
@@ -53,30 +53,28 @@ class StoreItem:
     self.price = StatWithOffset(value=0, offset=0)
     self.quantity = StatWithOffset(value=0, offset=0)  # some items do not have quantity
     self.weight = StatWithOffset(value=-1, offset=0)  # some items do not have weight, -1 allows for legitimate items with 0 weight
-    for prop in equipment_node.prop_table:
-      name_hash = prop.name_hash
-      data = prop.data
-
-      if name_hash == 837395680 and self.type == "skin":  # 0x31e9a4e0, parse texture name to get skin names
-        self.name = data.decode("utf-8")
-
-      if name_hash == 3541743236 and self.type != "skin":  # 0xd31ab684 - "name", all other item types
-        self.name = data.decode("utf-8")
+    if self.type == "skin":
+      name = equipment_node.get_prop(837395680)  # 0x31e9a4e0, parse texture name to get skin names
+    else:
+      name = equipment_node.get_prop(3541743236)  # 0xd31ab684 - "name", all other item types
+    if name:
+      self.name = name.data.decode("utf-8")
 
-      if name_hash == 588564970:  # 0x2314c9ea - old name pre-2.2.2
-        if decoded := data.decode("utf-8"):
-          self.internal_name = decoded
+    if internal_name := equipment_node.get_prop(588564970):  # 0x2314c9ea - old name pre-2.2.2
+      if decoded := internal_name.data.decode("utf-8"):
+        self.internal_name = decoded
 
-      if name_hash == 870267695:  # 0x33df3b2f
-        self.price = StatWithOffset(prop)
+    if price := equipment_node.get_prop(870267695):  # 0x33df3b2f
+      self.price = StatWithOffset(price)
 
-      if name_hash == 1025589510:  # 0x3d214106
-        self.weight = StatWithOffset(prop)
+    if weight := equipment_node.get_prop(1025589510):  # 0x3d214106
+      self.weight = StatWithOffset(weight)
 
-      if name_hash == 2979948800 and data != 4294967295:  # 0xb19e6900
-          # some items in categories with quantity have no individual quantity (callers in "lures", backpacks in "misc")
-          # those items will have a "quantity" of 4294967295 (max 32-bit integer) that we can ignore
-          self.quantity = StatWithOffset(prop)
+    quantity = equipment_node.get_prop(2979948800)  # 0xb19e6900
+    if quantity and quantity.data != 4294967295:
+      # some items in categories with quantity have no individual quantity (callers in "lures", backpacks in "misc")
+      # those items will have a "quantity" of 4294967295 (max 32-bit integer) that we can ignore
+      self.quantity = StatWithOffset(quantity)
 
   def _parse_skin_name(self) -> None:
     skin_types = {
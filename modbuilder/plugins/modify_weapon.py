@@ -26,11 +26,10 @@ class WeaponMagazine:
         return f"( {self.name}, {self.type}, {self.size}, {self.offsets}, {self.internal_names} )"
 
     def __init__(self, weapon_data: RtpcNode) -> None:
-        for prop in weapon_data.prop_table:
-            if prop.name_hash == 3541743236:  # 0xd31ab684 - "name"
-                self.name = prop.data.decode("utf-8")
-            if prop.name_hash == 588564970:  # 0x2314c9ea - internal variant display name
-                self.internal_names = [prop.data.decode("utf-8")]
+        if name := weapon_data.get_prop(3541743236):  # 0xd31ab684 - "name"
+            self.name = name.data.decode("utf-8")
+        if internal_name := weapon_data.get_prop(588564970):  # 0x2314c9ea - internal variant display name
+            self.internal_names = [internal_name.data.decode("utf-8")]
         self._get_weapon_name_and_type()
         magazine = weapon_data.child_table[1].prop_table[2]
         self.size = magazine.data
@@ -145,7 +144,7 @@ class WeaponTuning:
     def __init__(self, file: str) -> None:
         self.file = file
         self._parse_name_and_type()
-        extracted_adf = mods2.deserialize_adf(mods.get_org_file(file))
+        extracted_adf = mods2.deserialize_adf(mods.get_org_file(file), numpy_arrays=True, lazy=True)  # only a few values and offsets are read
         try:
             self._get_offsets(extracted_adf)
             self._get_scopes_data(extracted_adf)
@@ -571,30 +570,13 @@ def get_files(options: dict) -> list[str]:
         return [*selected_weapon_files, mods.EQUIPMENT_DATA_FILE, mods.EQUIPMENT_UI_FILE]
 
 
-def load_archive_files(base_path: Path) -> dict[str, list[str]]:
-    archives = {}
-    for file in base_path.rglob("*.ee"):
-        archive_files = list(mods.get_sarc_file_info(file).keys())
-        archives[str(file)] = archive_files
-    return archives
-
-
-def find_archive_files(archive_files: dict, file: str) -> str:
-    found_archives = []
-    for archive, files in archive_files.items():
-        if file in files:
-            found_archives.append(mods.get_relative_path(archive))
-    return found_archives
-
-
 def merge_files(files: list[str], options: dict) -> None:
-    base_path = mods.APP_DIR_PATH / "org/editor/entities/hp_weapons"
-    archives = load_archive_files(base_path)
+    bundle_files = {}
     for file in files:
-        bundle_files = find_archive_files(archives, file)
-        for bundle_file in bundle_files:
-            bundle_lookup = mods.get_sarc_file_info(mods.APP_DIR_PATH / "org" / bundle_file)
-            mods.merge_into_archive(file, bundle_file, bundle_lookup)
+        for bundle_file in mods.find_bundles(file, "editor/entities/hp_weapons"):
+            bundle_files.setdefault(bundle_file, []).append(file)
+    for bundle_file, files_to_merge in bundle_files.items():
+        mods.merge_into_bundle(bundle_file, files_to_merge)
 
 
 def process(options: dict) -> None:
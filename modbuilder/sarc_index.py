@@ -0,0 +1,196 @@
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import NamedTuple
+
+from deca.ff_sarc import FileSarc
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Reverse index of every SARC bundle in org/: vpath -> bundles containing it
+#
+# The index is a single little-endian file meant to be read through mmap:
+#   header    magic, version, bundle/entry/vpath/slot counts, string blob size
+#   bundles   path string, size, mtime_ns, first entry, entry count
+#   entries   vpath index, offset, length, bundle index (grouped by bundle)
+#   vpaths    path string, first posting, posting count
+#   postings  entry indexes for each vpath
+#   slots     open addressing hash table of crc32(vpath) -> vpath index + 1
+#   strings   utf-8 blob referenced by bundles and vpaths
+SARC_INDEX_MAGIC = b"MBSI"
+SARC_INDEX_VERSION = 1
+BUNDLE_EXTENSIONS = (".ee", ".bl", ".blo")
+
+_HEADER = struct.Struct("<4s6I")
+_BUNDLE = struct.Struct("<IIQQII")
+_ENTRY = struct.Struct("<IIII")
+_VPATH = struct.Struct("<IIII")
+_U32 = struct.Struct("<I")
+
+
+class SarcIndexEntry(NamedTuple):
+  bundle: str   # bundle path relative to org/
+  vpath: str    # path of the file inside the bundle
+  offset: int   # offset of the file data in the bundle (0 for symlinks)
+  length: int   # length of the file data in the bundle
+
+  @property
+  def is_symlink(self) -> bool:
+    return self.offset == 0
+
+
+def list_bundles(org_path: Path) -> list[tuple[str, int, int]]:
+  bundles = []
+  for file in org_path.rglob("*"):
+    if file.suffix in BUNDLE_EXTENSIONS and file.is_file():
+      stat = file.stat()
+      bundles.append((file.relative_to(org_path).as_posix(), stat.st_size, stat.st_mtime_ns))
+  return sorted(bundles)
+
+
+def _read_bundle_entries(bundle_path: Path) -> list[tuple[str, int, int]]:
+  with bundle_path.open("rb") as fp:
+    if fp.read(8) != b"\x04\x00\x00\x00SARC":
+      return []  # .blo files can also be plain RTPC
+    fp.seek(0)
+    sarc = FileSarc()
+    sarc.header_deserialize(fp)
+  return [(entry.v_path.decode("utf-8"), entry.offset, entry.length) for entry in sarc.entries]
+
+
+def build_sarc_index(org_path: Path, index_path: Path, bundles: list[tuple[str, int, int]] = None) -> None:
+  if bundles is None:
+    bundles = list_bundles(org_path)
+
+  strings = bytearray()
+  string_offsets = {}
+  def add_string(value: str) -> tuple[int, int]:
+    encoded = value.encode("utf-8")
+    if encoded not in string_offsets:
+      string_offsets[encoded] = len(strings)
+      strings.extend(encoded)
+    return string_offsets[encoded], len(encoded)
+
+  bundle_rows = []
+  entry_rows = []
+  vpath_indexes = {}
+  postings = []
+  for bundle_index, (bundle, size, mtime_ns) in enumerate(bundles):
+    first_entry = len(entry_rows)
+    for vpath, offset, length in _read_bundle_entries(org_path / bundle):
+      if vpath not in vpath_indexes:
+        vpath_indexes[vpath] = len(postings)
+        postings.append([])
+      postings[vpath_indexes[vpath]].append(len(entry_rows))
+      entry_rows.append((vpath_indexes[vpath], offset, length, bundle_index))
+    bundle_rows.append((*add_string(bundle), size, mtime_ns, first_entry, len(entry_rows) - first_entry))
+
+  vpath_rows = []
+  posting_rows = []
+  for vpath, vpath_index in vpath_indexes.items():
+    vpath_rows.append((*add_string(vpath), len(posting_rows), len(postings[vpath_index])))
+    posting_rows.extend(postings[vpath_index])
+
+  slot_count = 1
+  while slot_count < len(vpath_rows) * 2:
+    slot_count *= 2
+  slots = [0] * slot_count
+  for vpath, vpath_index in vpath_indexes.items():
+    slot = zlib.crc32(vpath.encode("utf-8")) & (slot_count - 1)
+    while slots[slot]:
+      slot = (slot + 1) & (slot_count - 1)
+    slots[slot] = vpath_index + 1
+
+  data = bytearray(_HEADER.pack(SARC_INDEX_MAGIC, SARC_INDEX_VERSION, len(bundle_rows), len(entry_rows), len(vpath_rows), slot_count, len(strings)))
+  for row in bundle_rows:
+    data += _BUNDLE.pack(*row)
+  for row in entry_rows:
+    data += _ENTRY.pack(*row)
+  for row in vpath_rows:
+    data += _VPATH.pack(*row)
+  data += struct.pack(f"<{len(posting_rows)}I", *posting_rows)
+  data += struct.pack(f"<{slot_count}I", *slots)
+  data += strings
+
+  tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+  tmp_path.write_bytes(data)
+  os.replace(tmp_path, index_path)
+  logger.debug(f"Indexed {len(entry_rows)} files in {len(bundle_rows)} bundles")
+
+
+class SarcIndex:
+  def __init__(self, index_path: Path) -> None:
+    with index_path.open("rb") as fp:
+      self._data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, self.bundle_count, self.entry_count, self.vpath_count, self.slot_count, strings_size = _HEADER.unpack_from(self._data, 0)
+    if magic != SARC_INDEX_MAGIC or version != SARC_INDEX_VERSION:
+      self.close()
+      raise ValueError(f"Unsupported SARC index: {index_path}")
+    self._bundles_pos = _HEADER.size
+    self._entries_pos = self._bundles_pos + self.bundle_count * _BUNDLE.size
+    self._vpaths_pos = self._entries_pos + self.entry_count * _ENTRY.size
+    self._postings_pos = self._vpaths_pos + self.vpath_count * _VPATH.size
+    self._slots_pos = self._postings_pos + self.entry_count * _U32.size
+    self._strings_pos = self._slots_pos + self.slot_count * _U32.size
+    self._bundle_names = [self._read_string(*_BUNDLE.unpack_from(self._data, self._bundles_pos + i * _BUNDLE.size)[:2]) for i in range(self.bundle_count)]
+    self._bundle_lookup = {bundle: i for i, bundle in enumerate(self._bundle_names)}
+
+  def close(self) -> None:
+    self._data.close()
+
+  def _read_string(self, offset: int, length: int) -> str:
+    start = self._strings_pos + offset
+    return self._data[start:start + length].decode("utf-8")
+
+  def _read_entry(self, entry_index: int, vpath: str = None) -> SarcIndexEntry:
+    vpath_index, offset, length, bundle_index = _ENTRY.unpack_from(self._data, self._entries_pos + entry_index * _ENTRY.size)
+    if vpath is None:
+      vpath = self._read_string(*_VPATH.unpack_from(self._data, self._vpaths_pos + vpath_index * _VPATH.size)[:2])
+    return SarcIndexEntry(self._bundle_names[bundle_index], vpath, offset, length)
+
+  def get_bundles(self) -> list[tuple[str, int, int]]:
+    bundles = []
+    for i, bundle in enumerate(self._bundle_names):
+      _, _, size, mtime_ns, _, _ = _BUNDLE.unpack_from(self._data, self._bundles_pos + i * _BUNDLE.size)
+      bundles.append((bundle, size, mtime_ns))
+    return bundles
+
+  def find(self, vpath: str) -> list[SarcIndexEntry]:
+    encoded = vpath.encode("utf-8")
+    mask = self.slot_count - 1
+    slot = zlib.crc32(encoded) & mask
+    while True:
+      vpath_index = _U32.unpack_from(self._data, self._slots_pos + slot * _U32.size)[0]
+      if vpath_index == 0:
+        return []
+      string_offset, string_length, first_posting, posting_count = _VPATH.unpack_from(self._data, self._vpaths_pos + (vpath_index - 1) * _VPATH.size)
+      start = self._strings_pos + string_offset
+      if self._data[start:start + string_length] == encoded:
+        postings = struct.unpack_from(f"<{posting_count}I", self._data, self._postings_pos + first_posting * _U32.size)
+        return [self._read_entry(entry_index, vpath) for entry_index in postings]
+      slot = (slot + 1) & mask
+
+  def get_bundle_entries(self, bundle: str) -> list[SarcIndexEntry] | None:
+    bundle_index = self._bundle_lookup.get(bundle)
+    if bundle_index is None:
+      return None
+    _, _, _, _, first_entry, entry_count = _BUNDLE.unpack_from(self._data, self._bundles_pos + bundle_index * _BUNDLE.size)
+    return [self._read_entry(entry_index) for entry_index in range(first_entry, first_entry + entry_count)]
+
+
+def load_sarc_index(org_path: Path, index_path: Path) -> SarcIndex:
+  bundles = list_bundles(org_path)
+  if index_path.exists():
+    try:
+      index = SarcIndex(index_path)
+      if index.get_bundles() == bundles:
+        return index
+      index.close()
+      logger.info("Bundles in org/ have changed, rebuilding SARC index")
+    except (OSError, ValueError, struct.error) as ex:
+      logger.debug(f"Rebuilding unreadable SARC index: {ex}")
+  build_sarc_index(org_path, index_path, bundles)
+  return SarcIndex(index_path)
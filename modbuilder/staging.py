@@ -0,0 +1,70 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Files copied from org/ into the dropzone share the data of the org file until they are written
+#
+# A staged file is a reflink (copy-on-write clone) where the file system supports it, otherwise
+# a hard link and a real copy as the last resort. A reflink needs nothing else, but a hard link
+# is the org file itself: it is replaced by a private copy before anything writes into it in
+# place (materialize) and unlinked before it is written again as a whole (unshare).
+FICLONE = 0x40049409
+REFLINK_SUPPORTED = sys.platform.startswith("linux")  # cleared after the first failed clone
+
+
+def _reflink(src_path: Path, dest_path: Path) -> bool:
+  global REFLINK_SUPPORTED
+  if not REFLINK_SUPPORTED:
+    return False
+  import fcntl
+  try:
+    with open(src_path, "rb") as src, open(dest_path, "xb") as dest:
+      fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+    return True
+  except OSError as ex:
+    logger.debug(f"Unable to clone {src_path}, falling back to links: {ex}")
+    REFLINK_SUPPORTED = False
+    dest_path.unlink(missing_ok=True)
+    return False
+
+
+def stage_file(src_path: Path, dest_path: Path) -> None:
+  dest_path.parent.mkdir(parents=True, exist_ok=True)
+  if _reflink(src_path, dest_path):
+    return
+  try:
+    os.link(src_path, dest_path)
+    return
+  except OSError as ex:
+    logger.debug(f"Copying {src_path}, unable to link it: {ex}")
+  shutil.copy(src_path, dest_path)
+
+
+def is_shared(path: Path) -> bool:
+  try:
+    return path.stat().st_nlink > 1
+  except FileNotFoundError:
+    return False
+
+
+def materialize(path: Path) -> None:
+  # give a hard linked file its own copy before it is written in place
+  if not is_shared(path):
+    return
+  tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+  try:
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, path)
+  finally:
+    tmp_path.unlink(missing_ok=True)
+
+
+def unshare(path: Path) -> None:
+  # a hard linked file that is about to be written as a whole only needs to drop the link
+  if is_shared(path):
+    path.unlink()
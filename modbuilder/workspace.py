@@ -0,0 +1,324 @@
+import bisect
+import os
+import struct
+from pathlib import Path
+
+from modbuilder import staging
+from modbuilder.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+UPDATE_FORMATS = {"sint08": "h", "uint08": "B"}
+
+
+def plan_update(value: any, transform: str = None, format: str = None) -> tuple[str | None, str, any] | None:
+  # (struct format, operation, operand) of an offset update, None for updates that write nothing
+  if format:
+    if format not in UPDATE_FORMATS:
+      return None
+    return UPDATE_FORMATS[format], "set", value
+  if isinstance(value, str):
+    return None, "set", value.encode("utf-8")
+  if isinstance(value, bytes):
+    return None, "set", value
+  if isinstance(value, float):
+    return "f", "multiply" if transform == "multiply" else "set", value
+  if isinstance(value, int):
+    return "i", transform if transform in ("add", "multiply") else "set", value
+  return None
+
+
+class Patch:
+  """Updates planned at one offset, folded into a single value when they are written"""
+  __slots__ = ("offset", "size", "format", "ops", "sources")
+
+  def __init__(self, offset: int, size: int, format: str | None) -> None:
+    self.offset = offset
+    self.size = size
+    self.format = format
+    self.ops = []  # (operation, operand)
+    self.sources = []
+
+  @property
+  def end(self) -> int:
+    return self.offset + self.size
+
+  def needs_existing(self) -> bool:
+    return self.ops[0][0] != "set"
+
+  def fold(self, existing: bytes | None) -> bytes:
+    # same result as reading, updating and writing the value once per update
+    value = None
+    if existing is not None:
+      value = struct.unpack(self.format, existing)[0]
+    for operation, operand in self.ops:
+      if operation == "set":
+        value = operand
+      elif operation == "add":
+        value = value + operand
+      elif self.format == "f":
+        value = operand * value
+      else:
+        value = round(operand * value)
+      if self.format == "f":
+        value = struct.unpack("f", struct.pack("f", value))[0]
+    return value if self.format is None else struct.pack(self.format, value)
+
+
+class ModdedFile:
+  """
+  In-memory copy of a modded file.
+
+  Inserts are kept as pending splices (in the coordinates of the loaded data) for as long
+  as later updates land before the first or after the last splice, so a run of inserts
+  costs a single pass over the data when it is flushed.
+
+  Value updates are planned per offset and folded into one write each. They are applied
+  before anything reads or moves the bytes they cover. A file that only ever gets value
+  updates is never loaded, the folded values are written into it when it is saved.
+  Updates from different sources that overwrite each other are logged as conflicts.
+  """
+  __slots__ = ("path", "_data", "dirty", "conflicts", "_splices", "_size_delta", "_patches", "_patch_offsets")
+
+  def __init__(self, path: Path, data: bytes | bytearray = None) -> None:
+    self.path = path
+    self._data = None if data is None else bytearray(data)
+    self.dirty = data is not None
+    self.conflicts = []  # (offset, earlier sources, source)
+    self._splices = []  # (offset, bytes_to_remove, value) in ascending order
+    self._size_delta = 0
+    self._patches: dict[int, Patch] = {}
+    self._patch_offsets = []  # ascending, planned patches never overlap
+
+  @property
+  def data(self) -> bytearray:
+    if self._data is None:
+      self._data = bytearray(self.path.read_bytes())
+    return self._data
+
+  @data.setter
+  def data(self, value: bytearray) -> None:
+    self._data = value
+
+  def __len__(self) -> int:
+    self.apply_patches()
+    return len(self.data) + self._size_delta
+
+  def _overlapping_patches(self, offset: int, size: int) -> list[Patch]:
+    start = bisect.bisect_left(self._patch_offsets, offset)
+    end = bisect.bisect_left(self._patch_offsets, offset + size)
+    patches = [self._patches[patch_offset] for patch_offset in self._patch_offsets[start:end]]
+    if start > 0 and self._patches[self._patch_offsets[start - 1]].end > offset:
+      patches.insert(0, self._patches[self._patch_offsets[start - 1]])
+    return patches
+
+  def _report_conflict(self, offset: int, sources: list[str], source: str) -> None:
+    earlier_sources = sorted({s for s in sources if s is not None and s != source})
+    if source is None or not earlier_sources:
+      return
+    self.conflicts.append((offset, earlier_sources, source))
+    earlier_names = ", ".join(earlier_sources)
+    logger.warning(f"{source} overwrites the update of {earlier_names} at offset {offset} in {self.path}")
+
+  def update(self, offset: int, value: any, transform: str = None, format: str = None, source: str = None) -> None:
+    planned = plan_update(value, transform, format)
+    if planned is None:
+      return
+    format, operation, operand = planned
+    size = len(operand) if format is None else struct.calcsize(format)
+    patch = self._patches.get(offset)
+    if patch is None or patch.size != size or patch.format != format:
+      overlapping = self._overlapping_patches(offset, size)
+      if overlapping:
+        self._report_conflict(offset, [s for p in overlapping for s in p.sources], source)
+        self.apply_patches()
+      patch = Patch(offset, size, format)
+      self._patches[offset] = patch
+      bisect.insort(self._patch_offsets, offset)
+    elif operation == "set":
+      self._report_conflict(offset, patch.sources, source)
+    patch.ops.append((operation, operand))
+    patch.sources.append(source)
+    self.dirty = True
+
+  def _take_patch_runs(self, read) -> list[tuple[int, list[bytes]]]:
+    # folded values with the ones that touch merged into runs, each run is a single write
+    runs = []
+    for offset in self._patch_offsets:
+      patch = self._patches[offset]
+      value = patch.fold(read(offset, patch.size) if patch.needs_existing() else None)
+      if runs and runs[-1][0] + runs[-1][1] == offset:
+        runs[-1][1] += len(value)
+        runs[-1][2].append(value)
+      else:
+        runs.append([offset, len(value), [value]])
+    self._patches = {}
+    self._patch_offsets = []
+    return [(offset, values) for offset, _, values in runs]
+
+  def apply_patches(self) -> None:
+    if not self._patches:
+      return
+    for offset, values in self._take_patch_runs(self._read):
+      self._write(offset, b"".join(values))
+
+  def _save_patches(self) -> None:
+    staging.materialize(self.path)
+    with self.path.open("r+b") as f:
+      def read(offset: int, size: int) -> bytes:
+        f.seek(offset)
+        return f.read(size)
+      runs = self._take_patch_runs(read)
+      for offset, values in runs:
+        if hasattr(os, "pwritev"):
+          os.pwritev(f.fileno(), values, offset)
+        else:
+          f.seek(offset)
+          f.write(b"".join(values))
+
+  def _locate(self, offset: int, size: int) -> int:
+    # map a current offset to the loaded data without flushing if it is outside all splices
+    if not self._splices:
+      return offset
+    first_offset = self._splices[0][0]
+    if offset + size <= first_offset:
+      return offset
+    last_offset, last_removed, last_value = self._splices[-1]
+    last_end = last_offset + (self._size_delta - (len(last_value) - last_removed)) + len(last_value)
+    if offset >= last_end:
+      return offset - self._size_delta
+    self.flush()
+    return offset
+
+  def flush(self) -> None:
+    if not self._splices:
+      return
+    parts = []
+    position = 0
+    for offset, bytes_to_remove, value in self._splices:
+      parts.append(self.data[position:offset])
+      parts.append(value)
+      position = offset + bytes_to_remove
+    parts.append(self.data[position:])
+    self.data = bytearray(b"".join(parts))
+    self._splices = []
+    self._size_delta = 0
+
+  def _read(self, offset: int, size: int) -> bytes:
+    offset = self._locate(offset, size)
+    return bytes(self.data[offset:offset + size])
+
+  def read(self, offset: int, size: int) -> bytes:
+    if self._patches and self._overlapping_patches(offset, size):
+      self.apply_patches()
+    return self._read(offset, size)
+
+  def _write(self, offset: int, value: bytes) -> None:
+    offset = self._locate(offset, len(value))
+    if offset > len(self.data):
+      self.data.extend(bytes(offset - len(self.data)))
+    self.data[offset:offset + len(value)] = value
+    self.dirty = True
+
+  def write(self, offset: int, value: bytes) -> None:
+    if self._patches and self._overlapping_patches(offset, len(value)):
+      self.apply_patches()
+    self._write(offset, value)
+
+  def insert(self, offset: int, value: bytes, bytes_to_remove: int = 0) -> None:
+    self.apply_patches()
+    self.dirty = True
+    if self._splices:
+      last_offset, last_removed, last_value = self._splices[-1]
+      last_end = last_offset + (self._size_delta - (len(last_value) - last_removed)) + len(last_value)
+      if offset < last_end:
+        self.flush()
+    base_offset = offset - self._size_delta
+    if base_offset > len(self.data):
+      self.flush()
+      self.data.extend(bytes(offset - len(self.data)))
+      base_offset = offset
+    bytes_to_remove = min(bytes_to_remove, len(self.data) - base_offset)
+    self._splices.append((base_offset, bytes_to_remove, bytes(value)))
+    self._size_delta += len(value) - bytes_to_remove
+
+  def getvalue(self) -> bytes:
+    self.apply_patches()
+    self.flush()
+    return bytes(self.data)
+
+  def replace(self, value: bytes) -> None:
+    self._splices = []
+    self._size_delta = 0
+    self._patches = {}
+    self._patch_offsets = []
+    self.data = bytearray(value)
+    self.dirty = True
+
+  def save(self) -> None:
+    if not self.dirty:
+      return
+    if self._data is None:
+      # only value updates were planned, they are written into the file in place
+      self._save_patches()
+    else:
+      self.apply_patches()
+      self.flush()
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      staging.unshare(self.path)
+      self.path.write_bytes(self.data)
+    self.dirty = False
+
+
+class ModWorkspace:
+  """Build-scoped set of modded files that are loaded once and written once on commit"""
+
+  def __init__(self, base_path: Path) -> None:
+    self.base_path = base_path
+    self.files: dict[str, ModdedFile] = {}
+    self.source = None  # mod whose updates are being applied, used to report conflicting updates
+    self.inputs = set()   # org files read while the workspace is open, relative to org/
+    self.outputs = set()  # dropzone files created outside of the workspace, e.g. copies of org files
+
+  def get_key(self, filename: str | Path) -> str | None:
+    path = Path(filename)
+    if path.is_absolute():
+      if not path.is_relative_to(self.base_path):
+        return None
+      path = path.relative_to(self.base_path)
+    return path.as_posix()
+
+  def __contains__(self, filename: str | Path) -> bool:
+    return self.get_key(filename) in self.files
+
+  def get(self, filename: str | Path) -> ModdedFile:
+    key = self.get_key(filename)
+    if key is None:
+      raise ValueError(f"{filename} is not a modded file")
+    modded_file = self.files.get(key)
+    if modded_file is None:
+      modded_file = ModdedFile(self.base_path / key)
+      self.files[key] = modded_file
+    return modded_file
+
+  def set(self, filename: str | Path, value: bytes) -> None:
+    key = self.get_key(filename)
+    if key is None:
+      raise ValueError(f"{filename} is not a modded file")
+    if key in self.files:
+      self.files[key].replace(value)
+    else:
+      self.files[key] = ModdedFile(self.base_path / key, value)
+
+  def discard(self, filename: str | Path) -> None:
+    self.files.pop(self.get_key(filename), None)
+
+  def commit(self) -> list[str]:
+    written = []
+    for key, modded_file in self.files.items():
+      if modded_file.dirty:
+        modded_file.save()
+        written.append(key)
+    logger.debug(f"Wrote {len(written)} modded files")
+    self.files = {}
+    return written
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+from modbuilder import mods
+
+
+@pytest.fixture
+def app_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+  # an empty org/ and mod/ next to each other, like the real application directory
+  (tmp_path / "org").mkdir()
+  monkeypatch.setattr(mods, "APP_DIR_PATH", tmp_path)
+  monkeypatch.setattr(mods, "ORG_PATH", tmp_path / "org")
+  monkeypatch.setattr(mods, "MOD_PATH", tmp_path / "mod/dropzone")
+  monkeypatch.setattr(mods, "LOOKUP_PATH", tmp_path / "org/lookups")
+  monkeypatch.setattr(mods, "BUILD_JOURNAL_PATH", tmp_path / "mod/build_journal.json")
+  monkeypatch.setattr(mods, "LOOKUPS", {})
+  monkeypatch.setattr(mods, "LOOKUP_INDEXES", {})
+  monkeypatch.setattr(mods, "PROCESS_INPUTS", set())
+  monkeypatch.setattr(mods, "WORKSPACE", None)
+  return tmp_path
+
+
+def write_org_file(app_dir: Path, filename: str, data: bytes) -> Path:
+  path = app_dir / "org" / filename
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_bytes(data)
+  return path
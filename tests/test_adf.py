@@ -0,0 +1,150 @@
+import io
+import pickle
+import re
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import pytest
+from conftest import write_org_file
+
+from deca.ff_adf import Adf, AdfValue
+from deca.file import ArchiveFile
+from modbuilder import mods, mods2
+
+ORG_PATH = Path(__file__).resolve().parent.parent / "modbuilder/org"
+ADF_FILES = sorted(
+  path.relative_to(ORG_PATH).as_posix() for path in ORG_PATH.rglob("*")
+  if path.is_file() and path.read_bytes()[:4] == b" FDA"
+)
+SELECT_FILES = [
+  "editor/entities/hp_characters/main_characters/elmer/elmer_movement.mtunec",
+  "editor/entities/hp_equipment/optics/tuning/equipment_optics_binoculars_01.sighttunec",
+  "editor/entities/hp_weapons/weapon_rifles_01/tuning/weapon_rifle_drilling.wtunec",  # arrays in arrays
+  "environment/weather/night_vision.environc",
+  "settings/hp_settings/equipment_stats_ui.bin",
+]
+
+
+def parse_adf(data: bytes) -> Adf:
+  adf = Adf()
+  adf.deserialize(ArchiveFile(io.BytesIO(data)))
+  return adf
+
+
+def value_paths(value: AdfValue, path: str = ""):
+  # (path, value) of every member and array element below value, with explicit [n] indexes
+  if isinstance(value.value, dict):
+    for name, member in value.value.items():
+      member_path = f"{path}.{name}" if path else name
+      yield member_path, member
+      yield from value_paths(member, member_path)
+  elif isinstance(value.value, list) and value.value and isinstance(value.value[0], AdfValue):
+    for i, element in enumerate(value.value):
+      yield f"{path}[{i}]", element
+      yield from value_paths(element, f"{path}[{i}]")
+
+
+def plain(value: any) -> any:
+  # selected structures are decoded lazily, only the values of primitives, strings and primitive arrays are compared
+  if isinstance(value, AdfValue):
+    value = value.value
+  if isinstance(value, Mapping):
+    return None
+  if hasattr(value, "tolist"):
+    value = value.tolist()
+  if isinstance(value, Sequence) and not isinstance(value, (bytes, str)):
+    if len(value) and isinstance(value[0], AdfValue):
+      return None
+    value = list(value)
+  return repr(value)  # NaN values compare equal by repr
+
+
+@pytest.mark.parametrize("filename", ADF_FILES)
+def test_unchanged_adf_serializes_to_the_same_bytes(filename: str) -> None:
+  data = (ORG_PATH / filename).read_bytes()
+  adf = parse_adf(data)
+  assert adf.serialize(verify=True) == data
+
+
+def test_added_value_keeps_the_offsets_of_the_other_blocks() -> None:
+  data = (ORG_PATH / "settings/hp_settings/equipment_stats_ui.bin").read_bytes()
+  adf = parse_adf(data)
+  adf.table_instance_full_values[0].value["ValueData"].value.append(1.5)
+  changed = parse_adf(adf.serialize(verify=True))
+
+  values = changed.table_instance_full_values[0].value
+  assert values["ValueData"].value[-1] == 1.5
+  assert len(values["ValueData"].value) == len(parse_adf(data).table_instance_values[0]["ValueData"]) + 1
+  # the added float takes the padding in front of BoolData, nothing else moves
+  for name, value in parse_adf(data).table_instance_full_values[0].value.items():
+    assert values[name].data_offset == value.data_offset, name
+
+
+def test_pickled_adf_does_not_keep_the_source_data() -> None:
+  data = (ORG_PATH / "settings/hp_settings/equipment_stats_ui.bin").read_bytes()
+  adf = parse_adf(data)
+  assert adf.source_data == data
+  assert pickle.loads(pickle.dumps(adf)).source_data is None
+  assert adf.source_data == data
+
+
+def test_cached_adf_serializes_with_the_layout_of_the_file(app_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(mods, "CACHE_PATH", app_dir / "cache")
+  data = (ORG_PATH / "settings/hp_settings/equipment_stats_ui.bin").read_bytes()
+  path = write_org_file(app_dir, "settings/hp_settings/equipment_stats_ui.bin", data)
+  mods2._load_adf(path, data)
+  cache_files = list((app_dir / "cache").rglob("*.cache"))
+  assert len(cache_files) == 1
+  assert data[0x40:] not in cache_files[0].read_bytes()
+
+  adf = mods2._load_adf(path, data)
+  assert adf.source_data == data
+  assert adf.serialize() == data
+  # read-only parses shared through the document registry do not hold the file a second time
+  assert mods2._load_adf(path, data, lazy=True).source_data is None
+  assert mods2._load_adf(path, data, numpy_arrays=True).source_data is None
+
+
+@pytest.mark.parametrize("filename", SELECT_FILES)
+def test_select_matches_the_deserialized_values(filename: str) -> None:
+  data = (ORG_PATH / filename).read_bytes()
+  adf = parse_adf(data)
+  header = Adf()
+  header.deserialize(ArchiveFile(io.BytesIO(data)), process_instances=False)
+
+  wildcard_matches = {}
+  for path, value in value_paths(adf.table_instance_full_values[0]):
+    match = (plain(value), value.data_offset)
+    assert [(plain(v), offset) for v, offset in header.select(data, path)] == [match], path
+    wildcard_matches.setdefault(re.sub(r"\[\d+\]", "[*]", path), []).append(match)
+  # [*] visits every element in order, outer arrays first
+  for path, matches in wildcard_matches.items():
+    assert [(plain(v), offset) for v, offset in header.select(data, path)] == matches, path
+
+
+def test_select_index_out_of_range() -> None:
+  data = (ORG_PATH / "environment/weather/night_vision.environc").read_bytes()
+  adf = parse_adf(data)
+  count = len(adf.table_instance_full_values[0].value["Parameters"].value)
+  with pytest.raises(IndexError):
+    adf.select(data, f"Parameters[{count}].Keys")
+  with pytest.raises(KeyError):
+    adf.select(data, "Parameters.Keys")
+
+
+def test_adf_selection_reads_the_file_once(app_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+  data = (ORG_PATH / "environment/weather/night_vision.environc").read_bytes()
+  write_org_file(app_dir, "environment/weather/night_vision.environc", data)
+  reads = []
+  read_file_bytes = mods.read_file_bytes
+  monkeypatch.setattr(mods, "read_file_bytes", lambda path: reads.append(path) or read_file_bytes(path))
+
+  selection = mods2.AdfSelection("environment/weather/night_vision.environc", modded=False)
+  keys = selection.values("Parameters[*].Keys")
+  parameters = parse_adf(data).table_instance_full_values[0].value["Parameters"].value
+  assert [offset for _value, offset in keys] == [p.value["Keys"].data_offset for p in parameters]
+  assert selection.value("Parameters[1].Keys") == keys[1]
+  assert selection.value("Parameters[1].Keys[0]")[0] == parameters[1].value["Keys"].value[0]
+  with pytest.raises(ValueError):
+    selection.value("Parameters[*].Keys")
+  assert len(reads) == 1
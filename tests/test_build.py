@@ -0,0 +1,120 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from conftest import write_org_file
+
+from modbuilder import build, build_journal, mods
+
+
+def use_plugins(monkeypatch: pytest.MonkeyPatch, plugins: dict[str, SimpleNamespace]) -> None:
+  monkeypatch.setattr(mods, "get_mod", lambda mod_key: plugins[mod_key])
+
+
+def files_plugin(*files: str, **attributes: any) -> SimpleNamespace:
+  return SimpleNamespace(get_files=lambda options: list(files), **attributes)
+
+
+def test_plan_build_groups_mods_that_share_a_file(monkeypatch: pytest.MonkeyPatch) -> None:
+  use_plugins(monkeypatch, {
+    "a": SimpleNamespace(FILE="settings/a.bin"),
+    "b": files_plugin("settings/b.bin"),
+    "c": files_plugin("settings/c.bin", "settings/a.bin"),
+  })
+  groups = build.plan_build({"a": {}, "b": {}, "c": {"value": 1}})
+  assert groups == [{"a": {}, "c": {"value": 1}}, {"b": {}}]
+
+
+def test_plan_build_groups_mods_that_merge_into_the_same_bundle(monkeypatch: pytest.MonkeyPatch) -> None:
+  merge = lambda files, options: None
+  use_plugins(monkeypatch, {
+    "a": files_plugin("ui/a.ddsc", merge_files=merge),
+    "b": files_plugin("ui/b.ddsc", merge_files=merge),
+    "c": files_plugin("ui/c.ddsc"),
+  })
+  monkeypatch.setattr(mods, "find_bundles", lambda file: ["ui/hud.ee"] if file in ("ui/a.ddsc", "ui/b.ddsc") else [])
+  groups = build.plan_build({"a": {}, "b": {}, "c": {}})
+  assert groups == [{"a": {}, "b": {}}, {"c": {}}]
+
+
+def test_plan_build_keeps_disjoint_mods_apart(monkeypatch: pytest.MonkeyPatch) -> None:
+  use_plugins(monkeypatch, {key: files_plugin(f"settings/{key}.bin") for key in "abc"})
+  groups = build.plan_build({"c": {}, "a": {}, "b": {}})
+  assert groups == [{"c": {}}, {"a": {}}, {"b": {}}]
+
+
+def test_plan_build_keeps_the_mod_order_in_a_group(monkeypatch: pytest.MonkeyPatch) -> None:
+  # d joins a and c together after both were seen, the group is still in mod list order
+  use_plugins(monkeypatch, {
+    "a": files_plugin("settings/a.bin"),
+    "b": files_plugin("settings/b.bin"),
+    "c": files_plugin("settings/c.bin"),
+    "d": files_plugin("settings/c.bin", "settings/a.bin"),
+  })
+  groups = build.plan_build({"c": {}, "b": {}, "a": {}, "d": {}})
+  assert [list(group) for group in groups] == [["c", "a", "d"], ["b"]]
+
+
+def write_plugin(filename: str, offset: int, value: bytes) -> SimpleNamespace:
+  def process(options: dict) -> None:
+    with mods.open_modded_file(filename) as modded_file:
+      modded_file.write(offset, value)
+  return files_plugin(filename, process=process)
+
+
+def test_build_group_applies_the_mods_in_order(app_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"\x00" * 4)
+  use_plugins(monkeypatch, {
+    "first": write_plugin("settings/a.bin", 0, b"\x01\x01"),
+    "second": write_plugin("settings/a.bin", 1, b"\x02"),
+  })
+  mod_files, outputs, inputs = build.build_group({"first": {}, "second": {}})
+  assert mod_files == ["settings/a.bin", "settings/a.bin"]
+  assert outputs == ["settings/a.bin"]
+  assert inputs == ["settings/a.bin"]
+  assert (mods.MOD_PATH / "settings/a.bin").read_bytes() == b"\x01\x02\x00\x00"
+  assert mods.WORKSPACE is None
+
+
+def test_build_group_error_discards_the_workspace(app_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"\x00" * 4)
+  def fail(options: dict) -> None:
+    raise ValueError("broken plugin")
+  use_plugins(monkeypatch, {
+    "first": write_plugin("settings/a.bin", 0, b"\x01"),
+    "broken": files_plugin("settings/a.bin", process=fail),
+  })
+  with pytest.raises(ValueError, match="broken plugin"):
+    build.build_group({"first": {}, "broken": {}})
+  assert mods.WORKSPACE is None
+  # the update of the first mod was never written
+  assert (mods.MOD_PATH / "settings/a.bin").read_bytes() == b"\x00" * 4
+  assert (app_dir / "org/settings/a.bin").read_bytes() == b"\x00" * 4
+
+
+def test_find_stale_groups_keeps_groups_that_merge_into_a_dirty_bundle(app_dir: Path) -> None:
+  journal = build_journal.BuildJournal(mods.MOD_PATH, mods.ORG_PATH)
+  journal.groups = {
+    "kept": {"mods": ["a"], "files": {}, "bundles": ["gdc/global.gdcc"], "merged": ["a.bin"], "inputs": {}},
+    "writer": {"mods": ["w"], "files": {}, "bundles": ["gdc/global.gdcc"], "merged": [], "inputs": {}},
+    "deselected": {"mods": ["b"], "files": {}, "bundles": ["gdc/global.gdcc"], "merged": ["b.bin"], "inputs": {}},
+  }
+  resources = [{"a.bin"}, {"c.bin"}, {"gdc/global.gdcc"}]
+  bundles = [{"gdc/global.gdcc"}, {"gdc/global.gdcc"}, {"gdc/global.gdcc"}]
+  stale_groups, dirty_bundles = build._find_stale_groups(journal, ["kept", "new", "writer"], resources, bundles)
+  # the kept group is merged again from its loose files, the writer changed the bundle itself
+  assert stale_groups == {1, 2}
+  assert dirty_bundles == {"gdc/global.gdcc"}
+
+
+def test_find_stale_groups_rebuilds_groups_that_share_removed_files(app_dir: Path) -> None:
+  write_org_file(app_dir, "a.bin", b"a")
+  for file in ("a.bin", "shared.bin"):
+    (mods.MOD_PATH / file).parent.mkdir(parents=True, exist_ok=True)
+    (mods.MOD_PATH / file).write_bytes(b"modded")
+  journal = build_journal.BuildJournal(mods.MOD_PATH, mods.ORG_PATH)
+  journal.add_group("kept", ["a"], ["a.bin"], [], [], ["a.bin"])
+  journal.add_group("sharing", ["s"], ["shared.bin"], [], [], [])
+  journal.add_group("deselected", ["b"], ["shared.bin"], [], [], [])
+  stale_groups, _ = build._find_stale_groups(journal, ["kept", "sharing"], [{"a.bin"}, {"s.bin"}], [set(), set()])
+  assert stale_groups == {1}
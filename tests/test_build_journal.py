@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+from conftest import write_org_file
+
+from modbuilder import build_journal, mods
+
+
+def make_journal(app_dir: Path) -> build_journal.BuildJournal:
+  modded_path = mods.MOD_PATH / "settings/a.bin"
+  modded_path.parent.mkdir(parents=True, exist_ok=True)
+  modded_path.write_bytes(b"modded")
+  journal = build_journal.BuildJournal(mods.MOD_PATH, mods.ORG_PATH)
+  journal.add_group("group", ["a"], ["settings/a.bin"], [], [], ["settings/a.bin", "lookups/a.json"])
+  journal.save(mods.BUILD_JOURNAL_PATH)
+  return build_journal.load_build_journal(mods.BUILD_JOURNAL_PATH, mods.MOD_PATH, mods.ORG_PATH)
+
+
+def test_group_is_current_when_org_inputs_are_unchanged(app_dir: Path) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"org")
+  lookup_path = write_org_file(app_dir, "lookups/a.json", b"{}")
+  journal = make_journal(app_dir)
+  assert journal.is_group_current("group")
+  # a new mtime alone does not rebuild the group, the content is compared
+  os.utime(lookup_path, ns=(0, 0))
+  assert journal.is_group_current("group")
+  assert not mods.BUILD_JOURNAL_PATH.exists()
+
+
+def test_group_is_stale_when_an_org_input_changes(app_dir: Path) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"org")
+  lookup_path = write_org_file(app_dir, "lookups/a.json", b"{}")
+  journal = make_journal(app_dir)
+  lookup_path.write_bytes(b"[]")
+  assert not journal.is_group_current("group")
+
+
+def test_group_is_stale_when_an_org_input_is_removed(app_dir: Path) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"org")
+  lookup_path = write_org_file(app_dir, "lookups/a.json", b"{}")
+  journal = make_journal(app_dir)
+  lookup_path.unlink()
+  assert not journal.is_group_current("group")
+
+
+def test_group_is_stale_when_a_modded_file_changes(app_dir: Path) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"org")
+  write_org_file(app_dir, "lookups/a.json", b"{}")
+  journal = make_journal(app_dir)
+  (mods.MOD_PATH / "settings/a.bin").write_bytes(b"changed")
+  assert not journal.is_group_current("group")
+
+
+def test_org_reads_are_recorded_as_inputs(app_dir: Path) -> None:
+  write_org_file(app_dir, "settings/a.bin", b"org")
+  write_org_file(app_dir, "lookups/a.json", b"{}")
+  mods.read_file_bytes(mods.get_org_file("settings/a.bin"))
+  workspace = mods.open_workspace()
+  try:
+    mods.load_lookup("a.bin")
+    mods.copy_file_to_mod("settings/a.bin")
+  finally:
+    mods.close_workspace()
+  assert mods.PROCESS_INPUTS == {"settings/a.bin"}
+  assert workspace.inputs == {"lookups/a.json", "settings/a.bin"}
+  assert workspace.outputs == {"settings/a.bin"}
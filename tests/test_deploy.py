@@ -0,0 +1,91 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from modbuilder import deploy
+
+
+def write_files(root: Path, files: dict[str, bytes]) -> None:
+  for file, data in files.items():
+    (root / file).parent.mkdir(parents=True, exist_ok=True)
+    (root / file).write_bytes(data)
+
+
+def read_files(root: Path) -> dict[str, bytes]:
+  return {path.relative_to(root).as_posix(): path.read_bytes() for path in root.rglob("*") if path.is_file()}
+
+
+@pytest.fixture
+def build_path(tmp_path: Path) -> Path:
+  path = tmp_path / "mod/dropzone"
+  write_files(path, {"settings/a.bin": b"a", "ui/b.gfx": b"b"})
+  return path
+
+
+def test_deploy_writes_a_manifest_of_the_deployed_files(build_path: Path, tmp_path: Path) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  copied, deleted = deploy.deploy_dropzone(build_path, dropzone_path)
+  assert copied == ["settings/a.bin", "ui/b.gfx"]
+  assert deleted == []
+  manifest = json.loads((dropzone_path / deploy.DEPLOY_MANIFEST_NAME).read_text(encoding="utf-8"))
+  assert manifest["version"] == deploy.DEPLOY_MANIFEST_VERSION
+  assert manifest["files"]["settings/a.bin"]["hash"] == deploy.hash_file(build_path / "settings/a.bin")
+  assert manifest["files"]["ui/b.gfx"]["deployed"] == deploy._file_stat(dropzone_path / "ui/b.gfx")
+  assert deploy.load_manifest(dropzone_path) == manifest["files"]
+
+
+def test_redeploy_copies_only_changed_files(build_path: Path, tmp_path: Path) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  deploy.deploy_dropzone(build_path, dropzone_path)
+  assert deploy.deploy_dropzone(build_path, dropzone_path) == ([], [])
+
+  (build_path / "settings/a.bin").write_bytes(b"changed")
+  # a deployed copy touched by someone else is copied again as well
+  (dropzone_path / "ui/b.gfx").write_bytes(b"touched")
+  copied, _ = deploy.deploy_dropzone(build_path, dropzone_path)
+  assert copied == ["settings/a.bin", "ui/b.gfx"]
+  deployed_files = read_files(dropzone_path)
+  del deployed_files[deploy.DEPLOY_MANIFEST_NAME]
+  assert deployed_files == read_files(build_path)
+
+
+def test_rebuilt_file_with_the_same_content_is_not_copied(build_path: Path, tmp_path: Path) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  deploy.deploy_dropzone(build_path, dropzone_path)
+  os.utime(build_path / "settings/a.bin", ns=(0, 0))
+  assert deploy.deploy_dropzone(build_path, dropzone_path) == ([], [])
+
+
+def test_deploy_deletes_only_files_it_deployed(build_path: Path, tmp_path: Path) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  write_files(dropzone_path, {"other/mod.bin": b"other"})
+  deploy.deploy_dropzone(build_path, dropzone_path)
+  (build_path / "ui/b.gfx").unlink()
+  copied, deleted = deploy.deploy_dropzone(build_path, dropzone_path)
+  assert (copied, deleted) == ([], ["ui/b.gfx"])
+  assert not (dropzone_path / "ui").exists()
+  assert (dropzone_path / "other/mod.bin").read_bytes() == b"other"
+
+
+def test_replace_deletes_every_file_that_is_not_built(build_path: Path, tmp_path: Path) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  write_files(dropzone_path, {"other/mod.bin": b"other", "ui/b.gfx": b"old"})
+  copied, deleted = deploy.deploy_dropzone(build_path, dropzone_path, replace=True)
+  assert copied == ["settings/a.bin", "ui/b.gfx"]
+  assert deleted == ["other/mod.bin"]
+  assert not (dropzone_path / "other").exists()
+  assert sorted(read_files(dropzone_path)) == [deploy.DEPLOY_MANIFEST_NAME, "settings/a.bin", "ui/b.gfx"]
+
+
+@pytest.mark.parametrize("replace", [False, True])
+def test_empty_build_is_not_deployed(tmp_path: Path, replace: bool) -> None:
+  dropzone_path = tmp_path / "game/dropzone"
+  write_files(dropzone_path, {"other/mod.bin": b"other"})
+  empty_path = tmp_path / "mod/dropzone"
+  empty_path.mkdir(parents=True)
+  for src_path in (empty_path, tmp_path / "missing"):
+    with pytest.raises(FileNotFoundError):
+      deploy.deploy_dropzone(src_path, dropzone_path, replace=replace)
+  assert read_files(dropzone_path) == {"other/mod.bin": b"other"}
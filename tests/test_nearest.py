@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from modbuilder import mods2
+from modbuilder.nearest import NearestValues
+
+
+def linear_closest_value(value_array: list[float], desired_value: float) -> int:
+  # find_closest_value before NearestValues: the first exact match, otherwise the first of the closest values
+  closest_delta = 9999999
+  closest_match_index = None
+  for i, number in enumerate(value_array):
+    if float(number) == desired_value:
+      return i
+    delta = abs(float(number) - desired_value)
+    if delta < closest_delta:
+      closest_match_index = i
+      closest_delta = delta
+  return closest_match_index
+
+
+def random_values(rng: random.Random, count: int) -> list[float]:
+  # halves in a small range, so there are many duplicates and desired values exactly between two values
+  return [rng.randint(-20, 20) / 2 for _ in range(count)]
+
+
+def desired_values() -> list[float]:
+  return [i / 4 for i in range(-50, 51)] + [-1000.0, 1000.0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_nearest_values_match_the_linear_search(seed: int) -> None:
+  rng = random.Random(seed)
+  values = random_values(rng, 60)
+  nearest = NearestValues(values)
+  expected = [linear_closest_value(values, desired) for desired in desired_values()]
+  assert [nearest.find_one(desired) for desired in desired_values()] == expected
+  assert nearest.find(desired_values()).tolist() == expected
+  assert [mods2.find_closest_value(values, desired)[0] for desired in desired_values()] == expected
+
+
+def test_ties_go_to_the_first_value() -> None:
+  values = [3.0, 1.0, 2.0, 1.0, 3.0, 2.0]
+  nearest = NearestValues(values)
+  assert nearest.find_one(2.0) == 2  # exact matches
+  assert nearest.find_one(1.5) == 1  # 1.0 at 1 and 2.0 at 2 are as close
+  assert nearest.find_one(2.5) == 0  # 3.0 at 0 comes before 2.0 at 2
+  assert nearest.find_one(0.0) == 1
+  assert [nearest.find_one(desired) for desired in (2.0, 1.5, 2.5, 0.0)] == \
+    [linear_closest_value(values, desired) for desired in (2.0, 1.5, 2.5, 0.0)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_changed_values_match_a_new_index(seed: int) -> None:
+  rng = random.Random(seed)
+  values = random_values(rng, 40)
+  nearest = NearestValues(values)
+  for _ in range(100):
+    if rng.random() < 0.3:
+      values.append(rng.randint(-20, 20) / 2)
+      nearest.append(values[-1])
+    else:
+      position = rng.randrange(len(values))
+      values[position] = rng.choice([rng.randint(-20, 20) / 2, values[rng.randrange(len(values))]])
+      nearest.set_value(position, values[position])
+    rebuilt = NearestValues(values)
+    assert nearest.positions.tolist() == rebuilt.positions.tolist()
+    assert nearest.sorted_values.tolist() == rebuilt.sorted_values.tolist()
+  assert [nearest.find_one(desired) for desired in desired_values()] == \
+    [linear_closest_value(values, desired) for desired in desired_values()]
+
+
+def test_nan_values_are_never_found() -> None:
+  nearest = NearestValues([float("nan"), 2.0])
+  assert nearest.find_one(0.0) == 1
+  nearest.set_value(1, float("nan"))
+  assert nearest.find_one(0.0) is None
+  nearest.set_value(0, 1.0)
+  nearest.append(float("nan"))
+  assert nearest.find_one(5.0) == 0
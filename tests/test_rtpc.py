@@ -0,0 +1,176 @@
+import io
+import struct
+from collections import deque
+from pathlib import Path
+
+import pytest
+
+from deca.ff_rtpc import (
+  RtpcNode, k_type_array_f32, k_type_array_u8, k_type_array_u32, k_type_event, k_type_f32, k_type_mat4x4,
+  k_type_objid, k_type_str, k_type_u32, k_type_vec3, k_type_vec4, rtpc_columns_from_binary, rtpc_from_binary,
+)
+from deca.hashes import hash32_func
+
+ORG_PATH = Path(__file__).resolve().parent.parent / "modbuilder/org"
+RTPC_FILES = sorted(
+  path.relative_to(ORG_PATH).as_posix() for path in ORG_PATH.rglob("*")
+  if path.is_file() and path.read_bytes()[:4] == b"RTPC"
+)
+
+CLASS_HASH = hash32_func("_class_hash")
+WEAPON_CLASS = hash32_func("CWeapon")
+SIGHT_CLASS = hash32_func("CSight")
+NAME = hash32_func("name")
+LENGTH = hash32_func("length")
+
+
+def node(name: str, props: list[tuple], children: list[tuple] = ()) -> tuple:
+  return hash32_func(name), props, list(children)
+
+
+def prop(name: str, prop_type: int, value: any) -> tuple:
+  return hash32_func(name) if isinstance(name, str) else name, prop_type, value
+
+
+# nested children, nodes and properties with the same hash, an odd number of properties (padded children)
+# and a value of every kind that is stored after the tables
+FIXTURE = node("root", [prop("version", k_type_u32, 3)], [
+  node("weapon", [
+    prop(CLASS_HASH, k_type_u32, WEAPON_CLASS),
+    prop(NAME, k_type_str, b"rifle"),
+    prop("mass", k_type_f32, 2.5),
+    prop("scale", k_type_vec3, [1.0, 0.5, 0.25]),
+    prop("ids", k_type_array_u32, [1, 2, 3]),
+  ], [
+    node("sight", [prop(CLASS_HASH, k_type_u32, SIGHT_CLASS), prop("zoom", k_type_f32, 4.0), prop(NAME, k_type_str, b"scope")], [
+      node("lens", [
+        prop(CLASS_HASH, k_type_u32, WEAPON_CLASS),
+        prop("tint", k_type_vec4, [0.5, 0.25, 0.125, 1.0]),
+        prop("events", k_type_event, [0x123456789a, 0xbcdef]),
+        prop("object", k_type_objid, 0xabcdef012345),
+      ]),
+    ]),
+    node("barrel", [
+      prop(LENGTH, k_type_f32, 0.5),
+      prop("curve", k_type_array_f32, [0.25, 0.75]),
+      prop("transform", k_type_mat4x4, [float(i) for i in range(16)]),
+      prop(LENGTH, k_type_f32, 0.75),
+    ]),
+  ]),
+  node("weapon", [prop(CLASS_HASH, k_type_u32, WEAPON_CLASS), prop(NAME, k_type_str, b"rifle"), prop("bytes", k_type_array_u8, [1, 2, 3])]),
+  node("empty", []),
+  node("sight", [prop(CLASS_HASH, k_type_u32, SIGHT_CLASS), prop("zoom", k_type_f32, 8.0)]),
+])
+
+
+def pack_value(prop_type: int, value: any) -> bytes:
+  if prop_type == k_type_str:
+    return value + b"\x00"
+  if prop_type in (k_type_vec3, k_type_vec4, k_type_mat4x4):
+    return struct.pack(f"<{len(value)}f", *value)
+  if prop_type == k_type_objid:
+    return struct.pack("<Q", value)
+  fmt = {k_type_array_u32: "I", k_type_array_f32: "f", k_type_array_u8: "B", k_type_event: "Q"}[prop_type]
+  return struct.pack(f"<I{len(value)}{fmt}", len(value), *value)
+
+
+def build_rtpc(root: tuple) -> bytes:
+  buffer = bytearray(b"RTPC" + struct.pack("<I", 3) + bytes(12))
+  values = []
+
+  def place(record_pos: int, name_hash: int, props: list[tuple], children: list[tuple]) -> None:
+    struct.pack_into("<IIHH", buffer, record_pos, name_hash, len(buffer), len(props), len(children))
+    for name_hash, prop_type, value in props:
+      if prop_type == k_type_u32:
+        data_raw = value
+      elif prop_type == k_type_f32:
+        data_raw = struct.unpack("<I", struct.pack("<f", value))[0]
+      else:
+        data_raw = 0
+        values.append((len(buffer) + 4, prop_type, value))
+      buffer.extend(struct.pack("<IIB", name_hash, data_raw, prop_type))
+    buffer.extend(bytes(-len(buffer) % 4))
+    child_pos = len(buffer)
+    buffer.extend(bytes(12 * len(children)))
+    for i, child in enumerate(children):
+      place(child_pos + 12 * i, *child)
+
+  place(8, *root)
+  for data_raw_pos, prop_type, value in values:
+    buffer.extend(bytes(-len(buffer) % 4))
+    struct.pack_into("<I", buffer, data_raw_pos, len(buffer))
+    buffer.extend(pack_value(prop_type, value))
+  return bytes(buffer)
+
+
+def assert_same_node(expected: RtpcNode, node: RtpcNode, lookups: bool = True) -> None:
+  assert (node.name_hash, node.data_offset, node.prop_count, node.child_count) == \
+    (expected.name_hash, expected.data_offset, expected.prop_count, expected.child_count)
+  assert [(p.pos, p.name_hash, p.data_raw, p.type, p.data_pos, p.data) for p in node.prop_table] == \
+    [(p.pos, p.name_hash, p.data_raw, p.type, p.data_pos, p.data) for p in expected.prop_table]
+  if lookups:
+    for name_hash, expected_prop in expected.prop_map.items():
+      assert node.get_prop(name_hash).pos == expected_prop.pos
+  assert list(node.child_map) == list(expected.child_map)
+  assert len(node.child_table) == len(expected.child_table)
+  for expected_child, child in zip(expected.child_table, node.child_table):
+    assert_same_node(expected_child, child, lookups)
+
+
+def breadth_first(root: RtpcNode) -> list[RtpcNode]:
+  nodes = []
+  queue = deque([root])
+  while queue:
+    nodes.append(queue.popleft())
+    queue.extend(nodes[-1].child_table)
+  return nodes
+
+
+@pytest.fixture(scope="module")
+def fixture_data() -> bytes:
+  return build_rtpc(FIXTURE)
+
+
+def test_columns_match_the_recursive_parse(fixture_data: bytes) -> None:
+  expected = rtpc_from_binary(io.BytesIO(fixture_data)).root_node
+  columns = rtpc_columns_from_binary(fixture_data)
+  assert columns.node_count == 8
+  assert_same_node(expected, columns.root_node)
+  # a duplicated property is found like prop_map finds it, the last one wins
+  barrel = expected.child_table[0].child_table[1]
+  assert columns.root_node.child_table[0].child_table[1].get_prop(LENGTH).data == barrel.get_prop(LENGTH).data == 0.75
+
+
+@pytest.mark.parametrize("filename", RTPC_FILES)
+def test_org_rtpc_columns_match_the_recursive_parse(filename: str) -> None:
+  data = (ORG_PATH / filename).read_bytes()
+  # property lookups are checked on the fixture, here they would only make the large files slow
+  assert_same_node(rtpc_from_binary(io.BytesIO(data)).root_node, rtpc_columns_from_binary(data).root_node, lookups=False)
+
+
+def test_find_nodes_by_hash(fixture_data: bytes) -> None:
+  nodes = breadth_first(rtpc_from_binary(io.BytesIO(fixture_data)).root_node)
+  columns = rtpc_columns_from_binary(fixture_data)
+  for name in ("weapon", "sight", "lens", "missing"):
+    expected = [n.data_offset for n in nodes if n.name_hash == hash32_func(name)]
+    assert [n.data_offset for n in columns.find_nodes(hash32_func(name))] == expected
+    assert [columns.node(int(i)).data_offset for i in columns.find_node_indexes(hash32_func(name))] == expected
+  assert len(columns.find_nodes(hash32_func("weapon"))) == 2
+
+
+def test_find_props_and_nodes_by_class_hash(fixture_data: bytes) -> None:
+  nodes = breadth_first(rtpc_from_binary(io.BytesIO(fixture_data)).root_node)
+  columns = rtpc_columns_from_binary(fixture_data)
+  for class_hash in (WEAPON_CLASS, SIGHT_CLASS, hash32_func("CMissing")):
+    expected = [n for n in nodes if CLASS_HASH in n.prop_map and n.prop_map[CLASS_HASH].data == class_hash]
+    assert [n.data_offset for n in columns.find_nodes_with_prop(CLASS_HASH, class_hash)] == [n.data_offset for n in expected]
+    assert [p.pos for p in columns.find_props(CLASS_HASH, class_hash)] == [n.prop_map[CLASS_HASH].pos for n in expected]
+  assert len(columns.find_nodes_with_prop(CLASS_HASH, WEAPON_CLASS)) == 3
+  assert len(columns.find_props(CLASS_HASH)) == 5
+
+  # string and float values are matched by their decoded value
+  assert [n.name_hash for n in columns.find_nodes_with_prop(NAME, "rifle")] == [hash32_func("weapon")] * 2
+  assert [p.data for p in columns.find_props(NAME, b"scope")] == [b"scope"]
+  assert [n.name_hash for n in columns.find_nodes_with_prop(hash32_func("zoom"), 8.0)] == [hash32_func("sight")]
+  # a u32 lookup does not match floats with the same bits
+  assert columns.find_props(hash32_func("zoom"), struct.unpack("<I", struct.pack("<f", 8.0))[0]) == []
@@ -0,0 +1,118 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from deca.ff_sarc import FileSarc
+from deca.util import copy_file_data
+
+ORG_PATH = Path(__file__).resolve().parent.parent / "modbuilder/org"
+SARC_FILES = sorted(
+  path.relative_to(ORG_PATH).as_posix() for path in ORG_PATH.rglob("*")
+  if path.is_file() and path.read_bytes()[4:8] == b"SARC"
+)
+BUNDLE_FILE = "editor/entities/hp_weapons/ammunition/shotguns/equipment_ammo_12ga_buck_01.ee"
+
+
+def parse_sarc(data: bytes) -> FileSarc:
+  sarc = FileSarc()
+  sarc.header_deserialize(io.BytesIO(data))
+  return sarc
+
+
+def entry_data(data: bytes) -> dict[bytes, bytes]:
+  return {entry.v_path: data[entry.offset:entry.offset + entry.length] for entry in parse_sarc(data).entries}
+
+
+def serialize(data: bytes, changed_data: dict[bytes, bytes], path: Path) -> bytes:
+  # through real files, so the entries are copied by the kernel where it can
+  src_path = path.with_suffix(".src")
+  src_path.write_bytes(data)
+  with open(src_path, "rb") as fin, open(path, "wb") as fout:
+    parse_sarc(data).serialize(fout, fin, changed_data)
+  return path.read_bytes()
+
+
+@pytest.fixture(params=[2, 3])
+def bundle(request: pytest.FixtureRequest) -> bytes:
+  # the org bundles are all version 2, version 3 is the same bundle with a string table
+  data = (ORG_PATH / BUNDLE_FILE).read_bytes()
+  sarc = parse_sarc(data)
+  sarc.ver2 = request.param
+  out = io.BytesIO()
+  sarc.serialize(out, io.BytesIO(data))
+  assert parse_sarc(out.getvalue()).ver2 == request.param
+  return out.getvalue()
+
+
+@pytest.mark.parametrize("filename", SARC_FILES)
+def test_unchanged_sarc_serializes_to_the_same_bytes(filename: str, tmp_path: Path) -> None:
+  data = (ORG_PATH / filename).read_bytes()
+  assert serialize(data, {}, tmp_path / "out.ee") == data
+
+
+def test_grown_entry_moves_the_entries_after_it(bundle: bytes, tmp_path: Path) -> None:
+  entries = parse_sarc(bundle).entries
+  grown, last = entries[1], entries[-1]
+  changed_data = {grown.v_path: b"\x01" * (grown.length + 5), last.v_path: b"\x02" * (last.length + 3)}
+  data = serialize(bundle, changed_data, tmp_path / "out.ee")
+
+  sarc = parse_sarc(data)
+  assert [entry.v_path for entry in sarc.entries] == [entry.v_path for entry in entries]
+  assert all(entry.offset % 4 == 0 for entry in sarc.entries)
+  expected = entry_data(bundle)
+  expected.update(changed_data)
+  assert entry_data(data) == expected
+  assert len(data) % 4 == 0
+
+
+def test_sizes_match_only_for_entries_of_the_same_size(bundle: bytes) -> None:
+  entry = parse_sarc(bundle).entries[0]
+  sarc = parse_sarc(bundle)
+  assert sarc.sizes_match({})
+  assert sarc.sizes_match({entry.v_path: bytes(entry.length), b"not/in/bundle.bin": b"x"})
+  assert not sarc.sizes_match({entry.v_path: bytes(entry.length + 1)})
+  with pytest.raises(ValueError):
+    sarc.serialize_in_place(io.BytesIO(bytearray(bundle)), {entry.v_path: bytes(entry.length - 1)})
+
+
+def test_in_place_rewrite_matches_serialize(bundle: bytes, tmp_path: Path) -> None:
+  entries = parse_sarc(bundle).entries
+  changed_data = {entries[0].v_path: b"\x01" * entries[0].length, entries[-1].v_path: b"\x02" * entries[-1].length}
+  path = tmp_path / "in_place.ee"
+  path.write_bytes(bundle)
+  with open(path, "r+b") as f:
+    parse_sarc(bundle).serialize_in_place(f, changed_data)
+  data = path.read_bytes()
+
+  assert data == serialize(bundle, changed_data, tmp_path / "out.ee")
+  # nothing but the changed entries is written
+  changed = [i for i, (a, b) in enumerate(zip(bundle, data)) if a != b]
+  ranges = [(entry.offset, entry.offset + entry.length) for entry in (entries[0], entries[-1])]
+  assert changed and all(any(start <= i < end for start, end in ranges) for i in changed)
+
+
+@pytest.mark.parametrize("copy_path", ["kernel", "buffered"])
+def test_copy_file_data(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, copy_path: str) -> None:
+  if copy_path == "buffered":
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+  src = bytes(range(256)) * 40
+  (tmp_path / "src.bin").write_bytes(src)
+  (tmp_path / "dst.bin").write_bytes(b"\xff" * 100)
+  with open(tmp_path / "src.bin", "rb") as fin, open(tmp_path / "dst.bin", "r+b") as fout:
+    fout.seek(3)
+    fout.write(b"head")  # still buffered when the data is copied
+    copy_file_data(fout, fin, 1000, 50, 9000, block_size=1024)
+  dst = (tmp_path / "dst.bin").read_bytes()
+  assert dst[:50] == b"\xff" * 3 + b"head" + b"\xff" * 43
+  assert dst[50:] == src[1000:10000]
+
+
+def test_copy_file_data_between_buffers() -> None:
+  fout = io.BytesIO(bytes(8))
+  copy_file_data(fout, io.BytesIO(b"abcdefgh"), 2, 4, 4, block_size=3)
+  assert fout.getvalue() == bytes(4) + b"cdef"
+  with pytest.raises(EOFError):
+    copy_file_data(io.BytesIO(), io.BytesIO(b"abc"), 1, 0, 4)
@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import pytest
+from conftest import write_org_file
+from openpyxl.utils import get_column_letter, range_boundaries
+
+from modbuilder import mods, mods2
+
+ORG_PATH = Path(__file__).resolve().parent.parent / "modbuilder/org"
+SENSES_FILE = "settings/hp_settings/animal_senses.bin"
+RANGE_UPDATES = [
+  # the ranges of modify_animal_senses
+  *[{"sheet": "species_data", "range": cell_range, "value": 0.5, "transform": "multiply"} for cell_range in ("B39:B43", "B45:B50", "B54:B59")],
+  *[{"sheet": "species_data", "range": cell_range, "value": 0.75, "transform": "multiply"} for cell_range in ("B93:B95", "B98:B100")],
+  {"sheet": "species_data", "range": "B4:B5", "value": 1.25, "transform": "multiply"},
+  {"sheet": "weapon_data", "rows": (3, 4), "cols": ("B", None), "value": 2, "transform": "multiply"},
+  # cells updated twice, cells that keep their value and cells set to the same value
+  {"sheet": "species_data", "range": "B4:B7", "value": 0.5, "transform": "add"},
+  {"sheet": "species_data", "range": "B119:B126", "value": 1, "transform": "multiply"},
+  {"sheet": "species_data", "range": "B8:B13", "value": 3.5},
+]
+
+
+def coordinates(range_update: dict) -> list[str]:
+  # the cells the plugins used to pass to update_file_at_multiple_coordinates_with_value, column by column
+  if "range" not in range_update:
+    return mods2.get_coordinates_range_from_file(SENSES_FILE, range_update["sheet"], range_update["rows"], range_update["cols"])
+  col_start, row_start, col_end, row_end = range_boundaries(range_update["range"])
+  return [f"{get_column_letter(col)}{row}" for col in range(col_start, col_end + 1) for row in range(row_start, row_end + 1)]
+
+
+def cell_values(filename: str) -> dict[tuple[str, str], tuple[int, any]]:
+  # (sheet, coordinates) -> (data type, value) of every cell in the file
+  adf_values = mods2.deserialize_adf(filename).table_instance_full_values[0].value
+  data_arrays = {data_type: adf_values[name].value for data_type, name in mods2.DATA_ARRAY_NAMES.items()}
+  values = {}
+  for sheet in adf_values["Sheet"].value:
+    sheet_name = sheet.value["Name"].value.decode("utf-8")
+    for index, definition_index in enumerate(sheet.value["CellIndex"].value):
+      definition = adf_values["Cell"].value[definition_index].value
+      data_type, value_index = definition["Type"].value, definition["DataIndex"].value
+      value = data_arrays[data_type][value_index] if data_type in data_arrays else value_index
+      values[(sheet_name, mods2.calculate_coordinates(index, sheet.value["Cols"].value))] = (data_type, getattr(value, "value", value))
+  return values
+
+
+@pytest.fixture
+def senses_file(app_dir: Path) -> str:
+  write_org_file(app_dir, SENSES_FILE, (ORG_PATH / SENSES_FILE).read_bytes())
+  mods.copy_file_to_mod(SENSES_FILE)
+  return SENSES_FILE
+
+
+@pytest.mark.parametrize("allow_new_data", [False, True])
+def test_range_updates_write_the_bytes_of_sequential_updates(senses_file: str, allow_new_data: bool) -> None:
+  for range_update in RANGE_UPDATES:
+    mods2.update_file_at_multiple_coordinates_with_value(
+      senses_file, range_update["sheet"], coordinates(range_update), range_update["value"],
+      transform=range_update.get("transform"), allow_new_data=allow_new_data,
+    )
+  sequential = mods.read_modded_bytes(senses_file)
+
+  mods.get_modded_file(senses_file).unlink()  # copy_file_to_mod keeps an existing modded file
+  mods.copy_file_to_mod(senses_file)
+  mods2.update_file_at_ranges(senses_file, RANGE_UPDATES, allow_new_data=allow_new_data)
+  assert mods.read_modded_bytes(senses_file) == sequential
+  assert sequential != (ORG_PATH / senses_file).read_bytes()
+
+
+def test_range_updates_only_change_cells_in_the_ranges(senses_file: str) -> None:
+  org_values = cell_values(senses_file)
+  mods2.update_file_at_ranges(senses_file, RANGE_UPDATES)
+  values = cell_values(senses_file)
+
+  in_ranges = {(range_update["sheet"], coordinate) for range_update in RANGE_UPDATES for coordinate in coordinates(range_update)}
+  assert values.keys() == org_values.keys()
+  changed = {key for key in values if values[key] != org_values[key]}
+  # without allow_new_data the cells point at the closest existing values, so only where they changed is checked
+  assert changed <= in_ranges
+  assert {sheet for sheet, _coordinates in changed} == {"species_data", "weapon_data"}
+
+
+def test_cell_updates_keep_the_nearest_values_current(senses_file: str, monkeypatch: pytest.MonkeyPatch) -> None:
+  extracted_adf = mods2.deserialize_adf(senses_file)
+  references = mods2.get_cell_references(extracted_adf)
+  nearest = references.get_nearest_values()
+  value_count = len(nearest.values)
+  built = []
+  with monkeypatch.context() as m:
+    m.setattr(mods2, "NearestValues", lambda values: built.append(values))
+    for range_update in RANGE_UPDATES:
+      for coordinate in coordinates(range_update):
+        cell = mods2.XlsxCell(senses_file, extracted_adf, {**range_update, "coordinates": coordinate})
+        mods2.process_cell_update(cell, extracted_adf, allow_new_data=True)
+
+  # the updates overwrite and add values, the index follows them without being built again
+  assert references.get_nearest_values() is nearest and not built
+  assert len(nearest.values) > value_count
+  rebuilt = mods2.NearestValues(extracted_adf.table_instance_full_values[0].value["ValueData"].value)
+  assert nearest.positions.tolist() == rebuilt.positions.tolist()
+  assert nearest.sorted_values.tolist() == rebuilt.sorted_values.tolist()
@@ -0,0 +1,69 @@
+import struct
+from pathlib import Path
+
+import pytest
+from conftest import write_org_file
+
+from modbuilder import mods, staging
+
+ORG_DATA = struct.pack("4i", 1, 2, 3, 4)
+
+
+@pytest.fixture
+def staged_file(app_dir: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+  # hard links are the staging that shares the org file itself
+  monkeypatch.setattr(staging, "REFLINK_SUPPORTED", False)
+  org_path = write_org_file(app_dir, "settings/a.bin", ORG_DATA)
+  mods.copy_file_to_mod("settings/a.bin")
+  modded_path = mods.get_modded_file("settings/a.bin")
+  assert modded_path.samefile(org_path)
+  return org_path
+
+
+def test_update_in_place_materializes_the_staged_file(staged_file: Path) -> None:
+  mods.update_file_at_offset("settings/a.bin", 4, 20)
+  assert staged_file.read_bytes() == ORG_DATA
+  assert not staging.is_shared(staged_file)
+  assert mods.read_modded_bytes("settings/a.bin") == struct.pack("4i", 1, 20, 3, 4)
+
+
+def test_write_into_bundle_materializes_the_staged_file(staged_file: Path) -> None:
+  mods.write_into_bundle("settings/a.bin", 0, b"\xff" * 4)
+  assert staged_file.read_bytes() == ORG_DATA
+  assert mods.read_modded_bytes("settings/a.bin") == b"\xff" * 4 + ORG_DATA[4:]
+
+
+def test_rewritten_file_unshares_the_staged_file(staged_file: Path) -> None:
+  mods.write_modded_bytes("settings/a.bin", b"new")
+  assert staged_file.read_bytes() == ORG_DATA
+  assert mods.read_modded_bytes("settings/a.bin") == b"new"
+
+
+def test_workspace_commit_unshares_the_staged_file(staged_file: Path) -> None:
+  mods.open_workspace()
+  try:
+    mods.update_file_at_offset("settings/a.bin", 0, 10)
+    with mods.open_modded_file("settings/a.bin") as modded_file:
+      modded_file.insert(16, b"tail")
+  finally:
+    mods.close_workspace()
+  assert staged_file.read_bytes() == ORG_DATA
+  assert mods.read_modded_bytes("settings/a.bin") == struct.pack("4i", 10, 2, 3, 4) + b"tail"
+
+
+def test_workspace_patches_materialize_the_staged_file(staged_file: Path) -> None:
+  # only value updates: the patches are written into the file without loading it
+  mods.open_workspace()
+  try:
+    mods.update_file_at_offsets("settings/a.bin", [0, 12], 3, transform="multiply")
+  finally:
+    mods.close_workspace()
+  assert staged_file.read_bytes() == ORG_DATA
+  assert mods.read_modded_bytes("settings/a.bin") == struct.pack("4i", 3, 2, 3, 12)
+
+
+def test_staged_file_that_is_not_written_stays_linked(staged_file: Path) -> None:
+  mods.open_workspace()
+  mods.close_workspace()
+  assert staging.is_shared(staged_file)
+  assert mods.read_modded_bytes("settings/a.bin") == ORG_DATA
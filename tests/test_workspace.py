@@ -0,0 +1,154 @@
+import os
+import random
+import struct
+from pathlib import Path
+
+import pytest
+
+from modbuilder.workspace import ModdedFile
+
+
+def update_bytes(data: bytearray, offset: int, value: any, transform: str = None, format: str = None) -> None:
+  # one read and write per update, as the updates were applied to the file before they were planned
+  if format:
+    if format == "sint08":
+      data[offset:offset + 2] = struct.pack("h", value)
+  elif isinstance(value, str):
+    data[offset:offset + len(value)] = value.encode("utf-8")
+  elif isinstance(value, float):
+    new_value = value
+    if transform == "multiply":
+      new_value = value * struct.unpack_from("f", data, offset)[0]
+    data[offset:offset + 4] = struct.pack("f", new_value)
+  elif isinstance(value, int):
+    new_value = value
+    if transform == "add":
+      new_value = value + struct.unpack_from("i", data, offset)[0]
+    elif transform == "multiply":
+      new_value = round(value * struct.unpack_from("i", data, offset)[0])
+    data[offset:offset + 4] = struct.pack("i", new_value)
+
+
+def random_updates(rng: random.Random, size: int, count: int) -> list[tuple]:
+  updates = []
+  for _ in range(count):
+    # offsets on a 4 byte grid make most updates land on the same values, some overlap by 2 bytes
+    offset = rng.randrange(0, size - 8, 2 if rng.random() < 0.2 else 4)
+    kind = rng.choice(["int", "add", "int_multiply", "float", "float_multiply", "sint08", "str"])
+    if kind == "int":
+      updates.append((offset, rng.randint(-1000, 1000), None, None))
+    elif kind == "add":
+      updates.append((offset, rng.randint(-10, 10), "add", None))
+    elif kind == "int_multiply":
+      updates.append((offset, rng.randint(-3, 3), "multiply", None))
+    elif kind == "float":
+      updates.append((offset, rng.uniform(-100, 100), None, None))
+    elif kind == "float_multiply":
+      updates.append((offset, rng.uniform(0.5, 1.5), "multiply", None))
+    elif kind == "sint08":
+      updates.append((offset, rng.randint(-100, 100), None, "sint08"))
+    else:
+      updates.append((offset, rng.choice(["ab", "xyz1"]), None, None))
+  return updates
+
+
+def org_data(size: int) -> bytes:
+  return struct.pack(f"{size // 4}i", *range(1, size // 4 + 1))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_planned_updates_match_sequential_updates(tmp_path: Path, seed: int) -> None:
+  rng = random.Random(seed)
+  data = org_data(256)
+  updates = []
+  expected = bytearray(data)
+  for update in random_updates(rng, len(data), 300):
+    try:
+      update_bytes(expected, *update)
+    except struct.error:
+      continue  # the value no longer fits
+    updates.append(update)
+
+  loaded = ModdedFile(tmp_path / "loaded.bin", data)
+  saved_path = tmp_path / "saved.bin"
+  saved_path.write_bytes(data)
+  saved = ModdedFile(saved_path)
+  for modded_file in (loaded, saved):
+    for i, update in enumerate(updates):
+      modded_file.update(*update, source=f"mod{i % 3}")
+  assert loaded.getvalue() == bytes(expected)
+  saved.save()
+  assert saved_path.read_bytes() == bytes(expected)
+
+
+def test_int_multiply_rounds_like_sequential_updates(tmp_path: Path) -> None:
+  data = struct.pack("3i", 7, -7, 1001)
+  updates = [(0, 3, "multiply", None), (0, -2, "multiply", None), (4, 5, "add", None), (4, 2, "multiply", None), (8, 0, "multiply", None)]
+  expected = bytearray(data)
+  for update in updates:
+    update_bytes(expected, *update)
+  modded_file = ModdedFile(tmp_path / "a.bin", data)
+  for update in updates:
+    modded_file.update(*update)
+  assert struct.unpack("3i", modded_file.getvalue()) == struct.unpack("3i", bytes(expected)) == (-42, -4, 0)
+
+
+def test_overlapping_updates_from_two_sources_are_reported(tmp_path: Path) -> None:
+  modded_file = ModdedFile(tmp_path / "a.bin", org_data(16))
+  modded_file.update(4, 2.0, source="first")
+  modded_file.update(4, 3, transform="add", source="first")
+  assert modded_file.conflicts == []
+  # a different size at the same values: the earlier patch is applied before the new one is planned
+  modded_file.update(6, "zz", source="second")
+  modded_file.update(8, 5, source="first")
+  modded_file.update(8, 6, source="second")
+  modded_file.update(8, 2, transform="add", source="third")
+  assert modded_file.conflicts == [(6, ["first"], "second"), (8, ["first"], "second")]
+  expected = bytearray(org_data(16))
+  update_bytes(expected, 4, 2.0)
+  update_bytes(expected, 4, 3, "add")
+  update_bytes(expected, 6, "zz")
+  update_bytes(expected, 8, 6)
+  update_bytes(expected, 8, 2, "add")
+  assert modded_file.getvalue() == bytes(expected)
+
+
+def test_splice_before_a_pending_patch(tmp_path: Path) -> None:
+  data = org_data(32)
+  modded_file = ModdedFile(tmp_path / "a.bin", data)
+  modded_file.update(8, 2, transform="multiply")
+  # the patch is applied at its offset before the insert moves the values after it
+  modded_file.insert(4, b"abcd")
+  modded_file.update(24, 100)
+  modded_file.insert(0, b"xy", bytes_to_remove=4)
+  modded_file.update(10, 7, transform="add")
+  expected = bytearray(data)
+  update_bytes(expected, 8, 2, "multiply")
+  expected[4:4] = b"abcd"
+  update_bytes(expected, 24, 100)
+  expected[0:4] = b"xy"
+  update_bytes(expected, 10, 7, "add")
+  assert len(modded_file) == len(expected)
+  assert modded_file.read(10, 4) == bytes(expected[10:14])
+  assert modded_file.getvalue() == bytes(expected)
+
+
+def test_updates_are_saved_without_loading_the_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+  path = tmp_path / "a.bin"
+  path.write_bytes(org_data(64))
+  expected = bytearray(org_data(64))
+  for offset, value in [(0, 1.5), (4, 2.5), (20, 9), (60, 3)]:
+    update_bytes(expected, offset, value)
+  update_bytes(expected, 20, 2, "multiply")
+
+  for write_path in ("pwritev", "seek"):
+    path.write_bytes(org_data(64))
+    if write_path == "seek":
+      monkeypatch.delattr(os, "pwritev", raising=False)
+    modded_file = ModdedFile(path)
+    for offset, value in [(0, 1.5), (4, 2.5), (20, 9), (60, 3)]:
+      modded_file.update(offset, value)
+    modded_file.update(20, 2, transform="multiply")
+    modded_file.save()
+    assert modded_file._data is None
+    assert path.read_bytes() == bytes(expected)